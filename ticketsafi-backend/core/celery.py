@@ -0,0 +1,11 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+app = Celery('core')
+
+# All Celery settings live in core/settings.py under the CELERY_ prefix
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -3,6 +3,7 @@ import os
 from datetime import timedelta
 from decouple import config, Csv
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -10,6 +11,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # --- SECURITY: Pull from .env ---
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-fallback-key')
 
+# Signs ticket QR tokens; scanners receive per-event keys derived from it
+QR_SIGNING_KEY = config('QR_SIGNING_KEY', default=SECRET_KEY)
+
 # Cast to boolean so "False" string becomes Python False
 DEBUG = config('DEBUG', default=True, cast=bool)
 
@@ -29,6 +33,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
 
     # Third Party Apps
     'rest_framework',
@@ -86,7 +91,10 @@ DB_URL = config('DATABASE_URL', default='sqlite:///' + str(BASE_DIR / 'db.sqlite
 DATABASES = {
     'default': dj_database_url.config(
         default=DB_URL,
-        conn_max_age=600,
+        # The ASGI service (ASYNC_VIEWS) runs each request's sync code in a fresh thread, so a
+        # persistent connection would outlive it: open one per request there. It only serves
+        # the async endpoints; the WSGI backend keeps its connections for 10 minutes
+        conn_max_age=0 if config('ASYNC_VIEWS', default=False, cast=bool) else 600,
         # FIX: Only enable SSL if the URL contains 'postgres'
         ssl_require=('postgres' in DB_URL)
     )
@@ -150,6 +158,14 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 USE_X_FORWARDED_HOST = True
 USE_X_FORWARDED_PORT = True
 
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    'x-admission-token',
+    'idempotency-key',
+)
+
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -223,6 +239,107 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Yadi Tickets <tickets
 
 
 
+# --- CACHE ---
+# Shared Redis cache across gunicorn workers; per-process memory cache for local development
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Public catalog responses (events/services/catalog_cache.py). Saves invalidate them at once;
+# these bound how late sold counts and ended events show up
+CATALOG_CACHE_SECONDS = config('CATALOG_CACHE_SECONDS', default=300, cast=int)
+EVENT_PAGE_CACHE_SECONDS = config('EVENT_PAGE_CACHE_SECONDS', default=15, cast=int)
+
+
+# --- CELERY (Webhooks, Ticket Delivery, Sweepers) ---
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL or 'memory://')
+# Without a broker (local development) tasks run inline
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=not REDIS_URL, cast=bool)
+CELERY_TASK_ACKS_LATE = True
+# Chords (the organizer ticket bundle) count finished chunks in the result backend
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=REDIS_URL or None)
+CELERY_RESULT_EXPIRES = 3600
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Ticket rendering and email run on their own worker pool
+CELERY_TASK_ROUTES = {
+    'events.tasks.deliver_ticket': {'queue': 'tickets'},
+    'events.tasks.render_ticket_chunk': {'queue': 'tickets'},
+    'events.tasks.bundle_event_tickets': {'queue': 'tickets'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'release-ticket-holds': {
+        'task': 'events.tasks.release_ticket_holds',
+        'schedule': 60.0,
+    },
+    'redrive-webhook-inbox': {
+        'task': 'events.tasks.redrive_webhook_inbox',
+        'schedule': 60.0,
+    },
+    'purge-idempotency-keys': {
+        'task': 'events.tasks.purge_idempotency_keys',
+        'schedule': 60.0 * 60,
+    },
+}
+
+# Idempotency-Key replays of /api/pay/initiate/ are answered for this long
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+
+
+# --- ASYNC VIEWS ---
+# Serve payment initiation and the wallet proxy/KYC link endpoints with their async
+# versions (events/views_async.py). Set only on the backend-async service in docker-compose,
+# an ASGI server (gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker) that nginx
+# sends just those paths to; the rest of the API stays on the WSGI backend
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# GET /api/pay/status/<ref>/: longest long-poll (?wait=) and how long one SSE stream
+# stays open (under Nginx's 60s proxy_read_timeout; EventSource reconnects after it)
+PAYMENT_STATUS_MAX_WAIT_SECONDS = config('PAYMENT_STATUS_MAX_WAIT_SECONDS', default=25, cast=int)
+PAYMENT_STATUS_STREAM_SECONDS = config('PAYMENT_STATUS_STREAM_SECONDS', default=55, cast=int)
+
+
+# --- WALLET CACHE ---
+# Organizer balance/history: served fresh for this long, then stale (with a background refresh)
+WALLET_CACHE_FRESH_SECONDS = config('WALLET_CACHE_FRESH_SECONDS', default=15, cast=int)
+WALLET_CACHE_STALE_SECONDS = config('WALLET_CACHE_STALE_SECONDS', default=300, cast=int)
+
+
+# --- WAITING ROOM ---
+# Admission tokens let a buyer call /api/pay/initiate/ for this long after leaving the queue
+ADMISSION_TOKEN_TTL_SECONDS = config('ADMISSION_TOKEN_TTL_SECONDS', default=600, cast=int)
+# ...and at most this many times (a retry or two after a failed M-Pesa prompt)
+ADMISSION_TOKEN_MAX_USES = config('ADMISSION_TOKEN_MAX_USES', default=3, cast=int)
+
+
+# --- TICKET RENDERING ---
+# DejaVu ships with the image (Dockerfile: fonts-dejavu)
+TICKET_FONT_DIR = config('TICKET_FONT_DIR', default='/usr/share/fonts/truetype/dejavu')
+# Email/download encoding: png (full colour), png8 (palette) or webp. See bench_ticket_render.
+TICKET_IMAGE_FORMAT = config('TICKET_IMAGE_FORMAT', default='png8')
+
+
+# --- UPLOADED IMAGES ---
+# Posters, logos and banners beyond these are rejected before decoding
+IMAGE_MAX_DIMENSION = config('IMAGE_MAX_DIMENSION', default=8000, cast=int)
+IMAGE_MAX_PIXELS = config('IMAGE_MAX_PIXELS', default=40_000_000, cast=int)
+
+
+# --- TICKET INVENTORY ---
+# How long seats stay reserved while an M-Pesa prompt is pending
+TICKET_HOLD_TTL_SECONDS = config('TICKET_HOLD_TTL_SECONDS', default=600, cast=int)
+
 
 SITE_ID = 1
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,78 @@
+import multiprocessing
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from events.models import Event, TicketTier, User
+from events.services import inventory
+
+
+def _worker(tier_id, seconds, results):
+    # Forked workers must not share the parent's database socket
+    connections.close_all()
+    tier = TicketTier.objects.get(pk=tier_id)
+    claims = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        hold = inventory.reserve(tier, 1)
+        if hold is None:
+            break
+        claims += 1
+
+    results.put(claims)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures seat reservations per second for a single hot tier, with and without "
+        "striping, across increasing worker counts. Run against Postgres; SQLite "
+        "serializes all writers and will show no scaling."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4,9', help="Comma separated worker counts (gunicorn uses 9)")
+        parser.add_argument('--stripes', default='0,16', help="Comma separated stripe counts (0 = single row)")
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        worker_counts = [int(n) for n in options['workers'].split(',')]
+        stripe_counts = [int(n) for n in options['stripes'].split(',')]
+        seconds = options['seconds']
+
+        organizer = User.objects.create_user(f"bench_{uuid.uuid4().hex[:8]}", role=User.Role.ORGANIZER)
+        start = timezone.now() + timedelta(days=30)
+        event = Event.objects.create(
+            organizer=organizer, title='Inventory Benchmark', description='-', location_name='-',
+            start_datetime=start, end_datetime=start + timedelta(hours=4),
+        )
+
+        self.stdout.write(f"{'stripes':>8} {'workers':>8} {'claims/s':>10}")
+        try:
+            for stripe_count in stripe_counts:
+                for workers in worker_counts:
+                    tier = TicketTier.objects.create(event=event, name='Bench', price=1, quantity_allocated=10_000_000)
+                    if stripe_count:
+                        inventory.configure_striping(tier, stripe_count)
+
+                    connections.close_all()
+                    results = multiprocessing.Queue()
+                    processes = [
+                        multiprocessing.Process(target=_worker, args=(tier.pk, seconds, results))
+                        for _ in range(workers)
+                    ]
+                    for process in processes:
+                        process.start()
+                    total = sum(results.get() for _ in processes)
+                    for process in processes:
+                        process.join()
+
+                    self.stdout.write(f"{stripe_count:>8} {workers:>8} {total / seconds:>10.0f}")
+        finally:
+            event.delete()
+            organizer.delete()
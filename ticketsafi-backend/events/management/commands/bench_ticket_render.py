@@ -0,0 +1,73 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events.models import Event, Ticket, TicketTier
+from events.services import qr_tokens, ticket_render
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures ticket images rendered per second with the background rebuilt for "
+        "every ticket (the old behaviour) and with the cached per-event layer, then "
+        "encode time and size for each output format. Pass --event to include a "
+        "real poster fetched from default_storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', help="Event id to render (defaults to an unsaved sample event)")
+        parser.add_argument('--tickets', type=int, default=200)
+        parser.add_argument('--formats', default=','.join(ticket_render.ENCODERS), help="Comma separated formats to compare")
+
+    def handle(self, *args, **options):
+        if options['event']:
+            try:
+                event = Event.objects.get(pk=options['event'])
+            except Event.DoesNotExist:
+                raise CommandError("Event not found.")
+            tier = event.tiers.first() or TicketTier(event=event, name='Regular', price=0, quantity_allocated=1)
+        else:
+            start = timezone.now() + timedelta(days=30)
+            event = Event(
+                title='Render Benchmark', description='-', location_name='KICC, Nairobi',
+                start_datetime=start, end_datetime=start + timedelta(hours=4), updated_at=timezone.now(),
+            )
+            tier = TicketTier(event=event, name='Regular', price=0, quantity_allocated=1)
+
+        # Unsaved tickets: rendering reads no database rows
+        tickets = [
+            Ticket(
+                id=uuid.uuid4(), event=event, tier=tier, attendee_name=f"Attendee {n}",
+                qr_code_hash=qr_tokens.issue_token(event.id, tier.id, uuid.uuid4()),
+            )
+            for n in range(options['tickets'])
+        ]
+
+        self.stdout.write(f"{'mode':>10} {'tickets/s':>10} {'ms/ticket':>10}")
+        for mode, use_cache in (('uncached', False), ('cached', True)):
+            ticket_render.clear_layer_cache()
+            ticket_render.render_ticket(tickets[0], use_cache=use_cache)  # warm fonts and layer
+
+            started = time.perf_counter()
+            for ticket in tickets:
+                ticket_render.render_ticket_bytes(ticket, 'png', use_cache=use_cache)
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(f"{mode:>10} {len(tickets) / elapsed:>10.1f} {elapsed * 1000 / len(tickets):>10.1f}")
+
+        # Encoders only: composite once, encode each format
+        images = [ticket_render.render_ticket(ticket) for ticket in tickets]
+        self.stdout.write(f"\n{'format':>10} {'ms/encode':>10} {'avg KB':>10}")
+        for fmt in options['formats'].split(','):
+            started = time.perf_counter()
+            sizes = [len(ticket_render.encode(image, fmt)) for image in images]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{fmt:>10} {elapsed * 1000 / len(images):>10.1f} {sum(sizes) / len(sizes) / 1024:>10.1f}")
+
+        started = time.perf_counter()
+        sizes = [len(ticket_render.qr_svg(ticket.qr_code_hash).encode()) for ticket in tickets]
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{'qr svg':>10} {elapsed * 1000 / len(tickets):>10.1f} {sum(sizes) / len(sizes) / 1024:>10.1f}")
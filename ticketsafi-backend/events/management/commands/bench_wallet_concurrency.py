@@ -0,0 +1,141 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from events.management.commands.stub_wallet import StubWalletHandler
+from events.models import User
+
+
+MODES = {
+    # The docker-compose backend service: a thread per in-flight request
+    'wsgi': ['core.wsgi:application', '--threads', '{threads}'],
+    # The backend-async service (ASYNC_VIEWS under uvicorn workers): a coroutine per in-flight wallet call
+    'asgi': ['core.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares how many concurrent requests to a wallet-bound endpoint the WSGI "
+        "(gunicorn threads) and ASGI (uvicorn workers + async views) deployments "
+        "sustain when the Wallet service is slow. Starts a stub wallet and a gunicorn "
+        "per mode, fires bursts of concurrent requests and reports req/s and latency. "
+        "Point --path at a sync endpoint to see what ASGI costs everything else."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(MODES), help="Comma separated: wsgi, asgi")
+        parser.add_argument('--concurrency', default='8,32,128', help="Comma separated burst sizes")
+        parser.add_argument('--latency-ms', type=float, default=1000.0, help="Stub wallet response time")
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=2, help="Threads per WSGI worker")
+        parser.add_argument(
+            '--path', default='/api/organizer/wallet/link/',
+            help="Endpoint to load (the KYC link calls the wallet on every request)",
+        )
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        handler = type('Handler', (StubWalletHandler,), {'latency': options['latency_ms'] / 1000, 'jitter': 0.0})
+        wallet = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        wallet.daemon_threads = True
+        threading.Thread(target=wallet.serve_forever, daemon=True).start()
+
+        organizer, _ = User.objects.get_or_create(
+            username='bench-organizer',
+            defaults={'email': 'bench-organizer@yadi.app', 'role': User.Role.ORGANIZER},
+        )
+        token = str(RefreshToken.for_user(organizer).access_token)
+
+        self.stdout.write(
+            f"Wallet latency {options['latency_ms']:.0f}ms, {options['workers']} workers "
+            f"({options['threads']} threads each under wsgi), {options['path']}"
+        )
+        self.stdout.write(f"{'mode':>6} {'burst':>6} {'ok':>5} {'errors':>6} {'wall s':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8}")
+        try:
+            for mode in modes:
+                port = _free_port()
+                server = self._start(mode, port, wallet.server_port, options)
+                try:
+                    url = f"http://127.0.0.1:{port}{options['path']}"
+                    asyncio.run(self._burst(url, token, options['workers'] * 2))  # Warm up every worker
+                    for level in levels:
+                        row = asyncio.run(self._burst(url, token, level))
+                        self.stdout.write(f"{mode:>6} {level:>6} " + "{:>5} {:>6} {:>7.2f} {:>7.1f} {:>8.0f} {:>8.0f}".format(*row))
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+        finally:
+            wallet.shutdown()
+            wallet.server_close()
+
+    def _start(self, mode, port, wallet_port, options):
+        app, *extra = MODES[mode]
+        command = [
+            sys.executable, '-m', 'gunicorn', app,
+            '--bind', f"127.0.0.1:{port}", '--workers', str(options['workers']), '--timeout', '120',
+            *[arg.format(threads=options['threads']) for arg in extra],
+        ]
+        env = {
+            **os.environ,
+            'WALLET_SERVICE_URL': f"http://127.0.0.1:{wallet_port}/api/service/",
+            'WALLET_SERVICE_KEY': os.environ.get('WALLET_SERVICE_KEY', 'bench'),
+            'ASYNC_VIEWS': 'True' if mode == 'asgi' else 'False',
+        }
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn ({mode}) exited with status {server.returncode}")
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"gunicorn ({mode}) did not start")
+
+    async def _burst(self, url, token, concurrency):
+        """ Sends `concurrency` requests at once. Returns (ok, errors, wall s, req/s, p50 ms, p95 ms). """
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=300, headers={'Authorization': f"Bearer {token}"}) as client:
+            async def one():
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                return ok, (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            results = await asyncio.gather(*[one() for _ in range(concurrency)])
+            wall = time.perf_counter() - started
+
+        timings = sorted(ms for ok, ms in results if ok) or [0.0]
+        ok = sum(1 for success, _ in results if success)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return ok, concurrency - ok, wall, ok / wall, statistics.median(timings), p95
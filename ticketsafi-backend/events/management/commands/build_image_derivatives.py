@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+from events.services import images
+from stores.models import Store
+
+
+class Command(BaseCommand):
+    help = "Generates WebP derivatives for posters, logos and banners uploaded before the derivative pipeline existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild derivatives that already exist")
+
+    def handle(self, *args, **options):
+        jobs = [
+            (Event.objects.exclude(poster_image=''), 'poster_image', 'poster_derivatives', images.POSTER),
+            (Store.objects.exclude(logo_image=''), 'logo_image', 'logo_derivatives', images.LOGO),
+            (Store.objects.exclude(banner_image=''), 'banner_image', 'banner_derivatives', images.BANNER),
+        ]
+
+        for queryset, field, derivatives_field, spec in jobs:
+            queryset = queryset.exclude(**{f'{field}__isnull': True})
+            if not options['force']:
+                queryset = queryset.filter(**{derivatives_field: {}})
+
+            built = 0
+            for instance in queryset.iterator():
+                images.refresh(instance, field, derivatives_field, spec)
+                built += 1
+            self.stdout.write(f"{queryset.model.__name__}.{field}: {built} rebuilt")
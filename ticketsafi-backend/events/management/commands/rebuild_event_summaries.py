@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.models import Event
+from events.services import event_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes every event's price range and availability summary from its tiers. "
+        "Sales and tier edits keep it current; run this after editing counters by hand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--upcoming', action='store_true', help="Only events that have not ended")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['upcoming']:
+            events = events.filter(end_datetime__gt=timezone.now())
+        updated = event_summary.refresh(events)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {updated} event summaries."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from events.models import Event
+from events.services import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes every event's search_vector (Postgres). Saves keep it current; "
+        "run this after changing the weighted fields in services/search.py."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write("Not on Postgres: search uses icontains, nothing to rebuild.")
+            return
+        search.update_vectors(Event.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {Event.objects.count()} search vectors."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from events.services import inventory
+
+
+class Command(BaseCommand):
+    help = "Releases tier seats held by expired or failed M-Pesa payments. Run every minute from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = inventory.release_expired_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds."))
@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Ticket
+from events.services import bulk_render, ticket_render
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders and stores ticket images for a whole event or one booking across a "
+        "process pool, optionally bundling them into one PDF or ZIP per buyer."
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--event', help="Event id: every non-cancelled ticket")
+        target.add_argument('--payment', help="Payment reference code: every ticket of that booking")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Render processes (1 = inline)")
+        parser.add_argument('--format', dest='fmt', choices=list(ticket_render.ENCODERS), help="Image format (default TICKET_IMAGE_FORMAT)")
+        parser.add_argument('--bundle', choices=['pdf', 'zip'], help="Also build one file per buyer")
+
+    def handle(self, *args, **options):
+        tickets = Ticket.objects.exclude(status=Ticket.Status.CANCELLED)
+        if options['event']:
+            tickets = tickets.filter(event_id=options['event'])
+        else:
+            tickets = tickets.filter(payment__reference_code=options['payment'])
+
+        ticket_ids = list(tickets.values_list('id', flat=True))
+        if not ticket_ids:
+            raise CommandError("No tickets found.")
+
+        def progress(done, total, elapsed):
+            self.stdout.write(f"{done}/{total} rendered  {done / elapsed:.1f} tickets/s")
+
+        self.stdout.write(f"Rendering {len(ticket_ids)} tickets with {options['workers']} workers...")
+        bulk_render.render_tickets(ticket_ids, workers=options['workers'], fmt=options['fmt'], progress=progress)
+
+        if options['bundle']:
+            paths = bulk_render.bundle(ticket_ids, kind=options['bundle'], fmt=options['fmt'])
+            for owner_id, path in paths.items():
+                self.stdout.write(f"{owner_id}: {path}")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,85 @@
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class StubWalletHandler(BaseHTTPRequestHandler):
+    """ Answers the Wallet service endpoints WalletClient uses with canned JSON """
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real service behind its proxy
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self):
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+        if random.random() < self.error_rate:
+            status, payload = 503, {"error": "stub failure"}
+        else:
+            status, payload = 200, self._payload(self.path.split('/api/service/', 1)[-1], body)
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _payload(self, endpoint, body):
+        if endpoint.startswith('balance/'):
+            return {"balance": 125000.00, "pending_payouts": 5000.00, "currency": "KES", "is_frozen": False, "is_kyc_verified": True}
+        if endpoint.startswith('history/'):
+            return {"count": 1, "next": None, "previous": None, "results": [
+                {"id": 1, "type": "CREDIT", "amount": "1000.00", "reference": "TS-STUB", "created_at": "2024-01-01T00:00:00Z"},
+            ]}
+        if endpoint.startswith('payment/collect/'):
+            return {"status": "PENDING", "mpesa_ref": f"ws_CO_{uuid.uuid4().hex[:12]}", "reference": body.get('reference')}
+        if endpoint.startswith('withdraw/'):
+            return {"status": "QUEUED", "amount": body.get('amount')}
+        if endpoint.startswith('onboard/'):
+            return {"wallet_id": f"WAL-{uuid.uuid4().hex[:10].upper()}"}
+        if endpoint.startswith('auth/link/'):
+            return {"magic_link": f"http://localhost:8001/kyc/{uuid.uuid4().hex}"}
+        return {}
+
+    do_GET = _reply
+    do_POST = _reply
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local stand-in for the Wallet service (set WALLET_SERVICE_URL="
+        "http://localhost:<port>/api/service/) with configurable latency and error "
+        "rate, for load testing the payment and wallet endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency-ms', type=float, default=50.0)
+        parser.add_argument('--jitter-ms', type=float, default=10.0)
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+
+    def handle(self, *args, **options):
+        handler = type('Handler', (StubWalletHandler,), {
+            'latency': options['latency_ms'] / 1000,
+            'jitter': options['jitter_ms'] / 1000,
+            'error_rate': options['error_rate'],
+        })
+        server = ThreadingHTTPServer(('0.0.0.0', options['port']), handler)
+        self.stdout.write(f"Stub wallet on http://localhost:{options['port']}/api/service/ (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_event_is_private'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='qr_code_hash',
+            field=models.CharField(db_index=True, editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_ticket_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='checked_in_device',
+            field=models.CharField(blank=True, help_text='Scanner device that won the check-in', max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0015_ticket_checked_in_device'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='hold_status',
+            field=models.CharField(blank=True, choices=[('HELD', 'Seats Reserved'), ('COMMITTED', 'Seats Sold'), ('RELEASED', 'Seats Released')], max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='tickettier',
+            name='quantity_reserved',
+            field=models.PositiveIntegerField(default=0, help_text='Held for pending M-Pesa payments'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['hold_status', 'hold_expires_at'], name='payment_hold_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-18 02:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0016_tier_inventory_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='inventory_stripe',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tickettier',
+            name='stripe_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Spread inventory over N counter rows for flash sales (0 = off)'),
+        ),
+        migrations.CreateModel(
+            name='TierInventoryStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity_allocated', models.PositiveIntegerField(default=0)),
+                ('quantity_sold', models.PositiveIntegerField(default=0)),
+                ('quantity_reserved', models.PositiveIntegerField(default=0)),
+                ('tier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripes', to='events.tickettier')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tierinventorystripe',
+            constraint=models.UniqueConstraint(fields=('tier', 'index'), name='unique_tier_stripe'),
+        ),
+    ]
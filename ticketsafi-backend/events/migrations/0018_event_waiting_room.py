@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0017_tier_inventory_stripes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='admission_rate',
+            field=models.PositiveIntegerField(default=300, help_text='Buyers admitted from the queue per minute'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waiting_room_enabled',
+            field=models.BooleanField(default=False, help_text='Queue buyers before they can pay'),
+        ),
+    ]
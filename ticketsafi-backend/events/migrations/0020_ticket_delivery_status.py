@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0019_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='delivery_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='delivery_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='delivery_status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Queued'), ('SENT', 'Sent'), ('FAILED', 'Failed')], max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0021_event_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='poster_derivatives',
+            field=models.JSONField(blank=True, default=dict, help_text='Resized WebP copies of the poster (services/images.py)'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+
+INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+    django.contrib.postgres.indexes.GinIndex(fields=['title'], name='event_title_trgm_idx', opclasses=['gin_trgm_ops']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # GIN and pg_trgm only exist on Postgres; SQLite (local development) searches with icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Event = apps.get_model('events', 'Event')
+    for index in INDEXES:
+        schema_editor.add_index(Event, index)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Event = apps.get_model('events', 'Event')
+    for index in INDEXES:
+        schema_editor.remove_index(Event, index)
+
+
+def backfill_vectors(apps, schema_editor):
+    # Same expression as events.services.search.vector(), against the historical models
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Event = apps.get_model('events', 'Event')
+    User = apps.get_model('events', 'User')
+    organizer = User.objects.filter(pk=OuterRef('organizer_id')).annotate(
+        name=Concat('first_name', Value(' '), 'last_name', Value(' '), 'username', output_field=CharField())
+    ).values('name')
+    Event.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='simple')
+        + SearchVector('location_name', weight='B', config='simple')
+        + SearchVector(Subquery(organizer), weight='C', config='simple')
+        + SearchVector('description', weight='D', config='simple')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0023_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='event', index=index) for index in INDEXES],
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+        ),
+        migrations.RunPython(backfill_vectors, migrations.RunPython.noop),
+    ]
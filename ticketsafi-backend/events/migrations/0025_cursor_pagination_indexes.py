@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0024_event_search'),
+        ('stores', '0003_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_datetime', 'id'], name='event_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['organizer', 'start_datetime', 'id'], name='event_organizer_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'purchase_date', 'id'], name='ticket_event_purchase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['owner', 'purchase_date', 'id'], name='ticket_owner_purchase_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:46
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+
+
+def backfill_summaries(apps, schema_editor):
+    # Same expressions as events.services.event_summary.columns(), against the historical models
+    Event = apps.get_model('events', 'Event')
+    TicketTier = apps.get_model('events', 'TicketTier')
+    TierInventoryStripe = apps.get_model('events', 'TierInventoryStripe')
+    tiers = TicketTier.objects.filter(event=OuterRef('pk')).order_by().values('event')
+    stripes = TierInventoryStripe.objects.filter(tier__event=OuterRef('pk')).order_by().values('tier__event')
+
+    def over(queryset, aggregate, output_field):
+        return Subquery(queryset.annotate(total=aggregate).values('total'), output_field=output_field)
+
+    price = Event._meta.get_field('min_price')
+    capacity = Coalesce(over(tiers, Sum('quantity_allocated'), IntegerField()), 0)
+    sold = (
+        Coalesce(over(tiers, Sum('quantity_sold'), IntegerField()), 0)
+        + Coalesce(over(stripes, Sum('quantity_sold'), IntegerField()), 0)
+    )
+    Event.objects.update(
+        min_price=over(tiers, Min('price'), price),
+        max_price=over(tiers, Max('price'), price),
+        total_capacity=capacity,
+        total_sold=sold,
+        sold_out=Case(
+            When(LessThanOrEqual(capacity, 0), then=Value(False)),
+            When(LessThanOrEqual(capacity, sold), then=Value(True)),
+            default=Value(False),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0025_cursor_pagination_indexes'),
+        ('stores', '0003_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='sold_out',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='total_capacity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='total_sold',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['min_price'], name='event_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['max_price'], name='event_max_price_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0027_catalog_index_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='employer',
+            field=models.ForeignKey(blank=True, help_text='Organizer this gate scanner account works for', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='scanners', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:01
+
+from django.db import migrations, models
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce, Left
+
+
+def backfill_reported_status(apps, schema_editor):
+    # Existing rows are one per reference, so the new key cannot collide
+    WebhookInbox = apps.get_model('events', 'WebhookInbox')
+    WebhookInbox.objects.update(reported_status=Coalesce(Left(KeyTextTransform('status', 'payload'), 20), models.Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0028_scanner_employer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookinbox',
+            name='reported_status',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(backfill_reported_status, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='webhookinbox',
+            name='reference',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='webhookinbox',
+            constraint=models.UniqueConstraint(fields=('reference', 'reported_status'), name='webhook_inbox_delivery_unique'),
+        ),
+    ]
@@ -1,8 +1,12 @@
 import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
+from .services import qr_tokens
+
 # --- 1. Custom User Model ---
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -19,11 +23,25 @@ class User(AbstractUser):
     is_verified = models.BooleanField(default=False)
     wallet_id = models.UUIDField(null=True, blank=True, unique=True, help_text="Linked Yadi Wallet ID")
     is_guest = models.BooleanField(default=False, help_text="Flag for auto-generated guest accounts")
+    # Gate scanner accounts work for one organizer and only scan (and download keys for) their events
+    employer = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='scanners',
+        help_text="Organizer this gate scanner account works for",
+    )
 
     def __str__(self):
         return f"{self.username} ({self.role})"
 
 # --- 2. Event Model ---
+class EventQuerySet(models.QuerySet):
+    def for_catalog(self):
+        """
+        Everything EventListSerializer reads, in one query: organizer and store
+        joined (prices come from the event's own summary columns).
+        """
+        return self.select_related('organizer', 'store')
+
+
 class Event(models.Model):
     class Category(models.TextChoices):
         CONCERT = 'CONCERT', 'Concert'
@@ -56,15 +74,45 @@ class Event(models.Model):
     end_datetime = models.DateTimeField()
     
     poster_image = models.ImageField(upload_to='event_posters/', blank=True, null=True)
+    poster_derivatives = models.JSONField(default=dict, blank=True, help_text="Resized WebP copies of the poster (services/images.py)")
     
     is_offline_ready = models.BooleanField(default=False)
     whatsapp_integration_enabled = models.BooleanField(default=False)
     is_private = models.BooleanField(default=False)
+
+    waiting_room_enabled = models.BooleanField(default=False, help_text="Queue buyers before they can pay")
+    admission_rate = models.PositiveIntegerField(default=300, help_text="Buyers admitted from the queue per minute")
     
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Versions the cached ticket background
 
-    
+    # Weighted title/location/organizer/description, maintained by signals.py (services/search.py)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    # Tier summary for catalog cards and price filters, maintained by services/event_summary.py
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    total_capacity = models.PositiveIntegerField(default=0, editable=False)
+    total_sold = models.PositiveIntegerField(default=0, editable=False)
+    sold_out = models.BooleanField(default=False, editable=False)
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Postgres only: the migration skips them on other databases
+            GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='event_title_trgm_idx'),
+            # The public catalog: published events by start (also its cursor ordering, events/pagination.py)
+            models.Index(fields=['start_datetime', 'id'], condition=models.Q(is_published=True), name='event_published_start_idx'),
+            models.Index(fields=['category', 'start_datetime', 'id'], condition=models.Q(is_published=True), name='event_published_category_idx'),
+            # Organizer dashboard lists, latest first
+            models.Index(fields=['organizer', 'start_datetime', 'id'], name='event_organizer_start_idx'),
+            # Price filters (EventListView)
+            models.Index(fields=['min_price'], name='event_min_price_idx'),
+            models.Index(fields=['max_price'], name='event_max_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -80,13 +128,50 @@ class TicketTier(models.Model):
     
     quantity_allocated = models.PositiveIntegerField()
     quantity_sold = models.PositiveIntegerField(default=0)
+    quantity_reserved = models.PositiveIntegerField(default=0, help_text="Held for pending M-Pesa payments")
+    stripe_count = models.PositiveSmallIntegerField(default=0, help_text="Spread inventory over N counter rows for flash sales (0 = off)")
+
+    def _counters(self):
+        # Striped tiers keep their live counters on the stripe rows (prefetch 'stripes' to avoid a query)
+        if self.stripe_count:
+            stripes = list(self.stripes.all())
+            return (
+                sum(s.quantity_allocated for s in stripes),
+                sum(s.quantity_sold for s in stripes),
+                sum(s.quantity_reserved for s in stripes),
+            )
+        return self.quantity_allocated, self.quantity_sold, self.quantity_reserved
+
+    def sold_qty(self):
+        return self._counters()[1]
 
     def available_qty(self):
-        return self.quantity_allocated - self.quantity_sold
+        allocated, sold, reserved = self._counters()
+        return allocated - sold - reserved
 
     def __str__(self):
         return f"{self.name} - KES {self.price}"
 
+class TierInventoryStripe(models.Model):
+    """
+    One slice of a striped tier's inventory. Buyers claim from a random stripe,
+    so concurrent purchases lock different rows instead of queueing on the tier.
+    """
+    tier = models.ForeignKey(TicketTier, on_delete=models.CASCADE, related_name='stripes')
+    index = models.PositiveSmallIntegerField()
+
+    quantity_allocated = models.PositiveIntegerField(default=0)
+    quantity_sold = models.PositiveIntegerField(default=0)
+    quantity_reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tier', 'index'], name='unique_tier_stripe'),
+        ]
+
+    def __str__(self):
+        return f"{self.tier} [stripe {self.index}]"
+
 # --- 4. The Ticket (Digital Asset) ---
 class Ticket(models.Model):
     class Status(models.TextChoices):
@@ -105,8 +190,11 @@ class Ticket(models.Model):
     attendee_email = models.EmailField(blank=True, null=True)
     # ------------------------------------
 
-    qr_code_hash = models.CharField(max_length=255, editable=False) 
+    payment = models.ForeignKey('Payment', on_delete=models.SET_NULL, null=True, blank=True, related_name='tickets')
+
+    qr_code_hash = models.CharField(max_length=255, editable=False, db_index=True)
     purchase_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Drives scanner manifest delta sync")
     
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
     
@@ -118,10 +206,32 @@ class Ticket(models.Model):
         related_name='scanned_tickets',
         limit_choices_to={'role': User.Role.SCANNER}
     )
+    checked_in_device = models.CharField(max_length=64, blank=True, null=True, help_text="Scanner device that won the check-in")
+
+    # Email delivery of the rendered ticket (events.tasks.deliver_ticket)
+    class Delivery(models.TextChoices):
+        PENDING = 'PENDING', 'Queued'
+        SENT = 'SENT', 'Sent'
+        FAILED = 'FAILED', 'Failed'
+
+    delivery_status = models.CharField(max_length=20, choices=Delivery.choices, blank=True, null=True)
+    delivery_attempts = models.PositiveIntegerField(default=0)
+    delivery_error = models.TextField(blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'updated_at'], name='ticket_event_updated_idx'),
+            # Cursor pagination orderings (events/pagination.py)
+            models.Index(fields=['event', 'purchase_date', 'id'], name='ticket_event_purchase_idx'),
+            models.Index(fields=['owner', 'purchase_date', 'id'], name='ticket_owner_purchase_idx'),
+            # Per-event counts by status (guest lists, dashboards)
+            models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.qr_code_hash:
-            self.qr_code_hash = f"{self.id}-{uuid.uuid4().hex[:8]}"
+            self.qr_code_hash = qr_tokens.issue_token(self.event_id, self.tier_id, self.id)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -134,6 +244,11 @@ class Payment(models.Model):
         COMPLETED = 'COMPLETED', 'Completed'
         FAILED = 'FAILED', 'Failed'
 
+    class Hold(models.TextChoices):
+        HELD = 'HELD', 'Seats Reserved'
+        COMMITTED = 'COMMITTED', 'Seats Sold'
+        RELEASED = 'RELEASED', 'Seats Released'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payments')
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
@@ -149,9 +264,80 @@ class Payment(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Inventory hold taken on the tier while the M-Pesa prompt is pending
+    quantity = models.PositiveIntegerField(default=1)
+    inventory_stripe = models.PositiveSmallIntegerField(blank=True, null=True)
+    hold_status = models.CharField(max_length=20, choices=Hold.choices, blank=True, null=True)
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hold_status', 'hold_expires_at'], name='payment_hold_expiry_idx'),
+            # Revenue per event (OrganizerDashboardView)
+            models.Index(fields=['event', 'status'], name='payment_event_status_idx'),
+            # M-Pesa CheckoutRequestID lookups; only prompted payments have one
+            models.Index(fields=['checkout_request_id'], condition=models.Q(checkout_request_id__isnull=False), name='payment_checkout_idx'),
+        ]
+
     def __str__(self):
         return f"{self.phone_number} - {self.amount}"
 
+# --- Payment Webhook Inbox ---
+class WebhookInbox(models.Model):
+    """
+    Raw payment webhooks, stored before we acknowledge the provider and
+    processed later by a Celery worker. One row per delivery: a payment
+    reference together with the status the provider reported for it, so a
+    FAILED and a later COMPLETED for the same payment are both kept.
+    """
+    class Status(models.TextChoices):
+        RECEIVED = 'RECEIVED', 'Received'
+        PROCESSED = 'PROCESSED', 'Processed'
+        FAILED = 'FAILED', 'Failed'
+
+    reference = models.CharField(max_length=50)
+    reported_status = models.CharField(max_length=20, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.RECEIVED)
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'received_at'], name='webhook_inbox_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['reference', 'reported_status'], name='webhook_inbox_delivery_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} {self.reported_status} ({self.status})"
+
+# --- Idempotency Keys ---
+class IdempotencyKey(models.Model):
+    """
+    An Idempotency-Key sent with POST /api/pay/initiate/ and the response it
+    got, so a retried request is answered from here instead of running again.
+    response_status is empty while the first request is still in flight.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
+
 # --- NEW MODEL: Organizer Invitation Code ---
 class OrganizerInvitationCode(models.Model):
     code = models.CharField(max_length=20, unique=True, help_text="The secret code for organizer registration.")
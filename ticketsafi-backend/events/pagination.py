@@ -0,0 +1,163 @@
+"""
+Pagination for the long lists (tickets, attendees, events).
+
+Page numbers stay the default so existing clients keep working, but each
+page costs a COUNT(*) and an OFFSET that grows with the page number. Clients
+that send ?pagination=cursor (and then follow the `next`/`previous` links,
+which carry ?cursor=) get keyset pagination instead: the cursor holds the
+(ordering field, id) of the row at the edge of the page, and the next page is
+one query with a row comparison, WHERE (purchase_date, id) > (%s, %s), that
+seeks through the composite index on the ordering however deep it is, even
+when thousands of rows share a timestamp. Cursor responses have no `count`.
+
+DRF's CursorPagination is not used: it compares on the first ordering field
+only and pages through equal values with an OFFSET kept in the cursor.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class Row(Func):
+    """ A row value, (a, b), for comparing tuples """
+    template = '(%(expressions)s)'
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over `ordering`: one field and then 'id', both in the
+    same direction, e.g. ('-purchase_date', '-id').
+    """
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering, cursor_query_param='cursor'):
+        self.ordering = ordering
+        self.cursor_query_param = cursor_query_param
+        self.descending = ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in ordering]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        model = queryset.model
+        cursor = self.decode_cursor(request, model)
+        reverse = cursor is not None and cursor['reverse']
+
+        # A `previous` link walks back: flip the order, then the page
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(*[prefix + name for name in self.fields])
+        if cursor is not None:
+            output_field = model._meta.get_field(self.fields[0])
+            row = Row(*[F(name) for name in self.fields], output_field=output_field)
+            edge = Row(*cursor['values'], output_field=output_field)
+            queryset = queryset.filter((LessThan if descending else GreaterThan)(row, edge))
+
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, cursor is not None
+        return self.page
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            raw = data['v']
+            if len(raw) != len(self.fields):
+                raise ValueError
+            values = []
+            for name, value in zip(self.fields, raw):
+                field = model._meta.get_field(name)
+                values.append(Value(field.to_python(value), output_field=field))
+            return {'values': values, 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        values = [str(getattr(obj, name)) for name in self.fields]
+        payload = json.dumps({'v': values, 'r': reverse} if reverse else {'v': values})
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class PageOrCursorPagination(BasePagination):
+    """
+    PageNumberPagination, or KeysetPagination over `ordering` when the client
+    asks for it. Subclasses set `ordering`: one field, then 'id' so the order
+    is total.
+    """
+    ordering = None
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.cursor = KeysetPagination(self.ordering, self.cursor_query_param)
+        self.page_number = PageNumberPagination()
+        self.active = self.page_number
+
+    def use_cursor(self, request):
+        return self.cursor_query_param in request.query_params or request.query_params.get('pagination') == 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.cursor if self.use_cursor(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+
+class TicketPagination(PageOrCursorPagination):
+    """ A buyer's tickets, newest first (index ticket_owner_purchase_idx) """
+    ordering = ('-purchase_date', '-id')
+
+
+class AttendeePagination(PageOrCursorPagination):
+    """ An event's guest list in purchase order (index ticket_event_purchase_idx) """
+    ordering = ('purchase_date', 'id')
+
+
+class EventPagination(PageOrCursorPagination):
+    """ The public catalog, soonest first (index event_published_start_idx) """
+    ordering = ('start_datetime', 'id')
+
+    def use_cursor(self, request):
+        # Search results are ordered by relevance, which a cursor cannot seek on
+        return super().use_cursor(request) and not request.query_params.get('q')
+
+
+class OrganizerEventPagination(PageOrCursorPagination):
+    """ An organizer's events, latest first (index event_organizer_start_idx) """
+    ordering = ('-start_datetime', '-id')
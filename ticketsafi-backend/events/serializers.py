@@ -2,9 +2,10 @@ from django.core.mail import EmailMessage
 import json
 from django.conf import settings
 from rest_framework import serializers
-from django.db.models import Min
 from .models import User, Event, TicketTier, Ticket, Payment, OrganizerInvitationCode 
 from stores.models import Store
+from django.urls import reverse
+from .services import images, inventory, ticket_images, waiting_room
 from allauth.account.forms import ResetPasswordForm
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
@@ -13,12 +14,19 @@ from django.template.loader import render_to_string
 
 # --- NEW: Simple Serializer for Store Info in Events ---
 class SimpleStoreSerializer(serializers.ModelSerializer):
+    logo_urls = serializers.SerializerMethodField()
+
     class Meta:
         model = Store
-        fields = ['id', 'name', 'slug', 'logo_image']
+        fields = ['id', 'name', 'slug', 'logo_image', 'logo_urls']
+
+    def get_logo_urls(self, obj):
+        return images.urls(obj.logo_image, obj.logo_derivatives, images.LOGO)
 
 class TicketTierSerializer(serializers.ModelSerializer):
     available_qty = serializers.ReadOnlyField()
+    # Striped tiers aggregate their counters from the stripe rows
+    quantity_sold = serializers.ReadOnlyField(source='sold_qty')
 
     class Meta:
         model = TicketTier
@@ -155,6 +163,8 @@ class CustomRegisterSerializer(serializers.ModelSerializer):
 class EventListSerializer(serializers.ModelSerializer):
     organizer_name = serializers.ReadOnlyField(source='organizer.username')
     lowest_price = serializers.SerializerMethodField()
+    # Resized WebP copies: thumb, card, ticket, hero (+ original)
+    poster_urls = serializers.SerializerMethodField()
     
     # UPDATED: Return full store object instead of just slug
     store = SimpleStoreSerializer(read_only=True)
@@ -163,12 +173,15 @@ class EventListSerializer(serializers.ModelSerializer):
         model = Event
         fields = [
             'id', 'title', 'start_datetime', 'end_datetime', 'location_name', 
-            'poster_image', 'lowest_price', 'category', 'organizer_name', 'store'
+            'poster_image', 'poster_urls', 'lowest_price', 'sold_out', 'category', 'organizer_name', 'store'
         ]
 
+    def get_poster_urls(self, obj):
+        return images.urls(obj.poster_image, obj.poster_derivatives, images.POSTER)
+
     def get_lowest_price(self, obj):
-        min_price = obj.tiers.aggregate(Min('price'))['price__min']
-        return min_price if min_price is not None else 0
+        # Maintained on the event row (services/event_summary.py)
+        return obj.min_price if obj.min_price is not None else 0
 
 class EventDetailSerializer(EventListSerializer):
     tiers = TicketTierSerializer(many=True, read_only=True)
@@ -186,6 +199,8 @@ class TicketSerializer(serializers.ModelSerializer):
     organizer_name = serializers.ReadOnlyField(source='event.organizer.username')
     tier_name = serializers.ReadOnlyField(source='tier.name')
     tier_price = serializers.ReadOnlyField(source='tier.price')
+    image_url = serializers.SerializerMethodField()
+    qr_svg_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Ticket
@@ -194,18 +209,40 @@ class TicketSerializer(serializers.ModelSerializer):
             'attendee_name', 'attendee_email',
             'event_title', 'event_image', 'event_location', 
             'event_start_date', 'event_end_date', 'organizer_name', 
-            'tier_name', 'tier_price'
+            'tier_name', 'tier_price', 'delivery_status', 'delivered_at', 'image_url', 'qr_svg_url'
         ]
 
+    def _absolute(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image_url(self, obj):
+        # Versioned, cache-forever URL of the rendered ticket image
+        fmt = settings.TICKET_IMAGE_FORMAT
+        return self._absolute(reverse('ticket-image-versioned', kwargs={
+            'id': obj.id, 'key': ticket_images.image_key(obj, fmt), 'fmt': fmt,
+        }))
+
+    def get_qr_svg_url(self, obj):
+        return self._absolute(reverse('ticket-qr-svg', kwargs={'id': obj.id}))
+
+class OfflineScanSerializer(serializers.Serializer):
+    """ One queued check-in uploaded by a scanner device after it reconnects """
+    qr_hash = serializers.CharField(max_length=255)
+    scanned_at = serializers.DateTimeField()
+    device_id = serializers.CharField(max_length=64)
+
 class NestedTicketTierSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(required=False)
-    quantity_sold = serializers.IntegerField(read_only=True) 
+    quantity_sold = serializers.IntegerField(read_only=True, source='sold_qty') 
 
     class Meta:
         model = TicketTier
-        fields = ['id', 'name', 'description', 'price', 'quantity_allocated', 'quantity_sold']
+        fields = ['id', 'name', 'description', 'price', 'quantity_allocated', 'quantity_sold', 'stripe_count']
 
 class EventCreateUpdateSerializer(serializers.ModelSerializer):
+    EDITABLE_TIER_FIELDS = ('name', 'description', 'price', 'quantity_allocated')
+
     tiers = serializers.CharField(write_only=True) 
     
     # Write: Use ID to link
@@ -220,9 +257,18 @@ class EventCreateUpdateSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'category', 
             'location_name', 'start_datetime', 'end_datetime', 
-            'poster_image', 'is_published', 'tiers', 'store'
+            'poster_image', 'is_published', 'is_offline_ready',
+            'waiting_room_enabled', 'admission_rate', 'tiers', 'store'
         ]
         
+    def validate_poster_image(self, value):
+        if value:
+            try:
+                images.check_dimensions(value)
+            except images.ImageTooLarge as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
     def validate_tiers(self, value):
         try:
             tiers_data = json.loads(value)
@@ -259,7 +305,13 @@ class EventCreateUpdateSerializer(serializers.ModelSerializer):
         event = Event.objects.create(**validated_data)
         
         for tier_data in tiers_data:
-            TicketTier.objects.create(event=event, **tier_data)
+            stripe_count = int(tier_data.pop('stripe_count', 0) or 0)
+            tier = TicketTier.objects.create(event=event, **tier_data)
+            if stripe_count:
+                inventory.configure_striping(tier, stripe_count)
+
+        if event.poster_image:
+            images.refresh(event, 'poster_image', 'poster_derivatives', images.POSTER)
         
         return event
 
@@ -269,22 +321,34 @@ class EventCreateUpdateSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
+        waiting_room.forget_config(instance.id)
+        if 'poster_image' in validated_data:
+            images.refresh(instance, 'poster_image', 'poster_derivatives', images.POSTER)
 
         if tiers_data is not None:
             tiers_to_keep = []
             for tier_data in tiers_data:
                 tier_id = tier_data.pop('id', None)
+                stripe_count = tier_data.pop('stripe_count', None)
                 if tier_id:
                     try:
                         tier = TicketTier.objects.get(id=tier_id, event=instance)
+                        allocation_changed = str(tier_data.get('quantity_allocated', tier.quantity_allocated)) != str(tier.quantity_allocated)
                         for attr, value in tier_data.items():
                             setattr(tier, attr, value)
-                        tier.save()
+                        # Only write editable columns so live sale counters are never overwritten
+                        tier.save(update_fields=[f for f in tier_data if f in self.EDITABLE_TIER_FIELDS])
+                        if stripe_count is not None and int(stripe_count) != tier.stripe_count:
+                            inventory.configure_striping(tier, int(stripe_count))
+                        elif tier.stripe_count and allocation_changed:
+                            inventory.configure_striping(tier, tier.stripe_count)
                         tiers_to_keep.append(tier_id)
                     except TicketTier.DoesNotExist:
                         pass
                 else:
                     new_tier = TicketTier.objects.create(event=instance, **tier_data)
+                    if stripe_count:
+                        inventory.configure_striping(new_tier, int(stripe_count))
                     tiers_to_keep.append(new_tier.id)
 
             tiers_to_delete = instance.tiers.exclude(id__in=tiers_to_keep)
@@ -0,0 +1,256 @@
+"""
+Bulk ticket rendering for group bookings and event-wide reissues.
+
+Tickets are grouped by event and split into chunks; each chunk is rendered
+in a worker process (one event background per chunk, see ticket_render.py)
+and stored content-addressed via ticket_images, so anything rendered here is
+served for free afterwards by the ticket image endpoint and by email delivery.
+
+Inside Celery workers (which are already a process pool and cannot fork
+children of their own) use queue_render(), which fans the chunks out as
+tasks on the 'tickets' queue instead. queue_event_bundle() does that for a
+whole event as a chord whose callback, once every chunk is stored, builds one
+PDF/ZIP of it and publishes its location to the cache for the organizer
+endpoint to return.
+
+Bundles are streamed to a temporary file one ticket at a time (the PDF is
+written by hand, one decoded page in memory at a time), so an event of any
+size fits in a worker.
+"""
+import hashlib
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image
+
+from events.models import Ticket
+from events.services import ticket_images
+
+
+CHUNK_SIZE = 25
+BUNDLE_DIR = 'ticket_bundles'
+BUNDLE_KINDS = ('pdf', 'zip')
+# How long the organizer endpoint remembers an event bundle's state
+BUNDLE_STATE_SECONDS = 24 * 3600
+# Tickets fetched per query while streaming a bundle
+BUNDLE_BATCH_SIZE = 500
+PDF_RESOLUTION = 150
+
+
+def _chunks(ticket_ids):
+    ordered = list(
+        Ticket.objects.filter(id__in=ticket_ids).order_by('event_id', 'purchase_date').values_list('id', flat=True)
+    )
+    return [ordered[i:i + CHUNK_SIZE] for i in range(0, len(ordered), CHUNK_SIZE)]
+
+
+def render_chunk(ticket_ids, fmt=None):
+    """ Renders and stores one chunk. Returns [(ticket_id, image key)]. """
+    tickets = Ticket.objects.filter(id__in=ticket_ids).select_related('event', 'tier')
+    return [(str(ticket.id), ticket_images.get_or_render(ticket, fmt)[0]) for ticket in tickets]
+
+
+def _render_chunk_in_child(ticket_ids, fmt):
+    try:
+        return render_chunk(ticket_ids, fmt)
+    finally:
+        connections.close_all()
+
+
+def render_tickets(ticket_ids, workers=None, fmt=None, progress=None):
+    """
+    Renders and stores every ticket in `ticket_ids` across `workers` processes
+    (1 renders inline). `progress(done, total, elapsed)` is called after each
+    chunk. Returns {ticket_id: image key}.
+    """
+    chunks = _chunks(ticket_ids)
+    total = sum(len(chunk) for chunk in chunks)
+    keys = {}
+    started = time.perf_counter()
+
+    def collect(result):
+        keys.update(result)
+        if progress:
+            progress(len(keys), total, time.perf_counter() - started)
+
+    if workers == 1:
+        for chunk in chunks:
+            collect(render_chunk(chunk, fmt))
+        return keys
+
+    # Forked children must not share the parent's database sockets
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_chunk_in_child, chunk, fmt) for chunk in chunks]
+        for future in as_completed(futures):
+            collect(future.result())
+    return keys
+
+
+def queue_render(ticket_ids, fmt=None):
+    """ Fans the chunks out to the 'tickets' Celery queue. Returns the number of chunks queued. """
+    from events.tasks import render_ticket_chunk
+
+    chunks = _chunks(ticket_ids)
+    for chunk in chunks:
+        render_ticket_chunk.delay([str(ticket_id) for ticket_id in chunk], fmt)
+    return len(chunks)
+
+
+def _write_pdf(out, pages):
+    """
+    Writes a PDF with one page per image in `pages` (encoded image bytes) to
+    the binary file `out`. Each page is decoded, re-encoded as JPEG (as
+    Pillow's own PDF writer does for RGB) and written straight away; only the
+    object offsets are kept until the end.
+    """
+    offsets = {}
+
+    def write_object(number, body, stream=None):
+        offsets[number] = out.tell()
+        out.write(f"{number} 0 obj\n".encode() + body)
+        if stream is not None:
+            out.write(b"\nstream\n" + stream + b"\nendstream")
+        out.write(b"\nendobj\n")
+
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    # 1 is the catalog and 2 the page tree, written last once every page is known
+    page_numbers = []
+    number = 2
+    for data in pages:
+        image = Image.open(BytesIO(data)).convert('RGB')
+        jpeg = BytesIO()
+        image.save(jpeg, format='JPEG')
+        width, height = image.size
+        points_w, points_h = width * 72 / PDF_RESOLUTION, height * 72 / PDF_RESOLUTION
+        content = f"q {points_w:.2f} 0 0 {points_h:.2f} 0 0 cm /Im Do Q".encode()
+
+        image_no, content_no, page_no = number + 1, number + 2, number + 3
+        number = page_no
+        write_object(image_no, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB "
+            f"/BitsPerComponent 8 /Filter /DCTDecode /Length {jpeg.getbuffer().nbytes} >>"
+        ).encode(), jpeg.getvalue())
+        write_object(content_no, f"<< /Length {len(content)} >>".encode(), content)
+        write_object(page_no, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {points_w:.2f} {points_h:.2f}] "
+            f"/Resources << /XObject << /Im {image_no} 0 R >> >> /Contents {content_no} 0 R >>"
+        ).encode())
+        page_numbers.append(page_no)
+
+    kids = ' '.join(f"{n} 0 R" for n in page_numbers)
+    write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode())
+    write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    xref = out.tell()
+    out.write(f"xref\n0 {number + 1}\n0000000000 65535 f \n".encode())
+    for n in range(1, number + 1):
+        out.write(f"{offsets[n]:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {number + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def _write_bundle(directory, tickets, kind, fmt):
+    """
+    Stores one PDF or ZIP of the `tickets` queryset under `directory`, named
+    after its images, streaming it through a temporary file. Returns the path.
+    """
+    if kind not in BUNDLE_KINDS:
+        raise ValueError(f"Unknown bundle kind {kind!r}")
+    tickets = tickets.select_related('event', 'tier')
+
+    # Keys only (no image bytes) to name the file and skip building it twice
+    keys = hashlib.sha256()
+    for ticket in tickets.iterator(chunk_size=BUNDLE_BATCH_SIZE):
+        keys.update(ticket_images.image_key(ticket, fmt).encode())
+    path = f"{directory}/{keys.hexdigest()[:32]}.{kind}"
+    if default_storage.exists(path):
+        return path
+
+    with tempfile.TemporaryFile() as out:
+        if kind == 'zip':
+            with zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED) as archive:  # Images are already compressed
+                for ticket in tickets.iterator(chunk_size=BUNDLE_BATCH_SIZE):
+                    data = ticket_images.get_or_render(ticket, fmt)[1]
+                    archive.writestr(f"Ticket-{str(ticket.id)[:8]}.{ticket_images.extension(fmt)}", data)
+        else:
+            _write_pdf(out, (
+                ticket_images.get_or_render(ticket, fmt)[1]
+                for ticket in tickets.iterator(chunk_size=BUNDLE_BATCH_SIZE)
+            ))
+        out.seek(0)
+        default_storage.save(path, File(out))
+    return path
+
+
+def bundle(ticket_ids, kind='pdf', fmt=None):
+    """
+    Builds one multi-page PDF or ZIP per buyer from the stored images
+    (rendering any that are missing). Returns {owner_id: storage path}.
+    """
+    tickets = Ticket.objects.filter(id__in=ticket_ids)
+    owners = tickets.order_by('owner_id').values_list('owner_id', flat=True).distinct()
+    return {
+        owner_id: _write_bundle(
+            f"{BUNDLE_DIR}/{owner_id}", tickets.filter(owner_id=owner_id).order_by('event_id', 'attendee_name'), kind, fmt
+        )
+        for owner_id in owners
+    }
+
+
+def event_tickets(event_id):
+    """ The tickets an event bundle covers: every one not cancelled """
+    return Ticket.objects.filter(event_id=event_id).exclude(status=Ticket.Status.CANCELLED)
+
+
+def _state_key(event_id, kind):
+    return f"ticket-bundle:{event_id}:{kind}"
+
+
+def event_bundle_state(event_id, kind):
+    """
+    {'status': 'PENDING'} while queued, {'status': 'READY', 'path': ..., 'tickets': n}
+    once built, {'status': 'FAILED'} if a chunk or the bundle failed, or None
+    """
+    return cache.get(_state_key(event_id, kind))
+
+
+def _set_state(event_id, kind, **state):
+    cache.set(_state_key(event_id, kind), state, BUNDLE_STATE_SECONDS)
+
+
+def queue_event_bundle(event_id, kind='pdf', fmt=None):
+    """
+    Renders every ticket of the event in parallel chunks on the 'tickets'
+    queue, then builds one bundle of all of them once the last chunk is
+    stored (a Celery chord). Returns the number of tickets.
+    """
+    from celery import chord
+    from events.tasks import bundle_event_failed, bundle_event_tickets, render_ticket_chunk
+
+    chunks = _chunks(event_tickets(event_id).values_list('id', flat=True))
+    _set_state(event_id, kind, status='PENDING')
+    header = [render_ticket_chunk.s([str(ticket_id) for ticket_id in chunk], fmt) for chunk in chunks]
+    callback = bundle_event_tickets.si(str(event_id), kind, fmt)
+    # A failed chunk means the callback never runs: report it instead of staying PENDING
+    callback.link_error(bundle_event_failed.si(str(event_id), kind))
+    chord(header)(callback)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def bundle_event(event_id, kind='pdf', fmt=None):
+    """ Builds the event's bundle and publishes its location. Returns the storage path. """
+    tickets = event_tickets(event_id).order_by('purchase_date', 'id')
+    path = _write_bundle(f"{BUNDLE_DIR}/events/{event_id}", tickets, kind, fmt)
+    _set_state(event_id, kind, status='READY', path=path, tickets=tickets.count())
+    return path
+
+
+def bundle_failed(event_id, kind):
+    _set_state(event_id, kind, status='FAILED')
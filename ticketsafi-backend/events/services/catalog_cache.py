@@ -0,0 +1,135 @@
+"""
+Response cache for the public catalog: event list, event page, store list and
+store page.
+
+A cached response is keyed on the endpoint, the normalized query string and
+the current version of everything it shows:
+
+    events          every event listing (any event, tier or store change)
+    event:<id>      one event page
+    stores          the store list
+    store:<slug>    one store page (the store and its events)
+
+signals.py bumps the versions when an Event, TicketTier, Store or organizer
+is saved or deleted, which orphans exactly the responses that showed it; a
+hit is one get_many for the versions and one get for the response. An event
+selling out is bumped by event_summary. Anything else that changes without a
+save (sold counts, events ending) shows up once the entry expires:
+EVENT_PAGE_CACHE_SECONDS for event pages, which show availability,
+CATALOG_CACHE_SECONDS for the rest.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from stores.models import Store
+
+
+EVENTS = 'events'
+STORES = 'stores'
+
+
+def event(event_id):
+    return f"event:{event_id}"
+
+
+def store(slug):
+    return f"store:{slug}"
+
+
+def _version_key(name):
+    return f"catalog:version:{name}"
+
+
+def _initial():
+    # Never reuses an old number if the version key is evicted, so stale entries stay orphaned
+    return time.time_ns() // 1000
+
+
+def versions(names):
+    stored = cache.get_many([_version_key(name) for name in names])
+    result = []
+    for name in names:
+        version = stored.get(_version_key(name))
+        if version is None:
+            cache.add(_version_key(name), _initial(), None)
+            version = cache.get(_version_key(name)) or 0
+        result.append(str(version))
+    return result
+
+
+def _bump(names):
+    for name in names:
+        try:
+            cache.incr(_version_key(name))
+        except ValueError:
+            cache.set(_version_key(name), _initial(), None)
+
+
+def bump(*names):
+    """
+    Bumps the versions once the current transaction commits; bumping earlier
+    would let a request re-cache the old rows under the new version.
+    """
+    names = set(names)
+    transaction.on_commit(lambda: _bump(names))
+
+
+def normalize(query_params):
+    """ Sorted (name, value) pairs without blanks, so ?b=2&a=1& and ?a=1&b=2 share an entry """
+    return sorted(
+        (name, ' '.join(value.split()))
+        for name, values in query_params.lists()
+        for value in values
+        if value.strip()
+    )
+
+
+def _key(request, scope, names):
+    # Links and image URLs are absolute, so the host is part of the response
+    params = [request.build_absolute_uri('/'), request.path, normalize(request.query_params)]
+    digest = hashlib.md5(json.dumps(params).encode()).hexdigest()
+    return f"catalog:{scope}:{'.'.join(versions(names))}:{digest}"
+
+
+def respond(request, scope, names, build, timeout=None):
+    """
+    The cached response for this request, or build()'s response, cached if it
+    is a 200. Sets X-Cache: HIT/MISS.
+    """
+    key = _key(request, scope, names)
+    data = cache.get(key)
+    if data is not None:
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    response = build()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, timeout or settings.CATALOG_CACHE_SECONDS)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def event_changed(event_id, store_ids=None):
+    """
+    Invalidates the listings, the event's page and the pages of the stores it
+    is (or was) in: `store_ids`, or the event's current store if None.
+    """
+    if store_ids is None:
+        stores = Store.objects.filter(events__id=event_id)
+    else:
+        stores = Store.objects.filter(pk__in={pk for pk in store_ids if pk})
+    bump(EVENTS, event(event_id), *[store(slug) for slug in stores.values_list('slug', flat=True)])
+
+
+def store_changed(slugs, event_ids=()):
+    """ Invalidates the store list, the store's page(s) and the events that show the store """
+    names = [STORES, EVENTS] + [store(slug) for slug in slugs if slug]
+    bump(*names, *[event(pk) for pk in event_ids])
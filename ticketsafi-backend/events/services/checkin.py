@@ -0,0 +1,220 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from events.models import Event, Ticket, TicketTier, User
+
+
+ScanResult = namedtuple('ScanResult', ['qr_hash', 'device_id', 'result'])
+CheckInResult = namedtuple('CheckInResult', ['outcome', 'ticket', 'total_in_group', 'checked_in_count'])
+GroupTicket = namedtuple('GroupTicket', ['id', 'status', 'attendee_name', 'tier_name', 'event_title', 'organizer_id'])
+
+VALID = 'VALID'
+NOT_FOUND = 'NOT_FOUND'
+ALL_USED = 'ALL_USED'
+FORBIDDEN = 'FORBIDDEN'
+
+# Per-record outcomes of an offline scan upload
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+UNKNOWN = 'unknown'
+WRONG_EVENT = 'wrong_event'
+
+
+def _claim_sql(restrict_to_organizer):
+    """
+    Conditional UPDATE that flips the oldest ACTIVE ticket of a QR group to CHECKED_IN.
+    On Postgres the inner SELECT skips rows another gate is already claiming,
+    so parallel scans of one group each get a different ticket instead of colliding.
+    """
+    owner_clause = ''
+    if restrict_to_organizer:
+        owner_clause = f'AND t.event_id IN (SELECT e.id FROM {Event._meta.db_table} e WHERE e.organizer_id = %s)'
+    lock_clause = 'FOR UPDATE SKIP LOCKED' if connection.features.has_select_for_update_skip_locked else ''
+
+    return f"""
+        UPDATE {Ticket._meta.db_table}
+        SET status = %s, checked_in_at = %s, checked_in_by_id = %s, updated_at = %s
+        WHERE id = (
+            SELECT t.id FROM {Ticket._meta.db_table} t
+            WHERE t.qr_code_hash = %s AND t.status = %s {owner_clause}
+            ORDER BY t.purchase_date, t.id
+            LIMIT 1 {lock_clause}
+        ) AND status = %s
+        RETURNING id
+    """
+
+
+def _group_sql(extra_columns=''):
+    return f"""
+        SELECT {extra_columns} t.id, t.status, t.attendee_name, tr.name, e.title, e.organizer_id
+        FROM {Ticket._meta.db_table} t
+        INNER JOIN {TicketTier._meta.db_table} tr ON tr.id = t.tier_id
+        INNER JOIN {Event._meta.db_table} e ON e.id = t.event_id
+        WHERE t.qr_code_hash = %s
+        ORDER BY t.purchase_date, t.id
+    """
+
+
+def _claim_params(qr_hash, scanner, now, restrict_to_organizer):
+    organizer_fk = Event._meta.get_field('organizer')
+    scanner_fk = Ticket._meta.get_field('checked_in_by')
+    params = [
+        Ticket.Status.CHECKED_IN,
+        connection.ops.adapt_datetimefield_value(now),
+        scanner_fk.get_db_prep_value(scanner.pk, connection),
+        connection.ops.adapt_datetimefield_value(now),
+        qr_hash,
+        Ticket.Status.ACTIVE,
+    ]
+    if restrict_to_organizer:
+        params.append(organizer_fk.get_db_prep_value(scanner.pk, connection))
+    params.append(Ticket.Status.ACTIVE)
+    return params
+
+
+def check_in(qr_hash, scanner):
+    """
+    Claims the next ACTIVE ticket for a QR hash/group and returns the group summary.
+
+    On Postgres the claim and the group read go out as a single statement
+    (data-modifying CTE). Other backends run the same UPDATE ... RETURNING
+    followed by the group read inside one transaction.
+    """
+    restrict_to_organizer = scanner.role == User.Role.ORGANIZER
+    now = timezone.now()
+    claim_params = _claim_params(qr_hash, scanner, now, restrict_to_organizer)
+    pk_field = Ticket._meta.pk
+    organizer_fk = Event._meta.get_field('organizer')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"WITH claimed AS ({_claim_sql(restrict_to_organizer)}) "
+                f"{_group_sql(extra_columns='(SELECT id FROM claimed),')}",
+                claim_params + [qr_hash],
+            )
+            rows = cursor.fetchall()
+            claimed_id = rows[0][0] if rows else None
+            rows = [row[1:] for row in rows]
+        else:
+            cursor.execute(_claim_sql(restrict_to_organizer), claim_params)
+            claimed = cursor.fetchone()
+            claimed_id = claimed[0] if claimed else None
+            cursor.execute(_group_sql(), [qr_hash])
+            rows = cursor.fetchall()
+
+    if not rows:
+        return CheckInResult(NOT_FOUND, None, 0, 0)
+
+    if claimed_id is not None:
+        claimed_id = pk_field.to_python(claimed_id)
+
+    group = []
+    for row in rows:
+        ticket = GroupTicket(pk_field.to_python(row[0]), *row[1:5], organizer_fk.to_python(row[5]))
+        # The Postgres CTE reads the pre-update snapshot, so patch the claimed row in.
+        if ticket.id == claimed_id:
+            ticket = ticket._replace(status=Ticket.Status.CHECKED_IN)
+        group.append(ticket)
+
+    total_in_group = len(group)
+    checked_in_count = sum(1 for t in group if t.status == Ticket.Status.CHECKED_IN)
+
+    if claimed_id is not None:
+        ticket = next(t for t in group if t.id == claimed_id)
+        return CheckInResult(VALID, ticket, total_in_group, checked_in_count)
+
+    if restrict_to_organizer and any(
+        t.status == Ticket.Status.ACTIVE and t.organizer_id != scanner.pk for t in group
+    ):
+        return CheckInResult(FORBIDDEN, group[0], total_in_group, checked_in_count)
+
+    return CheckInResult(ALL_USED, group[0], total_in_group, checked_in_count)
+
+
+def apply_offline_scans(event, scans, scanner):
+    """
+    Replays a batch of queued offline scans for one event in a single transaction.
+
+    `scans` is a list of dicts with qr_hash, scanned_at and device_id. Every
+    ticket touched is read with one locked query and written back with one
+    bulk UPDATE. When a group has more scans (queued here or already recorded
+    online) than tickets, the earliest scanned_at wins; later ones are duplicates.
+    Returns one ScanResult per input record, in input order.
+    """
+    results = [None] * len(scans)
+    scans_by_hash = {}
+    for index, scan in enumerate(scans):
+        scans_by_hash.setdefault(scan['qr_hash'], []).append(index)
+
+    with transaction.atomic():
+        tickets = (
+            Ticket.objects.select_for_update()
+            .filter(qr_code_hash__in=list(scans_by_hash))
+            .exclude(status=Ticket.Status.CANCELLED)
+            .order_by('purchase_date', 'id')
+        )
+        groups = {}
+        for ticket in tickets:
+            groups.setdefault(ticket.qr_code_hash, []).append(ticket)
+
+        now = timezone.now()
+        to_update = []
+
+        for qr_hash, indexes in scans_by_hash.items():
+            group = groups.get(qr_hash)
+            if not group:
+                outcome = UNKNOWN
+            elif group[0].event_id != event.id:
+                outcome = WRONG_EVENT
+            else:
+                outcome = None
+
+            if outcome:
+                for index in indexes:
+                    results[index] = ScanResult(qr_hash, scans[index]['device_id'], outcome)
+                continue
+
+            # Rank every admission claim for the group: check-ins already recorded
+            # on the server and the queued scans. Only the earliest len(group) win.
+            claims = [
+                (ticket.checked_in_at or now, 0, ticket)
+                for ticket in group if ticket.status != Ticket.Status.ACTIVE
+            ]
+            claims += [(scans[index]['scanned_at'], 1, index) for index in indexes]
+            claims.sort(key=lambda claim: (claim[0], claim[1]))
+            winners = claims[:len(group)]
+
+            kept = {id(claim[2]) for claim in winners if claim[1] == 0}
+            # Tickets whose server-side check-in lost to an earlier offline scan are
+            # reassigned first, then unused ones, so the group total never changes.
+            free_tickets = [t for t in group if t.status != Ticket.Status.ACTIVE and id(t) not in kept]
+            free_tickets += [t for t in group if t.status == Ticket.Status.ACTIVE]
+
+            accepted = set()
+            for scanned_at, source, index in winners:
+                if source == 0:
+                    continue
+                ticket = free_tickets.pop(0)
+                if ticket.status == Ticket.Status.ACTIVE:
+                    ticket.status = Ticket.Status.CHECKED_IN
+                ticket.checked_in_at = scanned_at
+                ticket.checked_in_by = scanner
+                ticket.checked_in_device = scans[index]['device_id']
+                ticket.updated_at = now
+                to_update.append(ticket)
+                accepted.add(index)
+
+            for index in indexes:
+                outcome = ACCEPTED if index in accepted else DUPLICATE
+                results[index] = ScanResult(qr_hash, scans[index]['device_id'], outcome)
+
+        if to_update:
+            Ticket.objects.bulk_update(
+                to_update,
+                ['status', 'checked_in_at', 'checked_in_by', 'checked_in_device', 'updated_at'],
+            )
+
+    return results
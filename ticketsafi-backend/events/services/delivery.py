@@ -0,0 +1,108 @@
+"""
+Background delivery of ticket emails.
+
+Purchase flows only mark a ticket PENDING and queue events.tasks.deliver_ticket
+once the ticket is committed; rendering the image and talking to SMTP happen
+on the 'tickets' Celery queue. That queue runs on its own prefork worker (see
+docker-compose.yml), which gives the CPU-bound Pillow rendering a dedicated
+process pool away from webhook processing. Each worker process keeps one SMTP
+connection open and reuses it for every message it sends, checking with a
+NOOP that the server has not dropped it after a quiet spell.
+"""
+import time
+
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from events.models import Ticket
+from events.utils import build_ticket_email, generate_ticket_image
+
+
+_connection = None
+_last_used = 0.0
+
+# SMTP servers hang up on idle clients (often after a minute or less); a
+# connection unused for longer is probed before the next message
+IDLE_CHECK_SECONDS = 30
+
+
+def _alive(connection):
+    smtp = getattr(connection, 'connection', None)
+    if smtp is None:
+        # Backends without a socket (locmem, console) have no `connection` at all
+        return not hasattr(connection, 'connection')
+    try:
+        return smtp.noop()[0] == 250
+    except Exception:
+        return False
+
+
+def smtp_connection():
+    """ The calling process's long-lived mail connection, (re)opened when needed """
+    global _connection, _last_used
+    now = time.monotonic()
+    if _connection is not None and now - _last_used > IDLE_CHECK_SECONDS and not _alive(_connection):
+        reset_connection()
+    if _connection is None:
+        _connection = get_connection()
+        _connection.open()
+    _last_used = now
+    return _connection
+
+
+def reset_connection():
+    """ Drops the pooled connection after an error so the next send reconnects """
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+    _connection = None
+
+
+def queue(ticket):
+    """
+    Marks a ticket PENDING and queues its email after the surrounding
+    transaction commits, so the worker never sees an uncommitted ticket.
+    """
+    from events.tasks import deliver_ticket
+
+    Ticket.objects.filter(pk=ticket.pk).update(delivery_status=Ticket.Delivery.PENDING, delivery_error='')
+    ticket.delivery_status = Ticket.Delivery.PENDING
+    transaction.on_commit(lambda: deliver_ticket.delay(str(ticket.pk)))
+
+
+def deliver(ticket_id):
+    """
+    Renders and emails one ticket. Returns False when it was already sent
+    (a duplicate task); resending goes through queue() first.
+    """
+    ticket = Ticket.objects.select_related('event', 'tier', 'owner').get(pk=ticket_id)
+    if ticket.delivery_status == Ticket.Delivery.SENT:
+        return False
+
+    email = build_ticket_email(ticket, generate_ticket_image(ticket), connection=smtp_connection())
+    try:
+        email.send()
+    except Exception:
+        reset_connection()
+        raise
+
+    Ticket.objects.filter(pk=ticket.pk).update(
+        delivery_status=Ticket.Delivery.SENT,
+        delivery_attempts=F('delivery_attempts') + 1,
+        delivery_error='',
+        delivered_at=timezone.now(),
+    )
+    return True
+
+
+def record_failure(ticket_id, error, final):
+    Ticket.objects.filter(pk=ticket_id).update(
+        delivery_attempts=F('delivery_attempts') + 1,
+        delivery_error=str(error)[:2000],
+        delivery_status=Ticket.Delivery.FAILED if final else Ticket.Delivery.PENDING,
+    )
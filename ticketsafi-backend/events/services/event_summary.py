@@ -0,0 +1,96 @@
+"""
+Price range and availability summary kept on each Event row.
+
+min_price, max_price, total_capacity, total_sold and sold_out let the
+catalog show "from KES X" and sold-out badges, and filter on price, from the
+event row alone. They are maintained in three ways:
+
+    refresh()         recomputes them from the tiers (and stripes) in one
+                      UPDATE; signals.py calls it when an event or tier is
+                      saved or deleted, and so does configure_striping()
+    add_sold()        bumps total_sold with F() in the same transaction as a
+                      sale on an unstriped tier. That takes the Event row
+                      lock until the sale commits, so every unstriped tier of
+                      an event queues on one row; striping a hot tier is the
+                      way out
+    refresh_striped() striped tiers skip the per-sale write (it would put
+                      every buyer back on one hot row), so the hold sweeper
+                      refreshes their events every minute instead
+
+sold_out means every seat is paid for; seats held for pending payments may
+still come back. Neither add_sold() nor refresh_striped() saves the event, so
+no signal fires: both invalidate the catalog cache themselves when sold_out
+flips (the sold-out badge shows in every listing). python manage.py
+rebuild_event_summaries recomputes every event.
+"""
+from django.db.models import Case, F, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+from django.utils import timezone
+
+from events.models import Event, TicketTier, TierInventoryStripe
+from events.services import catalog_cache
+
+
+def _over(queryset, aggregate, output_field):
+    return Subquery(queryset.annotate(total=aggregate).values('total'), output_field=output_field)
+
+
+def _sold_out(capacity, sold):
+    return Case(
+        When(LessThanOrEqual(capacity, 0), then=Value(False)),
+        When(LessThanOrEqual(capacity, sold), then=Value(True)),
+        default=Value(False),
+    )
+
+
+def columns():
+    """ The summary columns as expressions over the event's tiers, for Event.objects...update() """
+    tiers = TicketTier.objects.filter(event=OuterRef('pk')).order_by().values('event')
+    stripes = TierInventoryStripe.objects.filter(tier__event=OuterRef('pk')).order_by().values('tier__event')
+
+    capacity = Coalesce(_over(tiers, Sum('quantity_allocated'), IntegerField()), 0)
+    # Striped tiers keep their sales on the stripe rows (and zero on the tier row)
+    sold = (
+        Coalesce(_over(tiers, Sum('quantity_sold'), IntegerField()), 0)
+        + Coalesce(_over(stripes, Sum('quantity_sold'), IntegerField()), 0)
+    )
+    price = Event._meta.get_field('min_price')
+    return {
+        'min_price': _over(tiers, Min('price'), price),
+        'max_price': _over(tiers, Max('price'), price),
+        'total_capacity': capacity,
+        'total_sold': sold,
+        'sold_out': _sold_out(capacity, sold),
+    }
+
+
+def refresh(queryset):
+    """ Recomputes the summary of the events in `queryset`. Returns the number updated. """
+    return queryset.update(**columns())
+
+
+def add_sold(event_id, quantity):
+    """ Counts `quantity` more seats sold; call it inside the sale's transaction """
+    # SET expressions see the row as it was, hence the + quantity in sold_out too
+    Event.objects.filter(pk=event_id).update(
+        total_sold=F('total_sold') + quantity,
+        sold_out=_sold_out(F('total_capacity'), F('total_sold') + quantity),
+    )
+    # Sold out now, but not before this sale (the row is still locked by the update)
+    if Event.objects.filter(pk=event_id, sold_out=True, total_sold__lt=F('total_capacity') + quantity).exists():
+        catalog_cache.event_changed(event_id)
+
+
+def refresh_striped(now=None):
+    """ Refreshes upcoming events with striped tiers, whose sales skip add_sold() """
+    now = now or timezone.now()
+    striped = TicketTier.objects.filter(stripe_count__gt=0).values('event')
+    events = Event.objects.filter(end_datetime__gt=now, pk__in=striped)
+    flipped = list(
+        events.annotate(now_sold_out=columns()['sold_out']).exclude(sold_out=F('now_sold_out')).values_list('pk', flat=True)
+    )
+    refreshed = refresh(events)
+    for event_id in flipped:
+        catalog_cache.event_changed(event_id)
+    return refreshed
@@ -0,0 +1,104 @@
+"""
+Idempotency-Key support for payment initiation.
+
+A request with a key first looks the key up. A retry finds the stored
+response and is answered from it: one indexed lookup, no second Payment and
+no second M-Pesa prompt. A new key is claimed by inserting its row; the
+unique index settles two requests racing with the same key, and the loser
+gets 409 until the winner has stored its response.
+
+Only successes (2xx) are stored. Anything else released the key so the
+client's retry runs again: server errors (a failed wallet call has already
+released the seat) and rejections before an order exists (not yet admitted
+by the waiting room, sold out, missing details), whose outcome can change by
+the time the buyer retries. Keys expire after IDEMPOTENCY_KEY_TTL_HOURS
+(purge_idempotency_keys).
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from events.models import IdempotencyKey
+
+
+MAX_KEY_LENGTH = 255
+# A claim whose request never stored a response (worker killed mid-request) blocks retries this long
+ABANDONED_AFTER = timedelta(minutes=5)
+
+
+class Conflict(Exception):
+    """ The key is in use by a request still in flight (409) or by a different request (422) """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def fingerprint(request):
+    """ Hash of who sent the request and what they sent, to catch a key reused for another request """
+    data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+    user = request.user.pk if request.user.is_authenticated else None
+    payload = json.dumps([request.path, str(user), data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _lookup(key):
+    try:
+        return IdempotencyKey.objects.get(key=key)
+    except IdempotencyKey.DoesNotExist:
+        return None
+
+
+def claim(key, request_hash):
+    """
+    Returns None if this request now owns `key`, or the stored (status, body)
+    of the request that already used it. Raises Conflict.
+    """
+    record = _lookup(key)
+    if record is None:
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=key, request_hash=request_hash)
+            return None
+        except IntegrityError:
+            # A concurrent request with the same key inserted first
+            record = _lookup(key)
+            if record is None:
+                return claim(key, request_hash)
+
+    if record.request_hash != request_hash:
+        raise Conflict("This Idempotency-Key was already used for a different request.", 422)
+    if record.response_status is None:
+        if timezone.now() - record.created_at < ABANDONED_AFTER:
+            raise Conflict("A request with this Idempotency-Key is still in progress.", 409)
+        # Take over the abandoned claim (only one retry wins the update)
+        if IdempotencyKey.objects.filter(pk=record.pk, response_status=None, created_at=record.created_at).update(
+            created_at=timezone.now()
+        ):
+            return None
+        raise Conflict("A request with this Idempotency-Key is still in progress.", 409)
+    return record.response_status, record.response_body
+
+
+def store(key, status, body):
+    """ Keeps a 2xx response for replay; releases the key for anything else """
+    if 200 <= status < 300:
+        IdempotencyKey.objects.filter(key=key).update(response_status=status, response_body=body)
+    else:
+        release(key)
+
+
+def release(key):
+    IdempotencyKey.objects.filter(key=key).delete()
+
+
+def purge(now=None):
+    """ Deletes keys older than IDEMPOTENCY_KEY_TTL_HOURS. Returns the number deleted. """
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
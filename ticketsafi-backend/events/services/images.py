@@ -0,0 +1,125 @@
+"""
+Resized WebP derivatives of uploaded posters, logos and banners.
+
+Derivatives are generated once, when a serializer saves a new upload, and
+their storage paths are kept on the model (Event.poster_derivatives,
+Store.logo_derivatives, Store.banner_derivatives). List pages and the ticket
+renderer read those instead of the multi-MB originals.
+
+Uploads are checked against IMAGE_MAX_DIMENSION / IMAGE_MAX_PIXELS from the
+header alone, before any pixel data is decoded.
+"""
+import os
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# name: (max width, max height)
+POSTER = {
+    'thumb': (160, 240),
+    'card': (480, 720),
+    'ticket': (540, 2400),  # Width of the ticket card; the renderer crops the height
+    'hero': (1200, 1800),
+}
+LOGO = {
+    'thumb': (96, 96),
+    'card': (256, 256),
+}
+BANNER = {
+    'card': (640, 320),
+    'hero': (1600, 800),
+}
+
+WEBP_QUALITY = 80
+STORAGE_DIR = 'derivatives'
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def check_dimensions(upload):
+    """ Reads only the image header and rejects images too large to decode safely """
+    position = upload.tell() if hasattr(upload, 'tell') else 0
+    try:
+        with Image.open(upload) as img:
+            width, height = img.size
+    finally:
+        upload.seek(position)
+
+    if max(width, height) > settings.IMAGE_MAX_DIMENSION or width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(
+            f"Image is {width}x{height}; the limit is {settings.IMAGE_MAX_DIMENSION}px per side "
+            f"and {settings.IMAGE_MAX_PIXELS // 1_000_000} megapixels."
+        )
+    return width, height
+
+
+def build(field_file, spec):
+    """
+    Decodes the original once and stores one WebP per entry in `spec`.
+    Returns {name: storage path}.
+    """
+    largest = (max(w for w, _ in spec.values()), max(h for _, h in spec.values()))
+    with field_file.open('rb') as f:
+        img = Image.open(f)
+        # JPEGs can decode straight at a reduced scale, which is most of the cost
+        img.draft('RGB', largest)
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    folder = f"{STORAGE_DIR}/{stem}-{uuid.uuid4().hex[:8]}"
+    paths = {}
+    for name, size in sorted(spec.items(), key=lambda item: item[1], reverse=True):
+        derivative = img.copy()
+        derivative.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        derivative.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+        paths[name] = default_storage.save(f"{folder}/{name}.webp", ContentFile(buffer.getvalue()))
+    return paths
+
+
+def discard(paths):
+    for path in (paths or {}).values():
+        try:
+            default_storage.delete(path)
+        except Exception as e:
+            print(f"Could not delete derivative {path}: {e}")
+
+
+def refresh(instance, field, derivatives_field, spec):
+    """
+    Rebuilds the derivatives of instance.<field> and saves them on
+    instance.<derivatives_field>, deleting the previous set.
+    """
+    old = getattr(instance, derivatives_field) or {}
+    field_file = getattr(instance, field)
+    new = {}
+    if field_file:
+        try:
+            new = build(field_file, spec)
+        except Exception as e:
+            # Serving the original is better than failing the upload
+            print(f"Derivative generation failed for {field_file.name}: {e}")
+
+    setattr(instance, derivatives_field, new)
+    # A save rather than an update, so the catalog cache signals see the new URLs
+    instance.save(update_fields=[derivatives_field])
+    discard(old)
+
+
+def urls(field_file, derivatives, spec):
+    """ {name: url} for every derivative in `spec`, falling back to the original for missing ones """
+    if not field_file:
+        return None
+    original = field_file.url
+    derivatives = derivatives or {}
+    result = {name: default_storage.url(derivatives[name]) if name in derivatives else original for name in spec}
+    result['original'] = original
+    return result
@@ -0,0 +1,236 @@
+"""
+Tier inventory.
+
+Every change to a tier's counters is a single conditional UPDATE with F()
+expressions, so the database row lock is held for one statement and two
+buyers can never both take the last seat. Paid purchases reserve seats
+(quantity_reserved) while the M-Pesa prompt is pending; the webhook commits
+them into quantity_sold, and release_expired_holds() hands back the rest.
+
+Hot tiers can be striped (TicketTier.stripe_count > 0). Their counters then
+live on N TierInventoryStripe rows and each claim picks a random stripe, so
+concurrent buyers spread their row locks instead of queueing on one row.
+The payment remembers which stripe it holds so commits and releases go back
+to the same row.
+
+Sales on unstriped tiers also count towards the event's total_sold in the
+same transaction (services/event_summary.py); striped tiers leave that to
+the sweeper, so buyers do not meet again on the event row.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from events.models import Event, Payment, TicketTier, TierInventoryStripe
+from events.services import event_summary
+
+
+def hold_ttl():
+    return timedelta(seconds=settings.TICKET_HOLD_TTL_SECONDS)
+
+
+def _counter_rows(tier_id, stripe):
+    if stripe is None:
+        return TicketTier.objects.filter(id=tier_id)
+    return TierInventoryStripe.objects.filter(tier_id=tier_id, index=stripe)
+
+
+def _claim_row(rows, quantity, counter):
+    """ Moves `quantity` seats into `counter` if the row still has them """
+    return rows.filter(
+        quantity_allocated__gte=F('quantity_sold') + F('quantity_reserved') + quantity,
+    ).update(**{counter: F(counter) + quantity}) == 1
+
+
+def _rebalance_and_claim(tier, quantity, counter):
+    """
+    Slow path for striped tiers when no single stripe has enough free seats:
+    lock every stripe (in index order, so concurrent rebalances cannot deadlock),
+    pool the free seats into one stripe and claim there.
+    """
+    with transaction.atomic():
+        stripes = list(TierInventoryStripe.objects.select_for_update().filter(tier=tier).order_by('index'))
+        free = [s.quantity_allocated - s.quantity_sold - s.quantity_reserved for s in stripes]
+        if sum(free) < quantity:
+            return None
+
+        target = stripes[free.index(max(free))]
+        needed = quantity - max(free)
+        for stripe, spare in zip(stripes, free):
+            if needed <= 0:
+                break
+            if stripe is target or spare <= 0:
+                continue
+            moved = min(spare, needed)
+            TierInventoryStripe.objects.filter(pk=stripe.pk).update(quantity_allocated=F('quantity_allocated') - moved)
+            TierInventoryStripe.objects.filter(pk=target.pk).update(quantity_allocated=F('quantity_allocated') + moved)
+            needed -= moved
+
+        _claim_row(TierInventoryStripe.objects.filter(pk=target.pk), quantity, counter)
+        return target.index
+
+
+def _claim(tier, quantity, counter):
+    """
+    Returns the stripe index claimed from (None for unstriped tiers),
+    or False when the tier is sold out.
+    """
+    if not tier.stripe_count:
+        return None if _claim_row(_counter_rows(tier.id, None), quantity, counter) else False
+
+    for index in random.sample(range(tier.stripe_count), tier.stripe_count):
+        if _claim_row(_counter_rows(tier.id, index), quantity, counter):
+            return index
+
+    stripe = _rebalance_and_claim(tier, quantity, counter)
+    return False if stripe is None else stripe
+
+
+def sell(tier, quantity):
+    """ Sells seats outright (free tickets). Returns False when sold out. """
+    with transaction.atomic():
+        stripe = _claim(tier, quantity, 'quantity_sold')
+        if stripe is None:
+            event_summary.add_sold(tier.event_id, quantity)
+    return stripe is not False
+
+
+def reserve(tier, quantity):
+    """
+    Holds seats for a pending payment. Returns the Payment fields recording
+    the hold, or None when sold out.
+    """
+    stripe = _claim(tier, quantity, 'quantity_reserved')
+    if stripe is False:
+        return None
+    return {
+        'quantity': quantity,
+        'inventory_stripe': stripe,
+        'hold_status': Payment.Hold.HELD,
+        'hold_expires_at': timezone.now() + hold_ttl(),
+    }
+
+
+def commit_hold(payment):
+    """
+    Converts a payment's reserved seats into sold seats. Idempotent.
+
+    If the hold already expired and was released, the buyer has still paid,
+    so the seats are sold anyway even if that takes the tier past its allocation.
+    """
+    rows = _counter_rows(payment.tier_id, payment.inventory_stripe)
+    sold = True
+    with transaction.atomic():
+        if Payment.objects.filter(pk=payment.pk, hold_status=Payment.Hold.HELD).update(
+            hold_status=Payment.Hold.COMMITTED
+        ):
+            rows.update(
+                quantity_reserved=F('quantity_reserved') - payment.quantity,
+                quantity_sold=F('quantity_sold') + payment.quantity,
+            )
+        elif Payment.objects.filter(pk=payment.pk).filter(
+            Q(hold_status=Payment.Hold.RELEASED) | Q(hold_status__isnull=True)
+        ).update(hold_status=Payment.Hold.COMMITTED):
+            rows.update(quantity_sold=F('quantity_sold') + payment.quantity)
+        else:
+            sold = False
+        if sold and payment.inventory_stripe is None:
+            event_summary.add_sold(payment.event_id, payment.quantity)
+    payment.hold_status = Payment.Hold.COMMITTED
+
+
+def release_hold(payment):
+    """ Returns a payment's reserved seats to the tier. Idempotent. """
+    with transaction.atomic():
+        if Payment.objects.filter(pk=payment.pk, hold_status=Payment.Hold.HELD).update(
+            hold_status=Payment.Hold.RELEASED
+        ):
+            _counter_rows(payment.tier_id, payment.inventory_stripe).update(
+                quantity_reserved=F('quantity_reserved') - payment.quantity,
+            )
+            payment.hold_status = Payment.Hold.RELEASED
+
+
+def release_expired_holds(now=None, batch_size=500):
+    """
+    Bulk-releases holds that expired or whose payment FAILED.
+    Rows being committed by a webhook at the same moment are skipped (SKIP LOCKED)
+    and picked up on the next sweep if they are still held. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            holds = list(
+                Payment.objects.select_for_update(skip_locked=True)
+                .filter(hold_status=Payment.Hold.HELD)
+                .filter(Q(hold_expires_at__lte=now) | Q(status=Payment.Status.FAILED))
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not holds:
+                break
+
+            per_row = (
+                Payment.objects.filter(id__in=holds)
+                .values('tier_id', 'inventory_stripe')
+                .annotate(total=Sum('quantity'))
+                .order_by('tier_id', 'inventory_stripe')
+            )
+            for row in per_row:
+                _counter_rows(row['tier_id'], row['inventory_stripe']).update(
+                    quantity_reserved=F('quantity_reserved') - row['total'],
+                )
+            Payment.objects.filter(id__in=holds).update(hold_status=Payment.Hold.RELEASED)
+
+        released += len(holds)
+        if len(holds) < batch_size:
+            break
+
+    return released
+
+
+def configure_striping(tier, stripe_count):
+    """
+    Switches a tier between one counter row and `stripe_count` stripes, or
+    re-splits an already striped tier (e.g. after its allocation changed).
+
+    All counters are folded back onto the tier row and, when striping, spread
+    evenly again; sold and reserved seats, and the holds that point at them,
+    land on stripe 0. Do this before the on-sale opens: it locks the tier for
+    the duration of the switch.
+    """
+    with transaction.atomic():
+        tier = TicketTier.objects.select_for_update().get(pk=tier.pk)
+        stripes = TierInventoryStripe.objects.select_for_update().filter(tier=tier)
+        totals = stripes.aggregate(sold=Sum('quantity_sold'), reserved=Sum('quantity_reserved'))
+
+        sold = tier.quantity_sold + (totals['sold'] or 0)
+        reserved = tier.quantity_reserved + (totals['reserved'] or 0)
+        stripes.delete()
+
+        if stripe_count:
+            free = max(tier.quantity_allocated - sold - reserved, 0)
+            share, extra = divmod(free, stripe_count)
+            TierInventoryStripe.objects.bulk_create([
+                TierInventoryStripe(
+                    tier=tier,
+                    index=index,
+                    quantity_allocated=share + (1 if index < extra else 0) + (sold + reserved if index == 0 else 0),
+                    quantity_sold=sold if index == 0 else 0,
+                    quantity_reserved=reserved if index == 0 else 0,
+                )
+                for index in range(stripe_count)
+            ])
+            TicketTier.objects.filter(pk=tier.pk).update(stripe_count=stripe_count, quantity_sold=0, quantity_reserved=0)
+            new_stripe = 0
+        else:
+            TicketTier.objects.filter(pk=tier.pk).update(stripe_count=0, quantity_sold=sold, quantity_reserved=reserved)
+            new_stripe = None
+
+        Payment.objects.filter(tier=tier, hold_status=Payment.Hold.HELD).update(inventory_stripe=new_stripe)
+        event_summary.refresh(Event.objects.filter(pk=tier.event_id))
@@ -0,0 +1,138 @@
+"""
+Offline gate manifest for scanner devices.
+
+The manifest is a zlib-compressed binary blob (all integers big-endian):
+
+    header  : b'YMF1' | u8 flags (bit 0 = delta) | u64 version | 32B qr_key | u16 tier_count | u32 record_count
+    tier    : u16 tier_index | 4B tier_tag | u8 name_len | name (utf-8)
+    record  : u8 hash_len | qr_hash (ascii) | u16 tier_index | u16 group_size | u16 checked_in | u8 state
+
+Records are sorted by qr_hash so devices can binary-search them without building an index.
+`state` is 0 for a valid QR and 1 when every ticket behind it has been cancelled.
+`version` is the server clock in microseconds; pass it back as `since` to get a delta.
+`qr_key` verifies signed QR tokens offline (see services/qr_tokens.py), and the
+tier tag maps a token's tier bytes back to a tier name.
+"""
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from events.models import Ticket
+from events.services import qr_tokens
+
+
+MAGIC = b'YMF1'
+FLAG_DELTA = 0x01
+STATE_VALID = 0
+STATE_REVOKED = 1
+
+# Rows committed slightly after a sync started can carry an older updated_at,
+# so deltas re-send this window. Records are idempotent on the device.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+_HEADER = struct.Struct('>4sBQ32sHI')
+_TIER = struct.Struct('>H4sB')
+_RECORD_TAIL = struct.Struct('>HHHB')
+
+
+def version_to_datetime(version):
+    return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=version)
+
+
+def datetime_to_version(value):
+    return int(value.timestamp() * 1_000_000)
+
+
+def _clamp(value, limit=0xFFFF):
+    return min(value, limit)
+
+
+def build_manifest(event, since=None):
+    """
+    Returns (version, payload) for an event. With `since`, only QR hashes that
+    had any ticket created or changed after that version are included.
+    """
+    now = timezone.now()
+    version = datetime_to_version(now)
+
+    tiers = list(event.tiers.order_by('name').values_list('id', 'name'))
+    tier_index = {tier_id: index for index, (tier_id, _) in enumerate(tiers)}
+
+    tickets = Ticket.objects.filter(event=event)
+    if since is not None:
+        changed = Ticket.objects.filter(
+            event=event, updated_at__gt=version_to_datetime(since) - SYNC_OVERLAP
+        ).values('qr_code_hash')
+        tickets = tickets.filter(qr_code_hash__in=changed)
+
+    groups = (
+        tickets.values('qr_code_hash', 'tier_id')
+        .annotate(
+            group_size=Count('id', filter=~Q(status=Ticket.Status.CANCELLED)),
+            checked_in=Count('id', filter=Q(status__in=[Ticket.Status.CHECKED_IN, Ticket.Status.USED])),
+        )
+        .order_by('qr_code_hash')
+    )
+
+    records = []
+    for group in groups.iterator():
+        qr_hash = group['qr_code_hash'].encode('ascii')
+        state = STATE_VALID if group['group_size'] else STATE_REVOKED
+        records.append(
+            struct.pack('>B', len(qr_hash)) + qr_hash + _RECORD_TAIL.pack(
+                tier_index.get(group['tier_id'], 0xFFFF),
+                _clamp(group['group_size']),
+                _clamp(group['checked_in']),
+                state,
+            )
+        )
+
+    chunks = [_HEADER.pack(
+        MAGIC, FLAG_DELTA if since is not None else 0, version,
+        qr_tokens.event_key(event.id), len(tiers), len(records),
+    )]
+    for index, (tier_id, name) in enumerate(tiers):
+        encoded = name.encode('utf-8')[:255]
+        chunks.append(_TIER.pack(index, qr_tokens.tag(tier_id), len(encoded)) + encoded)
+    chunks.extend(records)
+
+    return version, zlib.compress(b''.join(chunks), 6)
+
+
+def parse_manifest(payload):
+    """
+    Reference decoder, mirrors what the scanner app does on-device.
+    """
+    data = zlib.decompress(payload)
+    magic, flags, version, key, tier_count, record_count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a Yadi gate manifest.")
+    offset = _HEADER.size
+
+    tiers = {}
+    for _ in range(tier_count):
+        index, _, length = _TIER.unpack_from(data, offset)
+        offset += _TIER.size
+        tiers[index] = data[offset:offset + length].decode('utf-8')
+        offset += length
+
+    records = []
+    for _ in range(record_count):
+        length = data[offset]
+        offset += 1
+        qr_hash = data[offset:offset + length].decode('ascii')
+        offset += length
+        tier, group_size, checked_in, state = _RECORD_TAIL.unpack_from(data, offset)
+        offset += _RECORD_TAIL.size
+        records.append({
+            'qr_hash': qr_hash,
+            'tier_name': tiers.get(tier),
+            'group_size': group_size,
+            'checked_in': checked_in,
+            'revoked': state == STATE_REVOKED,
+        })
+
+    return {'version': version, 'delta': bool(flags & FLAG_DELTA), 'qr_key': key, 'records': records}
@@ -0,0 +1,108 @@
+"""
+Payment status for buyers waiting on an M-Pesa prompt.
+
+Each payment's current status lives in the cache under its reference: payment
+initiation seeds it and webhook processing (services/payments.py) overwrites
+it, once the transaction commits, when the payment is COMPLETED or FAILED.
+The status endpoint long-polls or streams (SSE) that key, so a waiting buyer
+costs an idle connection and a cache read every POLL_INTERVAL; the database
+is only read when the key is missing.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from events.models import Payment
+
+
+STATUS_TTL = 60 * 60
+POLL_INTERVAL = 0.5
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000  # EventSource reconnect delay once a stream ends
+TERMINAL = {Payment.Status.COMPLETED, Payment.Status.FAILED}
+
+
+def _key(reference):
+    return f"payment-status:{reference}"
+
+
+def snapshot(payment, ticket_id=None):
+    return {
+        'transaction_ref': payment.reference_code,
+        'status': payment.status,
+        'ticket_id': str(ticket_id) if ticket_id else None,
+        'hold_expires_at': payment.hold_expires_at.isoformat() if payment.hold_expires_at else None,
+    }
+
+
+def publish(payment, ticket=None):
+    """ Publishes the payment's status once the current transaction commits """
+    state = snapshot(payment, ticket.id if ticket else None)
+    transaction.on_commit(lambda: cache.set(_key(payment.reference_code), state, STATUS_TTL))
+
+
+def load(reference):
+    """ Reads the status from the database and re-seeds the cache. None if unknown. """
+    payment = Payment.objects.filter(reference_code=reference).first()
+    if payment is None:
+        return None
+    ticket_id = payment.tickets.order_by('attendee_name').values_list('id', flat=True).first()
+    state = snapshot(payment, ticket_id)
+    cache.set(_key(reference), state, STATUS_TTL)
+    return state
+
+
+async def aget(reference):
+    state = await cache.aget(_key(reference))
+    if state is None:
+        state = await sync_to_async(load)(reference)
+    return state
+
+
+async def wait(reference, since=None, timeout=0):
+    """
+    Returns the status as soon as it differs from `since` or is final, or
+    after `timeout` seconds with the unchanged one. None if unknown.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    state = await aget(reference)
+    while (
+        state is not None and state['status'] == since and state['status'] not in TERMINAL
+        and loop.time() < deadline
+    ):
+        await asyncio.sleep(min(POLL_INTERVAL, max(deadline - loop.time(), 0)))
+        state = await cache.aget(_key(reference)) or state
+    return state
+
+
+def _event(state):
+    return f"event: status\ndata: {json.dumps(state)}\n\n"
+
+
+def opening(state):
+    """ The start of every stream; on its own, a one-shot response the browser re-requests """
+    return [f"retry: {RETRY_MS}\n\n", _event(state)]
+
+
+async def stream(reference, state, duration):
+    """
+    Server-Sent Events: a `status` event now and on every change, comments as
+    keep-alives, until the payment is final or `duration` seconds pass (the
+    browser's EventSource then reconnects after RETRY_MS).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    for chunk in opening(state):
+        yield chunk
+
+    while state['status'] not in TERMINAL and loop.time() < deadline:
+        current = await wait(reference, since=state['status'], timeout=min(KEEPALIVE_SECONDS, deadline - loop.time()))
+        if current['status'] == state['status']:
+            yield ": keep-alive\n\n"
+        else:
+            state = current
+            yield _event(state)
@@ -0,0 +1,83 @@
+"""
+Asynchronous processing of payment webhooks stored in WebhookInbox.
+
+Every step runs under row locks on the inbox row and the Payment, so two
+workers handling duplicate deliveries of the same reference serialize, and
+status changes are conditional updates, so the second one finds the payment
+already COMPLETED and creates nothing.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from events.models import Payment, Ticket, WebhookInbox
+from events.services import delivery, inventory, payment_status, wallet_cache
+
+
+class PermanentWebhookError(Exception):
+    """ The webhook can never succeed (unknown payment, unknown status); do not retry """
+
+
+def process_inbox_row(inbox_id):
+    """
+    Applies one stored webhook. Safe to call any number of times.
+    Returns the ticket created, if any.
+    """
+    ticket = None
+
+    with transaction.atomic():
+        row = WebhookInbox.objects.select_for_update().get(id=inbox_id)
+        if row.status == WebhookInbox.Status.PROCESSED:
+            return None
+
+        status_msg = row.payload.get('status')
+        try:
+            payment = Payment.objects.select_for_update(of=('self',)).select_related('user', 'event').get(reference_code=row.reference)
+        except Payment.DoesNotExist:
+            raise PermanentWebhookError(f"Payment {row.reference} not found")
+
+        if status_msg == 'COMPLETED':
+            # Compare-and-set: only the update that moves the payment to COMPLETED creates the ticket
+            if Payment.objects.filter(pk=payment.pk).exclude(status=Payment.Status.COMPLETED).update(
+                status=Payment.Status.COMPLETED
+            ):
+                payment.status = Payment.Status.COMPLETED
+                inventory.commit_hold(payment)
+
+                ticket = Ticket.objects.create(
+                    event_id=payment.event_id,
+                    tier_id=payment.tier_id,
+                    owner=payment.user,
+                    payment=payment,
+                    attendee_name=payment.user.first_name or payment.user.username,
+                    attendee_email=payment.user.email
+                )
+                # The email goes out from the 'tickets' queue once this commits
+                delivery.queue(ticket)
+                payment_status.publish(payment, ticket)
+                organizer_id = payment.event.organizer_id
+                transaction.on_commit(lambda: wallet_cache.invalidate(organizer_id))
+        elif status_msg == 'FAILED':
+            if Payment.objects.filter(pk=payment.pk, status=Payment.Status.PENDING).update(
+                status=Payment.Status.FAILED
+            ):
+                payment.status = Payment.Status.FAILED
+                inventory.release_hold(payment)
+                payment_status.publish(payment)
+        else:
+            raise PermanentWebhookError(f"Unknown status {status_msg!r}")
+
+        row.status = WebhookInbox.Status.PROCESSED
+        row.processed_at = timezone.now()
+        row.attempts += 1
+        row.save(update_fields=['status', 'processed_at', 'attempts'])
+
+    return ticket
+
+
+def record_failure(inbox_id, error, final):
+    WebhookInbox.objects.filter(id=inbox_id).update(
+        attempts=F('attempts') + 1,
+        last_error=str(error)[:2000],
+        status=WebhookInbox.Status.FAILED if final else WebhookInbox.Status.RECEIVED,
+    )
@@ -0,0 +1,95 @@
+"""
+Signed compact QR tokens.
+
+A token is 35 bytes, base32 encoded to 56 characters from [A-Z2-7], which QR
+codes store in alphanumeric mode (5.5 bits per character instead of 8):
+
+    u8 version | 4B event tag | 4B tier tag | u16 group size | 16B ticket/group id | 8B HMAC-SHA256
+
+The tags are the first four bytes of the event and tier UUIDs. The MAC is keyed
+per event, so a scanner holding only that event's key can tell a genuine
+ticket from a forged one offline.
+
+The per-event key is HMAC-SHA256(QR_SIGNING_KEY, "yadi-qr:" + event tag)
+(_key_for_tag), derived from the 4-byte tag rather than the full UUID so the
+server can verify a token from the token alone. Two events whose UUIDs share
+their first four bytes (about 1 in 4 billion per pair) therefore share a key.
+It is a symmetric key: a device that can check tokens can also sign them, so
+manifests (which carry it) only go to the event's organizer and their own
+scanner accounts (views.gate_access_error). Online check-in still needs the
+token in qr_code_hash, so a minted token only fools devices that are offline.
+
+Legacy hashes ("<uuid>-<hex8>" and "G-<hex32>") are never valid tokens and
+keep working through the normal qr_code_hash lookup.
+"""
+import base64
+import hashlib
+import hmac
+import re
+import struct
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+
+
+VERSION = 1
+TOKEN_LENGTH = 56
+MAC_LENGTH = 8
+
+_BODY = struct.Struct('>B4s4sH16s')
+_TOKEN_RE = re.compile(r'^[A-Z2-7]{%d}$' % TOKEN_LENGTH)
+
+QRToken = namedtuple('QRToken', ['event_tag', 'tier_tag', 'group_size', 'subject_id'])
+
+
+def tag(value):
+    """ First four bytes of a UUID, used to identify events and tiers inside a token """
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(str(value))
+    return value.bytes[:4]
+
+
+def _key_for_tag(event_tag):
+    return hmac.new(settings.QR_SIGNING_KEY.encode('utf-8'), b'yadi-qr:' + event_tag, hashlib.sha256).digest()
+
+
+def event_key(event_id):
+    """ Per-event verification key handed to scanner devices """
+    return _key_for_tag(tag(event_id))
+
+
+def issue_token(event_id, tier_id, subject_id, group_size=1):
+    if not isinstance(subject_id, uuid.UUID):
+        subject_id = uuid.UUID(str(subject_id))
+    event_tag = tag(event_id)
+    body = _BODY.pack(VERSION, event_tag, tag(tier_id), min(group_size, 0xFFFF), subject_id.bytes)
+    mac = hmac.new(event_key(event_id), body, hashlib.sha256).digest()[:MAC_LENGTH]
+    return base64.b32encode(body + mac).decode('ascii')
+
+
+def is_signed_token(value):
+    return bool(value) and bool(_TOKEN_RE.match(value))
+
+
+def decode_token(value, key=None):
+    """
+    Returns a QRToken if `value` is a well-formed token with a valid MAC, else None.
+    Pass the event key on devices that do not hold QR_SIGNING_KEY.
+    """
+    if not is_signed_token(value):
+        return None
+
+    raw = base64.b32decode(value)
+    body, mac = raw[:-MAC_LENGTH], raw[-MAC_LENGTH:]
+    version, event_tag, tier_tag, group_size, subject = _BODY.unpack(body)
+    if version != VERSION:
+        return None
+
+    if key is None:
+        key = _key_for_tag(event_tag)
+    expected = hmac.new(key, body, hashlib.sha256).digest()[:MAC_LENGTH]
+    if not hmac.compare_digest(mac, expected):
+        return None
+
+    return QRToken(event_tag, tier_tag, group_size, uuid.UUID(bytes=subject))
@@ -0,0 +1,72 @@
+"""
+Event catalog search.
+
+On Postgres every event carries a search_vector (title A, location B,
+organizer C, description D) that signals.py keeps current, behind a GIN
+index, so a search is an index lookup ranked with ts_rank. Each word of the
+query matches as a prefix, for typeahead ("sau" finds "Sauti Sol"), and titles
+within pg_trgm word similarity match too, for typos ("sauty sol").
+
+Other databases (SQLite in local development) fall back to icontains on the
+same fields.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import CharField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat
+
+from events.models import User
+
+
+# No stemming: artist names, venues and Swahili words gain nothing from English stems
+CONFIG = 'simple'
+
+
+def _words(q):
+    return re.findall(r'[^\W_]+', q.lower())
+
+
+def vector():
+    """ The search_vector expression, for Event.objects...update(search_vector=vector()) """
+    organizer = User.objects.filter(pk=OuterRef('organizer_id')).annotate(
+        name=Concat('first_name', Value(' '), 'last_name', Value(' '), 'username', output_field=CharField())
+    ).values('name')
+    return (
+        SearchVector('title', weight='A', config=CONFIG)
+        + SearchVector('location_name', weight='B', config=CONFIG)
+        + SearchVector(Subquery(organizer), weight='C', config=CONFIG)
+        + SearchVector('description', weight='D', config=CONFIG)
+    )
+
+
+def update_vectors(queryset):
+    """ Recomputes search_vector for the events in `queryset` (Postgres only) """
+    if connection.vendor == 'postgresql':
+        queryset.update(search_vector=vector())
+
+
+def search(queryset, q):
+    """ Events in `queryset` matching every word of `q`, best matches first """
+    words = _words(q)
+    if not words:
+        return queryset
+
+    if connection.vendor != 'postgresql':
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(title__icontains=word) | Q(description__icontains=word)
+                | Q(location_name__icontains=word) | Q(organizer__username__icontains=word)
+            )
+        return queryset.filter(condition)
+
+    # Words are letters and digits only, so they are safe in a raw tsquery
+    query = SearchQuery(' & '.join(f"{word}:*" for word in words), search_type='raw', config=CONFIG)
+    return (
+        queryset
+        .filter(Q(search_vector=query) | Q(title__trigram_word_similar=q))
+        .annotate(rank=SearchRank(F('search_vector'), query), similarity=TrigramWordSimilarity(q, 'title'))
+        .order_by('-rank', '-similarity', 'start_datetime')
+    )
@@ -0,0 +1,64 @@
+"""
+Content-addressed storage for rendered ticket images.
+
+A ticket image is stored in default_storage under a hash of everything drawn
+on it (ticket id, attendee, tier, QR token and the event version), so the
+same inputs always map to the same file and any change maps to a new one.
+Files are never overwritten in place, which makes their URLs safe to cache
+forever; re-sending an email or re-opening the ticket page reads the stored
+file instead of rendering again.
+"""
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from events.services import ticket_render
+
+
+# Bump when the ticket layout changes so every image gets a new key
+RENDER_VERSION = 1
+
+STORAGE_DIR = 'ticket_images'
+
+
+def image_key(ticket, fmt=None):
+    parts = (
+        str(RENDER_VERSION),
+        ticket_render.image_format(fmt),
+        str(ticket.id),
+        ticket.qr_code_hash or '',
+        ticket.attendee_name or '',
+        ticket.tier.name,
+        *ticket_render.event_version(ticket.event),
+    )
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()[:40]
+
+
+def extension(fmt=None):
+    return ticket_render.ENCODERS[ticket_render.image_format(fmt)][1]
+
+
+def content_type(fmt=None):
+    return ticket_render.ENCODERS[ticket_render.image_format(fmt)][0]
+
+
+def storage_path(key, fmt=None):
+    return f"{STORAGE_DIR}/{key[:2]}/{key}.{extension(fmt)}"
+
+
+def get_or_render(ticket, fmt=None):
+    """ Returns (key, image_bytes), rendering and storing the image on first use """
+    key = image_key(ticket, fmt)
+    path = storage_path(key, fmt)
+
+    if default_storage.exists(path):
+        with default_storage.open(path, 'rb') as f:
+            return key, f.read()
+
+    data = ticket_render.render_ticket_bytes(ticket, fmt)
+    saved = default_storage.save(path, ContentFile(data))
+    if saved != path:
+        # Another worker stored the same image first; the content is identical
+        default_storage.delete(saved)
+    return key, data
@@ -0,0 +1,286 @@
+"""
+Ticket image rendering.
+
+Everything that is the same for every ticket of an event (poster, card, title,
+divider, QR frame, date and location rows) is drawn once into a background
+layer and kept in a per-process LRU keyed by the event's version (updated_at
+plus the poster file name), so editing the event or replacing the poster
+starts a new layer. Each ticket only pastes its QR code and draws the tier,
+attendee and footer rows on a copy of that layer.
+
+Fonts are loaded once per process from the DejaVu family installed in the
+image (Dockerfile: fonts-dejavu).
+
+The finished image can be encoded as full RGB PNG, a quantized palette PNG
+(the ticket only uses a handful of colours plus the poster) or WebP; see
+ENCODERS and settings.TICKET_IMAGE_FORMAT. The web ticket page can use the
+vector QR from qr_svg() instead of a raster.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageDraw, ImageFont
+
+from events.services import qr_tokens
+
+
+WIDTH = 600
+HEIGHT = 1800
+MARGIN = 30
+QR_SIZE = 280
+QR_BOX_PADDING = 15
+QR_BOX_SIZE = QR_SIZE + QR_BOX_PADDING * 2
+
+BACKGROUND_COLOR = (9, 9, 11)
+CARD_COLOR = (24, 24, 27)
+TEXT_WHITE = (255, 255, 255)
+TEXT_GREY = (161, 161, 170)
+ACCENT_COLOR = (236, 72, 153)
+
+LAYER_CACHE_SIZE = 64
+PALETTE_COLOURS = 64
+
+_FONT_FILES = {
+    # name: (candidates, size)
+    'title': (('DejaVuSans-Bold.ttf', 'arialbd.ttf'), 40),
+    'label': (('DejaVuSans.ttf', 'arial.ttf'), 20),
+    'value': (('DejaVuSans-Bold.ttf', 'arialbd.ttf'), 26),
+    'small': (('DejaVuSans.ttf', 'arial.ttf'), 16),
+}
+
+
+@lru_cache(maxsize=None)
+def font(name):
+    """ Font registry: each face is read from disk once per process """
+    candidates, size = _FONT_FILES[name]
+    font_dir = getattr(settings, 'TICKET_FONT_DIR', '/usr/share/fonts/truetype/dejavu')
+    for filename in candidates:
+        for path in (os.path.join(font_dir, filename), filename):
+            try:
+                return ImageFont.truetype(path, size)
+            except IOError:
+                continue
+    return ImageFont.load_default()
+
+
+def create_rounded_rectangle_mask(size, radius):
+    """Helper to create a rounded rectangle mask for images"""
+    factor = 2  # Supersample for smooth corners
+    width, height = size
+    mask = Image.new('L', (width * factor, height * factor), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle((0, 0, width * factor, height * factor), radius * factor, fill=255)
+    return mask.resize(size, Image.Resampling.LANCZOS)
+
+
+@dataclass(frozen=True)
+class BackgroundLayer:
+    image: Image.Image
+    qr_origin: tuple
+    rows_y: int
+
+
+_layers = OrderedDict()
+_layers_lock = threading.Lock()
+
+
+def event_version(event):
+    updated_at = event.updated_at.isoformat() if event.updated_at else ''
+    return (str(event.id), updated_at, event.poster_image.name if event.poster_image else '')
+
+
+def clear_layer_cache():
+    with _layers_lock:
+        _layers.clear()
+
+
+def text_width(draw, text, face):
+    bbox = draw.textbbox((0, 0), text, font=face)
+    return bbox[2] - bbox[0]
+
+
+def draw_row_centered(draw, label, value, y, color=TEXT_WHITE):
+    label_w = text_width(draw, label, font('label'))
+    value_w = text_width(draw, str(value), font('value'))
+    draw.text(((WIDTH - label_w) / 2, y), label, font=font('label'), fill=TEXT_GREY)
+    draw.text(((WIDTH - value_w) / 2, y + 28), str(value), font=font('value'), fill=color)
+    return y + 70
+
+
+def build_background(event):
+    """ Draws the event-specific part of the ticket """
+    img = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(img)
+
+    ticket_width = WIDTH - (MARGIN * 2)
+    current_y = MARGIN
+
+    # Poster (the ticket-width derivative when there is one, see services/images.py)
+    if event.poster_image:
+        try:
+            poster_name = (event.poster_derivatives or {}).get('ticket') or event.poster_image.name
+            with default_storage.open(poster_name) as f:
+                poster = Image.open(f).convert("RGBA")
+                aspect = poster.height / poster.width
+                poster_h = min(int(ticket_width * aspect), 450)  # Allow slightly taller posters
+                poster = poster.resize((ticket_width, poster_h), Image.Resampling.BILINEAR)
+                mask = create_rounded_rectangle_mask((ticket_width, poster_h), 20)
+                img.paste(poster, (MARGIN, current_y), mask=mask)
+                current_y += poster_h + 20
+        except Exception as e:
+            print(f"Poster load error: {e}")
+            current_y += 50
+    else:
+        current_y += 50
+
+    # Body card, title and divider
+    draw.rectangle([MARGIN, current_y, WIDTH - MARGIN, HEIGHT - MARGIN], fill=CARD_COLOR)
+    content_y = current_y + 30
+    text_x = MARGIN + 20
+
+    draw.text((text_x, content_y), event.title, font=font('title'), fill=TEXT_WHITE)
+    content_y += 60
+    draw.line([(text_x, content_y), (WIDTH - text_x, content_y)], fill=ACCENT_COLOR, width=3)
+    content_y += 40
+
+    # White frame for the (per-ticket) QR code, centered for visibility
+    qr_x = (WIDTH - QR_BOX_SIZE) // 2
+    qr_y = content_y
+    draw.rounded_rectangle((qr_x, qr_y, qr_x + QR_BOX_SIZE, qr_y + QR_BOX_SIZE), radius=15, fill=(255, 255, 255))
+
+    row_y = qr_y + QR_BOX_SIZE + 40
+    date_str = event.start_datetime.strftime('%d %b %Y')
+    time_str = event.start_datetime.strftime('%I:%M %p')
+    row_y = draw_row_centered(draw, "DATE & TIME", f"{date_str} • {time_str}", row_y)
+    row_y = draw_row_centered(draw, "LOCATION", event.location_name, row_y)
+
+    return BackgroundLayer(image=img, qr_origin=(qr_x + QR_BOX_PADDING, qr_y + QR_BOX_PADDING), rows_y=row_y)
+
+
+def background_for(event):
+    key = event_version(event)
+    with _layers_lock:
+        layer = _layers.get(key)
+        if layer is not None:
+            _layers.move_to_end(key)
+            return layer
+
+    layer = build_background(event)
+    with _layers_lock:
+        # Older versions of the same event can never be hit again
+        for stale in [k for k in _layers if k[0] == key[0]]:
+            del _layers[stale]
+        _layers[key] = layer
+        while len(_layers) > LAYER_CACHE_SIZE:
+            _layers.popitem(last=False)
+    return layer
+
+
+def qr_image(qr_hash):
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=0
+    )
+    if qr_tokens.is_signed_token(qr_hash):
+        # Signed tokens are pure base32, so alphanumeric mode keeps the QR one version smaller
+        qr.add_data(qrcode.util.QRData(qr_hash, mode=qrcode.util.MODE_ALPHA_NUM))
+    else:
+        qr.add_data(qr_hash)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white").resize((QR_SIZE, QR_SIZE))
+
+
+def render_ticket(ticket, use_cache=True):
+    """ Returns the ticket as a PIL image. use_cache=False rebuilds the background (benchmarks). """
+    layer = background_for(ticket.event) if use_cache else build_background(ticket.event)
+    img = layer.image.copy()
+    draw = ImageDraw.Draw(img)
+
+    img.paste(qr_image(ticket.qr_code_hash), layer.qr_origin)
+
+    row_y = draw_row_centered(draw, "TICKET TYPE", ticket.tier.name, layer.rows_y, color=ACCENT_COLOR)
+    attendee = ticket.attendee_name or "Guest"
+    if len(attendee) > 25:
+        attendee = attendee[:22] + "..."
+    row_y = draw_row_centered(draw, "ATTENDEE", attendee, row_y)
+
+    # Footer ID
+    footer_y = row_y + 30
+    ticket_id = f"ID: {str(ticket.id).split('-')[0].upper()}"
+    text_w = text_width(draw, ticket_id, font('small'))
+    draw.text(((WIDTH - text_w) / 2, footer_y), ticket_id, font=font('small'), fill=TEXT_GREY)
+
+    return img.crop((0, 0, WIDTH, footer_y + 50))
+
+
+def qr_svg(qr_hash):
+    """ The ticket QR as a standalone SVG document (a single <path>, scales to any size) """
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=2,
+        image_factory=qrcode.image.svg.SvgPathImage,
+    )
+    if qr_tokens.is_signed_token(qr_hash):
+        qr.add_data(qrcode.util.QRData(qr_hash, mode=qrcode.util.MODE_ALPHA_NUM))
+    else:
+        qr.add_data(qr_hash)
+    qr.make(fit=True)
+    return qr.make_image().to_string(encoding='unicode')
+
+
+def _encode_png(img, buffer):
+    img.save(buffer, format="PNG", optimize=True)
+
+
+def _encode_png8(img, buffer):
+    palette = img.quantize(colors=PALETTE_COLOURS, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    # Octree averages colours per bucket; snap the nearest entries back to pure
+    # black and white so the QR modules keep full contrast
+    colours = palette.getpalette()[:PALETTE_COLOURS * 3]
+    used = [index for _, index in palette.getcolors(PALETTE_COLOURS)]
+    for target in ((0, 0, 0), (255, 255, 255)):
+        nearest = min(
+            used,
+            key=lambda i: sum((colours[i * 3 + c] - target[c]) ** 2 for c in range(3)),
+        )
+        colours[nearest * 3:nearest * 3 + 3] = target
+    palette.putpalette(colours)
+    palette.save(buffer, format="PNG", compress_level=9)
+
+
+def _encode_webp(img, buffer):
+    img.save(buffer, format="WEBP", quality=90, method=4)
+
+
+# format: (content type, file extension, encoder)
+ENCODERS = {
+    'png': ('image/png', 'png', _encode_png),
+    'png8': ('image/png', 'png', _encode_png8),
+    'webp': ('image/webp', 'webp', _encode_webp),
+}
+
+
+def image_format(fmt=None):
+    fmt = fmt or settings.TICKET_IMAGE_FORMAT
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown ticket image format {fmt!r}")
+    return fmt
+
+
+def encode(img, fmt=None):
+    buffer = BytesIO()
+    ENCODERS[image_format(fmt)][2](img, buffer)
+    return buffer.getvalue()
+
+
+def render_ticket_bytes(ticket, fmt=None, use_cache=True):
+    return encode(render_ticket(ticket, use_cache=use_cache), fmt)
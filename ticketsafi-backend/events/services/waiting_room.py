@@ -0,0 +1,116 @@
+"""
+Virtual waiting room for high-demand on-sales.
+
+Joining takes a sequence number from a cache counter. The queue opens when the
+first buyer joins; from then on the first `admission_rate` positions are admitted
+immediately and another `admission_rate` every minute. Queue and admission
+tokens are signed (django.core.signing), so polling the queue status only
+touches the cache and never Postgres.
+
+An admission token carries its queue position, which is unique per event, and
+use_admission() counts the payment attempts made with it: at most
+ADMISSION_TOKEN_MAX_USES (enough to retry a failed M-Pesa prompt), so one
+admitted buyer cannot pass the token around or hammer /api/pay/initiate/ with
+it and the admission rate stays a real cap. Polling keeps issuing fresh
+admission tokens for the same position, so the count belongs to the position
+and lives as long as the queue (QUEUE_TTL), not as long as one token.
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from events.models import Event
+
+
+CONFIG_TTL = 30
+QUEUE_TTL = 60 * 60 * 12
+QUEUE_SALT = 'events.waiting_room.queue'
+ADMISSION_SALT = 'events.waiting_room.admission'
+
+
+def _key(event_id, name):
+    return f"waiting-room:{event_id}:{name}"
+
+
+def get_config(event_id):
+    """ Returns (enabled, admission_rate) from the cache, loading it from the DB at most every CONFIG_TTL """
+    config = cache.get(_key(event_id, 'config'))
+    if config is None:
+        row = Event.objects.filter(id=event_id).values_list('waiting_room_enabled', 'admission_rate').first()
+        config = row or (False, 0)
+        cache.set(_key(event_id, 'config'), config, CONFIG_TTL)
+    return config
+
+
+def forget_config(event_id):
+    cache.delete(_key(event_id, 'config'))
+
+
+def join(event_id):
+    """ Issues the next queue position for an event. Returns (position, queue_token). """
+    cache.add(_key(event_id, 'opened_at'), time.time(), QUEUE_TTL)
+    cache.add(_key(event_id, 'sequence'), 0, QUEUE_TTL)
+    position = cache.incr(_key(event_id, 'sequence'))
+    token = signing.dumps({'e': str(event_id), 'p': position}, salt=QUEUE_SALT)
+    return position, token
+
+
+def admitted_through(event_id, admission_rate):
+    """ Highest queue position currently allowed through """
+    opened_at = cache.get(_key(event_id, 'opened_at'))
+    if opened_at is None:
+        return 0
+    elapsed_minutes = max(time.time() - opened_at, 0) / 60
+    return int(admission_rate * (1 + elapsed_minutes))
+
+
+def status(event_id, queue_token):
+    """
+    Returns a status dict for a queue token, including an admission token once
+    the holder's position has been reached. Returns None for a bad token.
+    """
+    try:
+        data = signing.loads(queue_token, salt=QUEUE_SALT, max_age=QUEUE_TTL)
+    except signing.BadSignature:
+        return None
+    if data.get('e') != str(event_id):
+        return None
+
+    enabled, admission_rate = get_config(event_id)
+    position = data['p']
+    through = admitted_through(event_id, admission_rate) if enabled else position
+    admitted = position <= through
+
+    result = {
+        'position': position,
+        'ahead': max(position - through, 0),
+        'admitted': admitted,
+        'admission_token': None,
+    }
+    if admitted and enabled:
+        result['admission_token'] = signing.dumps({'e': str(event_id), 'p': position}, salt=ADMISSION_SALT)
+        result['expires_in'] = settings.ADMISSION_TOKEN_TTL_SECONDS
+    return result
+
+
+def use_admission(event_id, admission_token):
+    """ True if the token admits to this event and has uses left; counts this use """
+    if not admission_token:
+        return False
+    try:
+        data = signing.loads(admission_token, salt=ADMISSION_SALT, max_age=settings.ADMISSION_TOKEN_TTL_SECONDS)
+    except signing.BadSignature:
+        return False
+    if data.get('e') != str(event_id):
+        return False
+
+    uses_key = _key(event_id, f"admission-uses:{data['p']}")
+    cache.add(uses_key, 0, QUEUE_TTL)
+    try:
+        uses = cache.incr(uses_key)
+    except ValueError:
+        # Evicted between add and incr
+        return False
+    return uses <= settings.ADMISSION_TOKEN_MAX_USES
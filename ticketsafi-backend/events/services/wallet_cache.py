@@ -0,0 +1,126 @@
+"""
+Organizer wallet balance/history cache with stale-while-revalidate.
+
+Entries are fresh for WALLET_CACHE_FRESH_SECONDS. After that they are still
+served, marked stale, for up to WALLET_CACHE_STALE_SECONDS while one
+background task (deduplicated with cache.add) refreshes them, so dashboard
+polling is a cache read. Only a complete miss calls the wallet service in the
+request; if that fails the caller gets WalletServiceError rather than a fake
+zero balance.
+
+Each organizer has a version number in the cache; invalidate() bumps it, which
+orphans every balance and history page cached under the old version at once.
+
+aget()/ainvalidate() are the same operations for the async views, using the
+async cache API and AsyncWalletClient.
+"""
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from events.services.wallet_client import get_async_wallet_client, get_wallet_client
+
+
+def _version(user_id):
+    version = cache.get(f"wallet:{user_id}:version")
+    if version is None:
+        cache.add(f"wallet:{user_id}:version", 1, None)
+        version = cache.get(f"wallet:{user_id}:version") or 1
+    return version
+
+
+async def _aversion(user_id):
+    version = await cache.aget(f"wallet:{user_id}:version")
+    if version is None:
+        await cache.aadd(f"wallet:{user_id}:version", 1, None)
+        version = await cache.aget(f"wallet:{user_id}:version") or 1
+    return version
+
+
+def _digest(params):
+    return hashlib.md5(json.dumps(params or {}, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _key(user_id, kind, params):
+    return f"wallet:{user_id}:v{_version(user_id)}:{kind}:{_digest(params)}"
+
+
+async def _akey(user_id, kind, params):
+    return f"wallet:{user_id}:v{await _aversion(user_id)}:{kind}:{_digest(params)}"
+
+
+def _fetch(client, user_id, kind, params):
+    # Returns a coroutine when given the async client
+    if kind == 'history':
+        return client.get_history(user_id, params)
+    return client.get_balance(user_id)
+
+
+def _ttl():
+    return settings.WALLET_CACHE_FRESH_SECONDS + settings.WALLET_CACHE_STALE_SECONDS
+
+
+def refresh(user_id, kind, params=None):
+    """ Calls the wallet service and stores the result. Raises WalletServiceError. """
+    data = _fetch(get_wallet_client(), user_id, kind, params)
+    entry = {'data': data, 'fetched_at': time.time()}
+    cache.set(_key(user_id, kind, params), entry, _ttl())
+    return entry
+
+
+def get(user_id, kind='balance', params=None):
+    """
+    Returns (data, age_seconds, is_stale). A stale hit schedules a background
+    refresh; a miss fetches inline.
+    """
+    key = _key(user_id, kind, params)
+    entry = cache.get(key)
+
+    if entry is None:
+        entry = refresh(user_id, kind, params)
+        return entry['data'], 0, False
+
+    age = time.time() - entry['fetched_at']
+    is_stale = age > settings.WALLET_CACHE_FRESH_SECONDS
+    if is_stale and cache.add(f"{key}:refreshing", 1, 30):
+        from events.tasks import refresh_wallet_cache
+        refresh_wallet_cache.delay(str(user_id), kind, params)
+    return entry['data'], int(age), is_stale
+
+
+async def aget(user_id, kind='balance', params=None):
+    """ get() for async views: neither the cache nor a miss's wallet call blocks the event loop """
+    key = await _akey(user_id, kind, params)
+    entry = await cache.aget(key)
+
+    if entry is None:
+        data = await _fetch(get_async_wallet_client(), user_id, kind, params)
+        await cache.aset(key, {'data': data, 'fetched_at': time.time()}, _ttl())
+        return data, 0, False
+
+    age = time.time() - entry['fetched_at']
+    is_stale = age > settings.WALLET_CACHE_FRESH_SECONDS
+    if is_stale and await cache.aadd(f"{key}:refreshing", 1, 30):
+        from events.tasks import refresh_wallet_cache
+        # Publishing to the broker is blocking I/O
+        await sync_to_async(refresh_wallet_cache.delay)(str(user_id), kind, params)
+    return entry['data'], int(age), is_stale
+
+
+def invalidate(user_id):
+    """ Drops every cached balance/history page for an organizer (after withdrawals and payments) """
+    try:
+        cache.incr(f"wallet:{user_id}:version")
+    except ValueError:
+        cache.set(f"wallet:{user_id}:version", 2, None)
+
+
+async def ainvalidate(user_id):
+    try:
+        await cache.aincr(f"wallet:{user_id}:version")
+    except ValueError:
+        await cache.aset(f"wallet:{user_id}:version", 2, None)
@@ -1,33 +1,187 @@
+"""
+Client for the Wallet microservice.
+
+One client per process (get_wallet_client()) holds a pooled requests.Session,
+so calls reuse keep-alive connections instead of paying a TCP/TLS handshake
+each time. Every endpoint has its own (connect, read) timeout; idempotent GETs
+are retried a couple of times with jittered backoff, POSTs (payments,
+withdrawals) never are. A circuit breaker stops calling the service for a
+while after repeated failures so requests fail fast instead of piling up on
+timeouts. metrics() returns per-endpoint counters.
+
+AsyncWalletClient (get_async_wallet_client()) is the httpx equivalent used by
+the async views in views_async.py. Same timeouts, retry and breaker rules, and
+it shares the process's breaker and counters with the sync client, so both
+code paths see one picture of the wallet service's health.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import urllib.parse
+import weakref
+
+import httpx
 import requests
-from decouple import config  
+from decouple import config
+from requests.adapters import HTTPAdapter
 from rest_framework.exceptions import APIException
 
 class WalletServiceError(APIException):
     status_code = 503
     default_detail = 'Wallet Service Unavailable'
 
-class WalletClient:
+class WalletCircuitOpen(WalletServiceError):
+    default_detail = 'Wallet Service Unavailable (circuit open)'
+
+
+# (connect, read) seconds per endpoint. Payment and withdrawal calls wait on the
+# wallet's own M-Pesa round trip, so they get the longest read timeout.
+TIMEOUTS = {
+    'onboard': (3.05, 10),
+    'payment': (3.05, 15),
+    'withdraw': (3.05, 15),
+    'auth': (3.05, 5),
+    'balance': (3.05, 4),
+    'history': (3.05, 5),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+GET_RETRIES = 2
+RETRY_BACKOFF = 0.1
+RETRY_STATUSES = {502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    CLOSED: calls go through. After `failure_threshold` consecutive failures
+    the breaker OPENs and rejects calls for `reset_timeout` seconds, then lets
+    a single trial call through (HALF_OPEN); its outcome closes or re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class WalletMetrics:
+    """ Per-endpoint counters, shared by the sync and async clients of a process """
+
     def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, **increments):
+        with self._lock:
+            counters = self._counters.setdefault(name, {
+                'requests': 0, 'failures': 0, 'retries': 0, 'short_circuited': 0, 'total_ms': 0.0,
+            })
+            for key, value in increments.items():
+                counters[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {name: dict(counters) for name, counters in self._counters.items()}
+        for counters in snapshot.values():
+            counters['avg_ms'] = round(counters['total_ms'] / counters['requests'], 1) if counters['requests'] else 0.0
+        return snapshot
+
+
+class BaseWalletClient:
+    """
+    Configuration, breaker, counters and the Wallet endpoints. Subclasses
+    provide the transport (_post/_get); on AsyncWalletClient those return
+    coroutines, so every endpoint method is awaited there.
+    """
+
+    def __init__(self, breaker=None, stats=None):
         # CORRECT USAGE: Use config(...) directly, not settings.config(...)
         self.base_url = config('WALLET_SERVICE_URL', default='http://localhost:8001/api/service/')
         self.api_key = config('WALLET_SERVICE_KEY')
-        
+
         self.headers = {
             'X-Service-Key': self.api_key,
             'Content-Type': 'application/json'
         }
 
-    def _post(self, endpoint, data):
-        url = f"{self.base_url}{endpoint}"
-        try:
-            response = requests.post(url, json=data, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Wallet Service Error: {e}")
-            if e.response:
-                print(f"Response: {e.response.text}")
-            raise WalletServiceError(f"Failed to connect to Wallet System: {str(e)}")
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=config('WALLET_BREAKER_FAILURES', default=5, cast=int),
+            reset_timeout=config('WALLET_BREAKER_RESET_SECONDS', default=30, cast=float),
+        )
+        self.stats = stats or WalletMetrics()
+
+    def _count(self, name, **increments):
+        self.stats.count(name, **increments)
+
+    def metrics(self):
+        return {'breaker': self.breaker.state, 'endpoints': self.stats.snapshot()}
+
+    def _start(self, method, endpoint):
+        """ Checks the breaker. Returns (endpoint name, number of attempts). """
+        name = endpoint.split('/', 1)[0]
+        if not self.breaker.allow():
+            self._count(name, short_circuited=1)
+            raise WalletCircuitOpen()
+        return name, 1 + (GET_RETRIES if method == 'GET' else 0)
+
+    def _failed(self, name, started, status_code, last_attempt):
+        """
+        Books a failed call (status_code None = no response at all). Returns
+        True if it should be retried.
+        """
+        server_side = status_code is None or status_code >= 500
+        retryable = status_code is None or status_code in RETRY_STATUSES
+        self._count(name, requests=1, total_ms=(time.perf_counter() - started) * 1000)
+        if retryable and not last_attempt:
+            self._count(name, retries=1)
+            return True
+
+        if server_side:
+            # Only an unreachable/failing service trips the breaker, not a 4xx
+            self.breaker.record_failure()
+            self._count(name, failures=1)
+        else:
+            self.breaker.record_success()
+        return False
+
+    def _succeeded(self, name, started):
+        self._count(name, requests=1, total_ms=(time.perf_counter() - started) * 1000)
+        self.breaker.record_success()
+
+    @staticmethod
+    def _backoff(attempt):
+        return RETRY_BACKOFF * (2 ** attempt) + random.uniform(0, RETRY_BACKOFF)
+
+    # --- Endpoints ---
 
     def onboard_user(self, user):
         """
@@ -38,10 +192,10 @@ class WalletClient:
             "email": user.email,
             "phone": user.phone_number or ""
         }
-        
+
         response = self._post('onboard/', payload)
         return response
-    
+
 
 
     def get_balance(self, user_id):
@@ -62,24 +216,6 @@ class WalletClient:
         }
         return self._post('withdraw/', payload)
 
-    def _get(self, endpoint):
-        url = f"{self.base_url}{endpoint}"
-        try:
-            response = requests.get(url, headers=self.headers, timeout=5)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Wallet GET Error: {e}")
-            # FIXED: Return ALL fields to prevent NaN on frontend
-            return {
-                "balance": 0.00, 
-                "pending_payouts": 0.00,  # <--- Added
-                "currency": "KES",
-                "is_frozen": False,
-                "is_kyc_verified": False
-            }
-        
-
 
 
     def collect_payment(self, organizer_id, phone, amount, ticket_ref):
@@ -90,7 +226,7 @@ class WalletClient:
             "reference": ticket_ref
         }
         return self._post('payment/collect/', payload)
-    
+
 
 
     def get_kyc_link(self, user_id):
@@ -99,17 +235,153 @@ class WalletClient:
         """
         payload = {"remote_user_id": str(user_id)}
         return self._post('auth/link/', payload)
-    
+
 
     def get_history(self, user_id, params=None):
         """ Fetches transaction logs with pagination params """
         endpoint = f"history/{user_id}/"
-        
+
         # Append query params if they exist
         if params:
-            # A simple way to construct query string
-            import urllib.parse
             query_string = urllib.parse.urlencode(params)
             endpoint = f"{endpoint}?{query_string}"
-            
-        return self._get(endpoint)
\ No newline at end of file
+
+        return self._get(endpoint)
+
+
+class WalletClient(BaseWalletClient):
+    def __init__(self, breaker=None, stats=None):
+        super().__init__(breaker, stats)
+
+        pool_size = config('WALLET_POOL_SIZE', default=10, cast=int)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    # --- Transport ---
+
+    def _request(self, method, endpoint, data=None):
+        name, attempts = self._start(method, endpoint)
+        url = f"{self.base_url}{endpoint}"
+        timeout = TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, json=data, timeout=timeout)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                status_code = None if e.response is None else e.response.status_code
+                if self._failed(name, started, status_code, last_attempt=attempt + 1 == attempts):
+                    time.sleep(self._backoff(attempt))
+                    continue
+
+                print(f"Wallet Service Error: {e}")
+                if e.response is not None:
+                    print(f"Response: {e.response.text}")
+                raise WalletServiceError(f"Failed to connect to Wallet System: {str(e)}")
+
+            self._succeeded(name, started)
+            return response.json()
+
+    def _post(self, endpoint, data):
+        return self._request('POST', endpoint, data)
+
+    def _get(self, endpoint):
+        # Errors propagate: callers (services/wallet_cache.py) serve cached data or a 503,
+        # never a made-up zero balance
+        return self._request('GET', endpoint)
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_wallet_client():
+    """
+    The process-wide WalletClient. Rebuilt after a fork (gunicorn --preload,
+    Celery prefork) so children never share the parent's pooled sockets.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = WalletClient()
+                _client_pid = pid
+    return _client
+
+
+class AsyncWalletClient(BaseWalletClient):
+    """
+    httpx.AsyncClient transport for the async views. One per event loop (an
+    AsyncClient's connections belong to the loop that opened them).
+    """
+
+    def __init__(self, breaker=None, stats=None):
+        super().__init__(breaker, stats)
+
+        # Under an ASGI worker one process serves many requests at once, so the pool is larger
+        pool_size = config('WALLET_ASYNC_POOL_SIZE', default=100, cast=int)
+        self.http = httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    # --- Transport ---
+
+    async def _request(self, method, endpoint, data=None):
+        name, attempts = self._start(method, endpoint)
+        url = f"{self.base_url}{endpoint}"
+        connect, read = TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+        timeout = httpx.Timeout(read, connect=connect)
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                response = await self.http.request(method, url, json=data, timeout=timeout)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                error_response = e.response if isinstance(e, httpx.HTTPStatusError) else None
+                status_code = None if error_response is None else error_response.status_code
+                if self._failed(name, started, status_code, last_attempt=attempt + 1 == attempts):
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+
+                print(f"Wallet Service Error: {e}")
+                if error_response is not None:
+                    print(f"Response: {error_response.text}")
+                raise WalletServiceError(f"Failed to connect to Wallet System: {str(e)}")
+
+            self._succeeded(name, started)
+            return response.json()
+
+    async def _post(self, endpoint, data):
+        return await self._request('POST', endpoint, data)
+
+    async def _get(self, endpoint):
+        return await self._request('GET', endpoint)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_wallet_client():
+    """
+    The AsyncWalletClient for the running event loop, sharing the breaker and
+    counters of get_wallet_client(). Under an ASGI worker there is one loop per
+    process; under WSGI Django runs each async view in a short-lived loop, so
+    the async views still work there but without connection reuse.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        shared = get_wallet_client()
+        client = _async_clients[loop] = AsyncWalletClient(breaker=shared.breaker, stats=shared.stats)
+    return client
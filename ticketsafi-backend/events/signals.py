@@ -0,0 +1,92 @@
+"""
+Model signal handlers, connected in EventsConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from stores.models import Store
+
+from .models import Event, TicketTier, User
+from .services import catalog_cache, event_summary, search
+
+
+SEARCHED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Event)
+def refresh_event_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.update_vectors(Event.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Event)
+def refresh_event_summary(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # A full save writes back the summary the instance was loaded with, which sales may have moved since
+    if raw or created or update_fields is not None:
+        return
+    event_summary.refresh(Event.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=TicketTier)
+@receiver(post_delete, sender=TicketTier)
+def refresh_tier_event_summary(sender, instance, raw=False, **kwargs):
+    if not raw:
+        event_summary.refresh(Event.objects.filter(pk=instance.event_id))
+
+
+@receiver(post_save, sender=User)
+def refresh_organizer_search_vectors(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Organizer names are part of their events' vectors; logins (last_login only) change nothing
+    if raw or created or instance.role != User.Role.ORGANIZER:
+        return
+    if update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields):
+        return
+    search.update_vectors(Event.objects.filter(organizer_id=instance.pk))
+    # ...and of the organizer_name shown on their events and stores
+    catalog_cache.store_changed(
+        instance.stores.values_list('slug', flat=True),
+        instance.events.values_list('id', flat=True),
+    )
+
+
+# --- Catalog response cache (services/catalog_cache.py) ---
+
+@receiver(pre_save, sender=Event)
+def remember_event_store(sender, instance, raw=False, update_fields=None, **kwargs):
+    # An event moved to another store must drop off the old store's page too
+    if raw or instance._state.adding or (update_fields is not None and 'store' not in update_fields):
+        return
+    instance._previous_store_id = Event.objects.filter(pk=instance.pk).values_list('store_id', flat=True).first()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event(sender, instance, raw=False, **kwargs):
+    if not raw:
+        catalog_cache.event_changed(instance.pk, [instance.store_id, getattr(instance, '_previous_store_id', None)])
+
+
+@receiver(post_save, sender=TicketTier)
+@receiver(post_delete, sender=TicketTier)
+def invalidate_tier_event(sender, instance, raw=False, **kwargs):
+    # Prices and availability show on the event page and, as lowest_price, in every listing
+    if not raw:
+        catalog_cache.event_changed(instance.event_id)
+
+
+@receiver(pre_save, sender=Store)
+def remember_store_slug(sender, instance, raw=False, **kwargs):
+    # A renamed store's old URL must stop serving the cached page
+    if not raw and not instance._state.adding:
+        instance._previous_slug = Store.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Store)
+@receiver(pre_delete, sender=Store)
+def invalidate_store(sender, instance, raw=False, **kwargs):
+    # Before a delete, while its events still point at it (they are then unlinked with a bulk update)
+    if not raw:
+        catalog_cache.store_changed(
+            [instance.slug, getattr(instance, '_previous_slug', None)],
+            instance.events.values_list('id', flat=True),
+        )
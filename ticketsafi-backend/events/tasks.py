@@ -0,0 +1,109 @@
+import random
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+
+from .models import Ticket, WebhookInbox
+from .services import bulk_render, delivery, event_summary, idempotency, inventory, payments, wallet_cache
+from .services.wallet_client import WalletServiceError
+
+
+WEBHOOK_MAX_RETRIES = 8
+DELIVERY_MAX_RETRIES = 6
+
+
+@shared_task(bind=True, max_retries=WEBHOOK_MAX_RETRIES, acks_late=True)
+def process_webhook(self, inbox_id):
+    """
+    Processes one stored payment webhook. Transient errors (DB, locks) are
+    retried with exponential backoff and jitter; permanent ones fail the row.
+    """
+    try:
+        payments.process_inbox_row(inbox_id)
+    except payments.PermanentWebhookError as e:
+        payments.record_failure(inbox_id, e, final=True)
+    except Exception as e:
+        final = self.request.retries >= self.max_retries
+        payments.record_failure(inbox_id, e, final=final)
+        if not final:
+            countdown = (2 ** self.request.retries) + random.uniform(0, 1)
+            raise self.retry(exc=e, countdown=countdown)
+
+
+@shared_task
+def redrive_webhook_inbox(stale_after_seconds=120):
+    """ Re-enqueues inbox rows whose task was lost (broker restart, worker crash) """
+    cutoff = timezone.now() - timedelta(seconds=stale_after_seconds)
+    stale = WebhookInbox.objects.filter(
+        status=WebhookInbox.Status.RECEIVED, received_at__lt=cutoff, attempts__lt=WEBHOOK_MAX_RETRIES
+    ).values_list('id', flat=True)[:500]
+    for inbox_id in stale:
+        process_webhook.delay(inbox_id)
+
+
+@shared_task
+def release_ticket_holds():
+    released = inventory.release_expired_holds()
+    # Striped tiers skip the per-sale summary update; catch their events up here
+    event_summary.refresh_striped()
+    return released
+
+
+@shared_task
+def purge_idempotency_keys():
+    return idempotency.purge()
+
+
+@shared_task(bind=True, max_retries=DELIVERY_MAX_RETRIES, acks_late=True)
+def deliver_ticket(self, ticket_id):
+    """
+    Renders and emails one ticket (routed to the 'tickets' queue). SMTP and
+    rendering errors are retried with backoff; the last failure marks the
+    ticket FAILED so the buyer or organizer can resend it.
+    """
+    try:
+        delivery.deliver(ticket_id)
+    except Ticket.DoesNotExist:
+        return
+    except Exception as e:
+        final = self.request.retries >= self.max_retries
+        delivery.record_failure(ticket_id, e, final=final)
+        if not final:
+            countdown = 30 * (2 ** self.request.retries) + random.uniform(0, 5)
+            raise self.retry(exc=e, countdown=countdown)
+
+
+@shared_task(acks_late=True)
+def render_ticket_chunk(ticket_ids, fmt=None):
+    """ Pre-renders and stores a chunk of ticket images (routed to the 'tickets' queue) """
+    return len(bulk_render.render_chunk(ticket_ids, fmt))
+
+
+@shared_task(acks_late=True)
+def bundle_event_tickets(event_id, kind='pdf', fmt=None):
+    """
+    Builds an event's ticket PDF/ZIP for its organizer once every chunk is
+    rendered (chord callback, routed to the 'tickets' queue)
+    """
+    try:
+        return bulk_render.bundle_event(event_id, kind, fmt)
+    except Exception as e:
+        print(f"Ticket bundle for event {event_id} failed: {e}")
+        bulk_render.bundle_failed(event_id, kind)
+
+
+@shared_task
+def bundle_event_failed(event_id, kind):
+    """ Error callback of the bundle chord: a render chunk failed, so no bundle is coming """
+    bulk_render.bundle_failed(event_id, kind)
+
+
+@shared_task
+def refresh_wallet_cache(user_id, kind, params=None):
+    """ Background half of the wallet stale-while-revalidate cache """
+    try:
+        wallet_cache.refresh(user_id, kind, params)
+    except WalletServiceError as e:
+        # The stale entry keeps being served until it ages out
+        print(f"Wallet cache refresh failed for {user_id}/{kind}: {e}")
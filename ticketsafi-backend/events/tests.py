@@ -1,3 +1,1424 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import tasks
+from .models import User, Event, TicketTier, Ticket, Payment, WebhookInbox
+from .views import EventListView
+from .services import bulk_render, checkin, delivery, inventory, manifest, payment_status, payments, qr_tokens, ticket_images, ticket_render, waiting_room, wallet_cache
+
+
+def make_event(organizer, **kwargs):
+    start = timezone.now() + timedelta(days=7)
+    defaults = {
+        'title': 'Sauti Sol Live',
+        'description': 'Live at the Carnivore grounds.',
+        'location_name': 'Carnivore, Nairobi',
+        'start_datetime': start,
+        'end_datetime': start + timedelta(hours=6),
+        'is_published': True,
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(organizer=organizer, **defaults)
+
+
+def make_group(event, tier, owner, size, qr_hash):
+    return [
+        Ticket.objects.create(
+            event=event, tier=tier, owner=owner,
+            attendee_name=f"Guest ({i + 1}/{size})", qr_code_hash=qr_hash,
+        )
+        for i in range(size)
+    ]
+
+
+class VerifyTicketViewTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.scanner = User.objects.create_user('gate1', 'gate1@yadi.app', 'pass', role=User.Role.SCANNER, employer=self.organizer)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='Regular', price=0, quantity_allocated=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.scanner)
+
+    def scan(self, qr_hash):
+        return self.client.post('/api/scanner/verify/', {'qr_hash': qr_hash}, format='json')
+
+    def test_group_is_checked_in_sequentially(self):
+        make_group(self.event, self.tier, self.buyer, 2, 'G-group')
+
+        first = self.scan('G-group')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['group_status'], 'Checked in 1 of 2')
+        self.assertEqual(first.data['attendee_name'], 'Guest (1/2)')
+
+        second = self.scan('G-group')
+        self.assertEqual(second.data['group_status'], 'Checked in 2 of 2')
+        self.assertEqual(second.data['tier_name'], 'Regular')
+
+        third = self.scan('G-group')
+        self.assertEqual(third.status_code, 409)
+        self.assertEqual(third.data['checked_in_count'], 2)
+        self.assertEqual(third.data['total_in_group'], 2)
+
+    def test_unknown_hash(self):
+        self.assertEqual(self.scan('nope').status_code, 404)
+
+    def test_organizer_cannot_check_in_other_events(self):
+        other = User.objects.create_user('other', 'other@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        ticket, = make_group(self.event, self.tier, self.buyer, 1, 'single')
+        self.client.force_authenticate(other)
+
+        self.assertEqual(self.scan('single').status_code, 403)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, Ticket.Status.ACTIVE)
+
+
+class CatalogQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.client = APIClient()
+
+    def add_events(self, count):
+        # Committing runs the catalog cache invalidation, so the next request is a miss
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(count):
+                event = make_event(self.organizer, title=f"Event {n}")
+                TicketTier.objects.create(event=event, name='Regular', price=1500 + n, quantity_allocated=100)
+                TicketTier.objects.create(event=event, name='VIP', price=5000, quantity_allocated=10)
+
+    def assertConstantQueries(self, url, expected):
+        self.add_events(2)
+        with self.assertNumQueries(expected):
+            self.client.get(url)
+        self.add_events(15)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        return response.json()['results']
+
+    def test_public_list_is_count_plus_one_page_query(self):
+        results = self.assertConstantQueries('/api/events/', 2)
+        self.assertEqual(len(results), 17)
+        self.assertEqual(results[0]['lowest_price'], 1500)
+        self.assertEqual(results[0]['organizer_name'], 'organizer')
+
+    def test_organizer_list(self):
+        self.client.force_authenticate(self.organizer)
+        self.assertConstantQueries('/api/organizer/events/', 2)
+
+    def test_price_filters_use_cheapest_and_dearest_tier(self):
+        self.add_events(3)
+        cheap = make_event(self.organizer, title='Cheap')
+        TicketTier.objects.create(event=cheap, name='Free', price=0, quantity_allocated=100)
+
+        titles = lambda **params: {e['title'] for e in self.client.get('/api/events/', params).json()['results']}
+        self.assertEqual(titles(max_price=100), {'Cheap'})
+        self.assertNotIn('Cheap', titles(min_price=1000))
+        self.assertEqual(len(titles(min_price=4000, max_price=1501)), 2)
+
+
+class IndexPlanTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.event = make_event(self.organizer, category='CONCERT')
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # A handful of rows is cheaper to scan; ask whether the index can serve the query at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def catalog(self, **params):
+        view = EventListView()
+        view.request = Request(APIRequestFactory().get('/api/events/', params))
+        return view.get_queryset()
+
+    def test_catalog_filters_use_the_partial_indexes(self):
+        self.assertIn('event_published_start_idx', self.plan(self.catalog()))
+        self.assertIn('event_published_start_idx', self.plan(self.catalog(date='2026-12-01')))
+        self.assertIn('event_published_category_idx', self.plan(self.catalog(category='Concert')))
+
+    def test_ticket_and_payment_lookups_use_their_indexes(self):
+        self.assertIn('ticket_event_status_idx', self.plan(Ticket.objects.filter(event=self.event, status=Ticket.Status.ACTIVE)))
+        self.assertIn('ticket_owner_purchase_idx', self.plan(Ticket.objects.filter(owner=self.organizer).order_by('-purchase_date', '-id')))
+        self.assertIn('payment_event_status_idx', self.plan(Payment.objects.filter(event=self.event, status=Payment.Status.COMPLETED)))
+        self.assertIn('payment_checkout_idx', self.plan(Payment.objects.filter(checkout_request_id='ws_CO_191220191020363925')))
+
+    def test_date_filter_is_a_nairobi_calendar_day(self):
+        nairobi = timezone.get_default_timezone()
+        late = make_event(self.organizer, title='Late', start_datetime=timezone.datetime(2026, 12, 1, 23, 30, tzinfo=nairobi))
+        early = make_event(self.organizer, title='Early', start_datetime=timezone.datetime(2026, 12, 1, 0, 0, tzinfo=nairobi))
+        make_event(self.organizer, title='Next day', start_datetime=timezone.datetime(2026, 12, 2, 0, 0, tzinfo=nairobi))
+        make_event(self.organizer, title='Day before', start_datetime=timezone.datetime(2026, 11, 30, 23, 59, tzinfo=nairobi))
+
+        self.assertEqual(set(self.catalog(date='2026-12-01')), {early, late})
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('buyer', 'buyer@yadi.app', 'pass')
+        self.event = make_event(self.organizer, poster_image='posters/sauti.jpg')
+        self.tier = TicketTier.objects.create(event=self.event, name='Regular', price=1000, quantity_allocated=100)
+        tickets = Ticket.objects.bulk_create([
+            Ticket(event=self.event, tier=self.tier, owner=self.buyer, attendee_name=f"Guest {n}", qr_code_hash=f"hash-{n}")
+            for n in range(45)
+        ])
+        # Bought in one go: only the id orders them
+        Ticket.objects.update(purchase_date=timezone.now())
+        self.ids = sorted(str(t.id) for t in tickets)
+        self.client = APIClient()
+
+    def walk(self, url, queries):
+        ids, pages = [], 0
+        while url:
+            with self.assertNumQueries(queries):
+                body = self.client.get(url).json()
+            self.assertNotIn('count', body)
+            ids += [t['id'] for t in body['results']]
+            url, pages = body['next'], pages + 1
+        return ids, pages
+
+    def test_attendees_walk_every_ticket_once_in_id_order(self):
+        self.client.force_authenticate(self.organizer)
+        url = f'/api/organizer/events/{self.event.id}/attendees/?pagination=cursor'
+        ids, pages = self.walk(url, 2)  # Organizer check, then one seek per page
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(pages, 3)
+
+    def test_cursor_seeks_on_the_whole_key_and_walks_back(self):
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_authenticate(self.buyer)
+        first = self.client.get('/api/tickets/', {'pagination': 'cursor'}).json()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first['next']).json()
+        sql = queries[-1]['sql']
+        # Every ticket shares one purchase_date: the seek compares (purchase_date, id), no OFFSET
+        self.assertRegex(sql, r'\(\S*"purchase_date", \S*"id"\) <')
+        self.assertNotIn('OFFSET', sql)
+        self.assertEqual([t['id'] for t in second['results']], self.ids[::-1][20:40])
+
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([t['id'] for t in back['results']], self.ids[::-1][:20])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(self.client.get('/api/tickets/', {'cursor': 'nope'}).status_code, 404)
+
+    def test_my_tickets_cursor_is_newest_first_and_page_numbers_still_work(self):
+        self.client.force_authenticate(self.buyer)
+        ids, _ = self.walk('/api/tickets/?pagination=cursor', 1)
+        self.assertEqual(ids, self.ids[::-1])
+
+        body = self.client.get('/api/tickets/', {'page': 3}).json()
+        self.assertEqual(body['count'], 45)
+        self.assertEqual([t['id'] for t in body['results']], self.ids[::-1][40:])
+
+    def test_catalog_cursor_but_not_for_search(self):
+        for n in range(25):
+            make_event(self.organizer, title=f"Event {n}", start_datetime=timezone.now() + timedelta(days=n + 1))
+        ids, pages = self.walk('/api/events/?pagination=cursor', 1)
+        self.assertEqual(len(ids), 26)
+        self.assertEqual(pages, 2)
+        self.assertIn('count', self.client.get('/api/events/', {'pagination': 'cursor', 'q': 'event'}).json())
+
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create_user('bluemoon', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        make_event(organizer, title='Sauti Sol Live', location_name='Carnivore, Nairobi')
+        make_event(organizer, title='Nyege Nyege Afterparty', description='Featuring a surprise Sauti Sol set.', location_name='Alchemist, Westlands')
+        make_event(organizer, title='Koroga Festival', location_name='Two Rivers Mall')
+
+    def titles(self, q):
+        return [e['title'] for e in APIClient().get('/api/events/', {'q': q}).json()['results']]
+
+    def test_every_word_must_match_title_description_location_or_organizer(self):
+        self.assertEqual(set(self.titles('sauti sol')), {'Sauti Sol Live', 'Nyege Nyege Afterparty'})
+        self.assertEqual(self.titles('westlands'), ['Nyege Nyege Afterparty'])
+        self.assertEqual(len(self.titles('bluemoon')), 3)
+        self.assertEqual(self.titles('koroga rivers'), ['Koroga Festival'])
+        self.assertEqual(len(self.titles('  %_ ')), 3)  # No words: no filter
+
+    @skipUnless(connection.vendor == 'postgresql', "Full-text and trigram search need Postgres")
+    def test_postgres_ranks_prefixes_and_tolerates_typos(self):
+        self.assertEqual(self.titles('sauti so')[0], 'Sauti Sol Live')  # Title (A) outranks description (D)
+        self.assertEqual(self.titles('koro'), ['Koroga Festival'])
+        self.assertIn('Koroga Festival', self.titles('korroga'))
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event = make_event(self.organizer, title='Sauti Sol Live', category='CONCERT')
+            self.tier = TicketTier.objects.create(event=self.event, name='Regular', price=1500, quantity_allocated=100)
+            self.other = make_event(self.organizer, title='Koroga Festival')
+        self.client = APIClient()
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeat_requests_are_served_from_cache(self):
+        self.assertEqual(self.get('/api/events/', {'category': 'CONCERT', 'q': 'sauti'})['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get('/api/events/?q=sauti%20&category=CONCERT&date=')  # Same params, normalized
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['results'][0]['title'], 'Sauti Sol Live')
+
+        self.get(f'/api/events/{self.event.id}/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(f'/api/events/{self.event.id}/')['X-Cache'], 'HIT')
+
+    def test_saves_invalidate_only_what_showed_them(self):
+        self.get('/api/events/')
+        self.get(f'/api/events/{self.event.id}/')
+        self.get(f'/api/events/{self.other.id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tier.price = 900
+            self.tier.save()
+
+        self.assertEqual(self.get('/api/events/')['X-Cache'], 'MISS')
+        response = self.get(f'/api/events/{self.event.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['lowest_price'], 900)
+        self.assertEqual(self.get(f'/api/events/{self.other.id}/')['X-Cache'], 'HIT')
+
+    def test_unpublished_event_leaves_the_cache(self):
+        self.get(f'/api/events/{self.event.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.is_published = False
+            self.event.save()
+        self.assertEqual(self.client.get(f'/api/events/{self.event.id}/').status_code, 404)
+        self.assertEqual([e['title'] for e in self.get('/api/events/').json()['results']], ['Koroga Festival'])
+
+
+class QRTokenTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='VIP', price=0, quantity_allocated=100)
+
+    def test_new_tickets_get_signed_tokens(self):
+        ticket = Ticket.objects.create(event=self.event, tier=self.tier, owner=self.organizer)
+        token = qr_tokens.decode_token(ticket.qr_code_hash, key=qr_tokens.event_key(self.event.id))
+
+        self.assertEqual(len(ticket.qr_code_hash), qr_tokens.TOKEN_LENGTH)
+        self.assertEqual(token.subject_id, ticket.id)
+        self.assertEqual(token.tier_tag, qr_tokens.tag(self.tier.id))
+        self.assertEqual(token.group_size, 1)
+
+    def test_tampered_and_legacy_values_do_not_verify(self):
+        value = qr_tokens.issue_token(self.event.id, self.tier.id, self.event.id, group_size=4)
+        tampered = ('A' if value[10] != 'A' else 'B').join([value[:10], value[11:]])
+
+        self.assertIsNone(qr_tokens.decode_token(tampered))
+        self.assertIsNone(qr_tokens.decode_token(value, key=qr_tokens.event_key(self.tier.id)))
+        self.assertIsNone(qr_tokens.decode_token(f"G-{self.event.id.hex}"))
+
+    def test_scanner_rejects_forged_token_and_accepts_legacy_hash(self):
+        scanner = User.objects.create_user('gate1', 'gate1@yadi.app', 'pass', role=User.Role.SCANNER)
+        make_group(self.event, self.tier, self.organizer, 1, 'legacy-hash')
+        client = APIClient()
+        client.force_authenticate(scanner)
+
+        forged = client.post('/api/scanner/verify/', {'qr_hash': 'A' * qr_tokens.TOKEN_LENGTH}, format='json')
+        legacy = client.post('/api/scanner/verify/', {'qr_hash': 'legacy-hash'}, format='json')
+
+        self.assertEqual(forged.status_code, 404)
+        self.assertEqual(legacy.status_code, 200)
+
+
+class EventManifestViewTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.scanner = User.objects.create_user('gate1', 'gate1@yadi.app', 'pass', role=User.Role.SCANNER, employer=self.organizer)
+        self.event = make_event(self.organizer, is_offline_ready=True)
+        self.tier = TicketTier.objects.create(event=self.event, name='VIP', price=0, quantity_allocated=100)
+        make_group(self.event, self.tier, self.organizer, 3, 'G-family')
+        make_group(self.event, self.tier, self.organizer, 1, 'single')
+        self.client = APIClient()
+        self.client.force_authenticate(self.scanner)
+
+    def download(self, **params):
+        response = self.client.get(f'/api/scanner/events/{self.event.id}/manifest/', params)
+        self.assertEqual(response.status_code, 200)
+        return manifest.parse_manifest(response.content)
+
+    def test_full_manifest_lists_every_qr_group(self):
+        data = self.download()
+        self.assertFalse(data['delta'])
+        self.assertEqual(
+            data['records'],
+            [
+                {'qr_hash': 'G-family', 'tier_name': 'VIP', 'group_size': 3, 'checked_in': 0, 'revoked': False},
+                {'qr_hash': 'single', 'tier_name': 'VIP', 'group_size': 1, 'checked_in': 0, 'revoked': False},
+            ],
+        )
+
+    def test_delta_only_returns_changed_groups(self):
+        version = self.download()['version']
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        checkin.check_in('G-family', self.scanner)
+
+        data = self.download(since=version)
+        self.assertTrue(data['delta'])
+        self.assertEqual([r['qr_hash'] for r in data['records']], ['G-family'])
+        self.assertEqual(data['records'][0]['checked_in'], 1)
+
+    def test_only_the_organizers_own_scanners_get_the_key(self):
+        rival = User.objects.create_user('rival', 'rival@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        for user in [
+            User.objects.create_user('gate2', 'gate2@yadi.app', 'pass', role=User.Role.SCANNER, employer=rival),
+            User.objects.create_user('gate3', 'gate3@yadi.app', 'pass', role=User.Role.SCANNER),
+            rival,
+        ]:
+            self.client.force_authenticate(user)
+            response = self.client.get(f'/api/scanner/events/{self.event.id}/manifest/')
+            self.assertEqual(response.status_code, 403, user.username)
+
+    def test_requires_offline_mode(self):
+        self.event.is_offline_ready = False
+        self.event.save()
+        response = self.client.get(f'/api/scanner/events/{self.event.id}/manifest/')
+        self.assertEqual(response.status_code, 409)
+
+
+class OfflineScanUploadViewTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.scanner = User.objects.create_user('gate1', 'gate1@yadi.app', 'pass', role=User.Role.SCANNER, employer=self.organizer)
+        self.event = make_event(self.organizer)
+        self.other_event = make_event(self.organizer, title='Other')
+        self.tier = TicketTier.objects.create(event=self.event, name='VIP', price=0, quantity_allocated=100)
+        other_tier = TicketTier.objects.create(event=self.other_event, name='VIP', price=0, quantity_allocated=100)
+        make_group(self.event, self.tier, self.organizer, 2, 'G-pair')
+        make_group(self.event, self.tier, self.organizer, 1, 'single')
+        make_group(self.other_event, other_tier, self.organizer, 1, 'elsewhere')
+        self.client = APIClient()
+        self.client.force_authenticate(self.scanner)
+
+    def upload(self, scans):
+        response = self.client.post(f'/api/scanner/events/{self.event.id}/scans/', {'scans': scans}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [r['result'] for r in response.data['results']]
+
+    def test_batch_outcomes(self):
+        at = timezone.now() - timedelta(minutes=30)
+        results = self.upload([
+            {'qr_hash': 'G-pair', 'scanned_at': at, 'device_id': 'gate-a'},
+            {'qr_hash': 'G-pair', 'scanned_at': at + timedelta(minutes=1), 'device_id': 'gate-b'},
+            {'qr_hash': 'G-pair', 'scanned_at': at - timedelta(minutes=1), 'device_id': 'gate-c'},
+            {'qr_hash': 'nope', 'scanned_at': at, 'device_id': 'gate-a'},
+            {'qr_hash': 'elsewhere', 'scanned_at': at, 'device_id': 'gate-a'},
+        ])
+        self.assertEqual(results, ['accepted', 'duplicate', 'accepted', 'unknown', 'wrong_event'])
+        self.assertEqual(
+            Ticket.objects.filter(qr_code_hash='G-pair', status=Ticket.Status.CHECKED_IN).count(), 2
+        )
+
+    def test_earlier_offline_scan_beats_online_check_in(self):
+        checkin.check_in('single', self.scanner)
+        earlier = timezone.now() - timedelta(minutes=10)
+
+        results = self.upload([{'qr_hash': 'single', 'scanned_at': earlier, 'device_id': 'gate-b'}])
+
+        self.assertEqual(results, ['accepted'])
+        ticket = Ticket.objects.get(qr_code_hash='single')
+        self.assertEqual(ticket.checked_in_at, earlier)
+        self.assertEqual(ticket.checked_in_device, 'gate-b')
+
+        later = timezone.now()
+        self.assertEqual(self.upload([{'qr_hash': 'single', 'scanned_at': later, 'device_id': 'gate-c'}]), ['duplicate'])
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='Early Bird', price=1500, quantity_allocated=2)
+
+    def hold(self, reference, quantity=1):
+        hold = inventory.reserve(self.tier, quantity)
+        self.assertIsNotNone(hold)
+        return Payment.objects.create(
+            user=self.buyer, event=self.event, tier=self.tier, amount=self.tier.price,
+            phone_number='254700000000', reference_code=reference, **hold,
+        )
+
+    def test_reservations_cannot_oversell(self):
+        self.hold('TS-1', quantity=2)
+        self.assertIsNone(inventory.reserve(self.tier, 1))
+        self.assertFalse(inventory.sell(self.tier, 1))
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.available_qty(), 0)
+
+    def test_commit_moves_hold_into_sold_once(self):
+        payment = self.hold('TS-1')
+        inventory.commit_hold(payment)
+        inventory.commit_hold(payment)
+
+        self.tier.refresh_from_db()
+        self.assertEqual((self.tier.quantity_sold, self.tier.quantity_reserved), (1, 0))
+
+    def test_sweeper_releases_expired_and_failed_holds(self):
+        expired = self.hold('TS-1')
+        failed = self.hold('TS-2')
+        Payment.objects.filter(pk=expired.pk).update(hold_expires_at=timezone.now() - timedelta(seconds=1))
+        Payment.objects.filter(pk=failed.pk).update(status=Payment.Status.FAILED)
+
+        self.assertEqual(inventory.release_expired_holds(), 2)
+        self.assertEqual(inventory.release_expired_holds(), 0)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.available_qty(), 2)
+
+        # A late COMPLETED webhook still sells the seat the buyer paid for
+        inventory.commit_hold(expired)
+        self.tier.refresh_from_db()
+        self.assertEqual((self.tier.quantity_sold, self.tier.quantity_reserved), (1, 0))
+
+    def test_free_booking_takes_inventory(self):
+        self.tier.price = 0
+        self.tier.save()
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+
+        booked = client.post('/api/pay/initiate/', {'tier_id': str(self.tier.id), 'quantity': 2}, format='json')
+        sold_out = client.post('/api/pay/initiate/', {'tier_id': str(self.tier.id), 'quantity': 1}, format='json')
+
+        self.assertEqual(booked.status_code, 201)
+        self.assertEqual(sold_out.status_code, 400)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.quantity_sold, 2)
+
+
+class EventSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.regular = TicketTier.objects.create(event=self.event, name='Regular', price=1500, quantity_allocated=2)
+        self.vip = TicketTier.objects.create(event=self.event, name='VIP', price=5000, quantity_allocated=1)
+
+    def summary(self):
+        self.event.refresh_from_db()
+        e = self.event
+        return (e.min_price, e.max_price, e.total_capacity, e.total_sold, e.sold_out)
+
+    def test_tier_changes_and_sales_keep_the_summary_current(self):
+        self.assertEqual(self.summary(), (1500, 5000, 3, 0, False))
+
+        self.assertTrue(inventory.sell(self.regular, 2))
+        hold = inventory.reserve(self.vip, 1)
+        payment = Payment.objects.create(
+            user=self.buyer, event=self.event, tier=self.vip, amount=5000,
+            phone_number='254700000000', reference_code='TS-1', **hold,
+        )
+        self.assertEqual(self.summary(), (1500, 5000, 3, 2, False))  # A hold is not a sale
+        inventory.commit_hold(payment)
+        inventory.commit_hold(payment)
+        self.assertEqual(self.summary(), (1500, 5000, 3, 3, True))
+
+        self.vip.delete()
+        self.assertEqual(self.summary(), (1500, 1500, 2, 2, True))
+        self.regular.quantity_allocated = 10
+        self.regular.save(update_fields=['quantity_allocated'])
+        self.assertEqual(self.summary(), (1500, 1500, 10, 2, False))
+
+    def test_saving_a_stale_event_does_not_undo_sales(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        inventory.sell(self.regular, 1)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.summary()[3], 1)
+
+    def test_striped_sales_are_picked_up_by_the_sweeper(self):
+        inventory.configure_striping(self.regular, 2)
+        self.regular.refresh_from_db()
+        inventory.sell(self.regular, 2)
+        self.assertEqual(self.summary()[3], 0)
+        tasks.release_ticket_holds()
+        self.assertEqual(self.summary()[3], 2)
+
+    def test_selling_out_invalidates_the_cached_listing(self):
+        def sold_out_in_listing():
+            response = APIClient().get('/api/events/')
+            return response['X-Cache'], response.json()['results'][0]['sold_out']
+
+        self.assertEqual(sold_out_in_listing(), ('MISS', False))
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.sell(self.regular, 1)
+        self.assertEqual(sold_out_in_listing(), ('HIT', False))  # Still available: no bump per sale
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.sell(self.regular, 1)
+            inventory.sell(self.vip, 1)
+        self.assertEqual(sold_out_in_listing(), ('MISS', True))
+
+    def test_striped_event_selling_out_invalidates_the_cached_listing(self):
+        inventory.configure_striping(self.regular, 2)
+        self.regular.refresh_from_db()
+        inventory.sell(self.regular, 2)
+        inventory.sell(self.vip, 1)
+        APIClient().get('/api/events/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.release_ticket_holds()
+        response = APIClient().get('/api/events/')
+        self.assertEqual((response['X-Cache'], response.json()['results'][0]['sold_out']), ('MISS', True))
+
+    def test_price_filters_and_cards_read_the_event_row(self):
+        make_event(self.organizer, title='No tiers yet')
+        Event.objects.filter(pk=self.event.pk).update(total_sold=99)
+        call_command('rebuild_event_summaries', stdout=StringIO())
+        self.assertEqual(self.summary()[3], 0)
+
+        with self.assertNumQueries(2):
+            results = APIClient().get('/api/events/', {'min_price': 4000, 'max_price': 2000}).json()['results']
+        self.assertEqual([(e['title'], e['lowest_price'], e['sold_out']) for e in results], [('Sauti Sol Live', 1500, False)])
+
+
+class StripedInventoryTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='GA', price=1000, quantity_allocated=10)
+
+    def test_striping_preserves_counters_and_never_oversells(self):
+        self.assertTrue(inventory.sell(self.tier, 3))
+        inventory.configure_striping(self.tier, 4)
+        self.tier.refresh_from_db()
+
+        self.assertEqual(self.tier.stripes.count(), 4)
+        self.assertEqual((self.tier.sold_qty(), self.tier.available_qty()), (3, 7))
+
+        holds = [inventory.reserve(self.tier, 1) for _ in range(7)]
+        self.assertTrue(all(holds))
+        self.assertIsNone(inventory.reserve(self.tier, 1))
+        self.assertEqual(self.tier.available_qty(), 0)
+
+    def test_large_claim_rebalances_across_stripes(self):
+        inventory.configure_striping(self.tier, 4)
+        self.tier.refresh_from_db()
+
+        self.assertTrue(inventory.sell(self.tier, 8))
+        self.assertFalse(inventory.sell(self.tier, 3))
+        self.assertEqual(self.tier.available_qty(), 2)
+
+    def test_hold_on_stripe_commits_to_same_stripe(self):
+        inventory.configure_striping(self.tier, 2)
+        self.tier.refresh_from_db()
+        hold = inventory.reserve(self.tier, 1)
+        payment = Payment.objects.create(
+            user=self.buyer, event=self.event, tier=self.tier, amount=1000,
+            phone_number='254700000000', reference_code='TS-1', **hold,
+        )
+
+        inventory.commit_hold(payment)
+
+        stripe = self.tier.stripes.get(index=hold['inventory_stripe'])
+        self.assertEqual((stripe.quantity_sold, stripe.quantity_reserved), (1, 0))
+
+        inventory.configure_striping(self.tier, 0)
+        self.tier.refresh_from_db()
+        self.assertEqual((self.tier.quantity_sold, self.tier.available_qty()), (1, 9))
+
+
+class WaitingRoomTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer, waiting_room_enabled=True, admission_rate=1)
+        self.tier = TicketTier.objects.create(event=self.event, name='GA', price=0, quantity_allocated=10)
+        self.client = APIClient()
+
+    def test_queue_admits_at_rate_and_gates_payment(self):
+        first = self.client.post(f'/api/events/{self.event.id}/queue/').data
+        second = self.client.post(f'/api/events/{self.event.id}/queue/').data
+
+        self.assertTrue(first['admitted'])
+        self.assertFalse(second['admitted'])
+        self.assertEqual(second['ahead'], 1)
+
+        with self.assertNumQueries(0):
+            polled = self.client.get(f'/api/events/{self.event.id}/queue/status/', {'token': second['queue_token']})
+        self.assertFalse(polled.data['admitted'])
+
+        self.client.force_authenticate(self.buyer)
+        payload = {'tier_id': str(self.tier.id)}
+        self.assertEqual(self.client.post('/api/pay/initiate/', payload, format='json').status_code, 403)
+        admitted = self.client.post(
+            '/api/pay/initiate/', payload, format='json', HTTP_X_ADMISSION_TOKEN=first['admission_token']
+        )
+        self.assertEqual(admitted.status_code, 201)
+
+    @override_settings(ADMISSION_TOKEN_MAX_USES=2)
+    def test_admission_token_cannot_be_shared_beyond_its_uses(self):
+        token = self.client.post(f'/api/events/{self.event.id}/queue/').data['admission_token']
+        payload = {'tier_id': str(self.tier.id)}
+        codes = []
+        for n in range(3):
+            self.client.force_authenticate(User.objects.create_user(f'fan{n}', f'fan{n}@yadi.app', 'pass'))
+            codes.append(self.client.post('/api/pay/initiate/', payload, format='json', HTTP_X_ADMISSION_TOKEN=token).status_code)
+        self.assertEqual(codes, [201, 201, 403])
+
+    @override_settings(ADMISSION_TOKEN_MAX_USES=2)
+    def test_fresh_admission_tokens_do_not_reset_the_uses(self):
+        queued = self.client.post(f'/api/events/{self.event.id}/queue/').data
+        self.assertTrue(waiting_room.use_admission(self.event.id, queued['admission_token']))
+        self.assertTrue(waiting_room.use_admission(self.event.id, queued['admission_token']))
+
+        # Well after the first token expired, polling still admits the position with a new token...
+        later = time.time() + settings.ADMISSION_TOKEN_TTL_SECONDS + 60
+        with mock.patch('time.time', return_value=later):
+            polled = waiting_room.status(self.event.id, queued['queue_token'])
+            self.assertTrue(polled['admitted'])
+            # ...but the position has used up its attempts
+            self.assertFalse(waiting_room.use_admission(self.event.id, polled['admission_token']))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PaymentWebhookTests(TestCase):
+    SECRET = 'test-webhook-secret'
+
+    def setUp(self):
+        os.environ['WEBHOOK_SECRET'] = self.SECRET
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='GA', price=1000, quantity_allocated=10)
+        self.payment = Payment.objects.create(
+            user=self.buyer, event=self.event, tier=self.tier, amount=1000, phone_number='254700000000',
+            reference_code='TS-ABC', **inventory.reserve(self.tier, 1),
+        )
+
+    def deliver(self, payload):
+        body = json.dumps(payload).encode()
+        signature = hmac.new(self.SECRET.encode(), body, hashlib.sha256).hexdigest()
+        with self.captureOnCommitCallbacks(execute=True):
+            return APIClient().post(
+                '/api/webhooks/payment/', body, content_type='application/json', HTTP_X_YADI_SIGNATURE=signature
+            )
+
+    def test_duplicate_deliveries_create_one_ticket(self):
+        first = self.deliver({'reference': 'TS-ABC', 'status': 'COMPLETED'})
+        second = self.deliver({'reference': 'TS-ABC', 'status': 'COMPLETED'})
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(WebhookInbox.objects.get().status, WebhookInbox.Status.PROCESSED)
+        self.assertEqual(Ticket.objects.filter(payment=self.payment).count(), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.COMPLETED)
+
+        # Re-running the worker on the same row is a no-op
+        self.assertIsNone(payments.process_inbox_row(WebhookInbox.objects.get().id))
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_status_endpoint_follows_the_webhook(self):
+        cache.clear()
+        pending = APIClient().get('/api/pay/status/TS-ABC/').json()
+        self.assertEqual((pending['status'], pending['ticket_id']), ('PENDING', None))
+
+        self.deliver({'reference': 'TS-ABC', 'status': 'COMPLETED'})
+        # Published by the webhook worker: answered from the cache alone
+        with self.assertNumQueries(0):
+            completed = APIClient().get('/api/pay/status/TS-ABC/').json()
+        self.assertEqual(completed['status'], 'COMPLETED')
+        self.assertEqual(completed['ticket_id'], str(Ticket.objects.get(payment=self.payment).id))
+        self.assertEqual(APIClient().get('/api/pay/status/TS-NOPE/').status_code, 404)
+
+    def test_unknown_payment_fails_without_retry(self):
+        self.deliver({'reference': 'TS-MISSING', 'status': 'COMPLETED'})
+        row = WebhookInbox.objects.get(reference='TS-MISSING')
+        self.assertEqual((row.status, row.attempts), (WebhookInbox.Status.FAILED, 1))
+
+    def test_completed_after_failed_still_issues_the_ticket(self):
+        self.deliver({'reference': 'TS-ABC', 'status': 'FAILED'})
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.FAILED)
+
+        # The money arrived after all: a different delivery, not a duplicate
+        response = self.deliver({'reference': 'TS-ABC', 'status': 'COMPLETED'})
+
+        self.assertEqual(response.json(), {'status': 'Received'})
+        self.assertEqual(
+            sorted(WebhookInbox.objects.values_list('reported_status', 'status')),
+            [('COMPLETED', WebhookInbox.Status.PROCESSED), ('FAILED', WebhookInbox.Status.PROCESSED)],
+        )
+        self.assertEqual(Ticket.objects.filter(payment=self.payment).count(), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.COMPLETED)
+
+        # ...and a repeat of either is acknowledged without new work
+        self.assertEqual(self.deliver({'reference': 'TS-ABC', 'status': 'FAILED'}).json(), {'message': 'Already received'})
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_redelivery_retries_a_failed_row(self):
+        self.payment.reference_code = 'TS-LATE'
+        self.payment.save(update_fields=['reference_code'])
+        self.deliver({'reference': 'TS-OTHER', 'status': 'COMPLETED'})
+        self.assertEqual(WebhookInbox.objects.get().status, WebhookInbox.Status.FAILED)
+
+        # The payment shows up under that reference; the provider's redelivery is applied, not discarded
+        self.payment.reference_code = 'TS-OTHER'
+        self.payment.save(update_fields=['reference_code'])
+        response = self.deliver({'reference': 'TS-OTHER', 'status': 'COMPLETED'})
+
+        self.assertEqual(response.json(), {'status': 'Received'})
+        self.assertEqual(WebhookInbox.objects.get().status, WebhookInbox.Status.PROCESSED)
+        self.assertEqual(Ticket.objects.filter(payment=self.payment).count(), 1)
+
+    def test_bad_signature_is_rejected(self):
+        response = APIClient().post(
+            '/api/webhooks/payment/', {'reference': 'TS-ABC'}, format='json', HTTP_X_YADI_SIGNATURE='nope'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(WebhookInbox.objects.exists())
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def pay(self, tier, key, **extra):
+        payload = {'tier_id': str(tier.id), 'phone_number': '254700000000', **extra}
+        return self.client.post('/api/pay/initiate/', payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_double_tap_replays_the_stored_response(self):
+        tier = TicketTier.objects.create(event=self.event, name='Free', price=0, quantity_allocated=10)
+        first = self.pay(tier, 'tap-1')
+        with self.assertNumQueries(1):  # The stored response, by its unique key
+            second = self.pay(tier, 'tap-1')
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(self.pay(tier, 'tap-1', quantity=2).status_code, 422)
+
+    def test_wallet_failure_releases_the_key_for_a_retry(self):
+        tier = TicketTier.objects.create(event=self.event, name='GA', price=1000, quantity_allocated=10)
+        wallet = mock.Mock()
+        wallet.collect_payment.side_effect = [Exception('timeout'), {'mpesa_ref': 'ws_CO_1'}]
+        with mock.patch('events.views.get_wallet_client', return_value=wallet):
+            failed = self.pay(tier, 'retry-1')
+            retried = self.pay(tier, 'retry-1')
+            replayed = self.pay(tier, 'retry-1')
+
+        self.assertEqual((failed.status_code, retried.status_code, replayed.status_code), (503, 202, 202))
+        self.assertEqual(replayed.json()['transaction_ref'], retried.json()['transaction_ref'])
+        self.assertEqual(wallet.collect_payment.call_count, 2)
+
+    def test_rejection_before_admission_is_not_replayed(self):
+        cache.clear()
+        self.event.waiting_room_enabled, self.event.admission_rate = True, 1
+        self.event.save()
+        tier = TicketTier.objects.create(event=self.event, name='Free', price=0, quantity_allocated=10)
+
+        rejected = self.pay(tier, 'queue-1')
+        admission = self.client.post(f'/api/events/{self.event.id}/queue/').data['admission_token']
+        payload = {'tier_id': str(tier.id), 'phone_number': '254700000000'}
+        admitted = self.client.post(
+            '/api/pay/initiate/', payload, format='json',
+            HTTP_IDEMPOTENCY_KEY='queue-1', HTTP_X_ADMISSION_TOKEN=admission,
+        )
+
+        self.assertEqual((rejected.status_code, admitted.status_code), (403, 201))
+        self.assertNotIn('Idempotent-Replayed', admitted)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_purge_drops_expired_keys(self):
+        from .models import IdempotencyKey
+        from .services import idempotency
+
+        IdempotencyKey.objects.create(key='old', request_hash='x', response_status=201, response_body={})
+        self.assertEqual(idempotency.purge(now=timezone.now() + timedelta(hours=25)), 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TicketDeliveryTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='GA', price=0, quantity_allocated=10)
+        self.ticket = Ticket.objects.create(event=self.event, tier=self.tier, owner=self.buyer, attendee_name='Fan')
+
+    def queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            delivery.queue(self.ticket)
+        self.ticket.refresh_from_db()
+
+    def test_queued_ticket_is_rendered_and_emailed(self):
+        self.queue()
+
+        self.assertEqual(self.ticket.delivery_status, Ticket.Delivery.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['fan@yadi.app'])
+        self.assertEqual(mail.outbox[0].attachments[0][2], 'image/png')
+
+        # A duplicate task for an already sent ticket sends nothing
+        self.assertFalse(delivery.deliver(self.ticket.id))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failures_retry_then_mark_failed(self):
+        with mock.patch('events.services.delivery.generate_ticket_image', side_effect=OSError('render crashed')):
+            self.queue()
+
+        self.assertEqual(self.ticket.delivery_status, Ticket.Delivery.FAILED)
+        self.assertGreater(self.ticket.delivery_attempts, 1)
+        self.assertIn('render crashed', self.ticket.delivery_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_idle_smtp_connection_is_reopened_when_the_server_dropped_it(self):
+        dropped = mock.Mock(connection=mock.Mock(**{'noop.side_effect': OSError('Connection unexpectedly closed')}))
+        fresh = mock.Mock(connection=mock.Mock(**{'noop.return_value': (250, b'OK')}))
+        delivery.reset_connection()
+        self.addCleanup(delivery.reset_connection)
+
+        with mock.patch('events.services.delivery.get_connection', side_effect=[dropped, fresh]), \
+                mock.patch('events.services.delivery.time.monotonic', side_effect=[1000, 1010, 2000, 3000]):
+            self.assertIs(delivery.smtp_connection(), dropped)
+            # Used again within IDLE_CHECK_SECONDS: no probe
+            self.assertIs(delivery.smtp_connection(), dropped)
+            dropped.connection.noop.assert_not_called()
+            # Idle for longer: the NOOP fails, so a new connection is opened
+            self.assertIs(delivery.smtp_connection(), fresh)
+            dropped.close.assert_called_once()
+            # ...which answers the next probe and is kept
+            self.assertIs(delivery.smtp_connection(), fresh)
+            fresh.connection.noop.assert_called_once()
+
+    def test_resend_is_limited_to_owner_and_organizer(self):
+        self.queue()
+        stranger = User.objects.create_user('stranger', 'x@yadi.app', 'pass')
+        url = f'/api/tickets/{self.ticket.id}/resend/'
+
+        client = APIClient()
+        client.force_authenticate(stranger)
+        self.assertEqual(client.post(url).status_code, 403)
+
+        client.force_authenticate(self.organizer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+
+class TicketRenderTests(TestCase):
+    def setUp(self):
+        ticket_render.clear_layer_cache()
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.event = make_event(organizer)
+        tier = TicketTier.objects.create(event=self.event, name='GA', price=0, quantity_allocated=10)
+        self.tickets = [
+            Ticket.objects.create(event=self.event, tier=tier, owner=organizer, attendee_name=f'Fan {n}')
+            for n in range(2)
+        ]
+
+    def test_background_is_shared_until_the_event_changes(self):
+        first = ticket_render.background_for(self.tickets[0].event)
+        self.assertIs(ticket_render.background_for(self.tickets[1].event), first)
+
+        self.event.title = 'Renamed'
+        self.event.save()
+        self.assertIsNot(ticket_render.background_for(self.event), first)
+
+    def test_cached_and_uncached_renders_match(self):
+        cached = ticket_render.render_ticket(self.tickets[0])
+        uncached = ticket_render.render_ticket(self.tickets[0], use_cache=False)
+        self.assertEqual(cached.tobytes(), uncached.tobytes())
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TicketImageViewTests(TestCase):
+    def setUp(self):
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.event = make_event(organizer)
+        tier = TicketTier.objects.create(event=self.event, name='GA', price=0, quantity_allocated=10)
+        self.ticket = Ticket.objects.create(event=self.event, tier=tier, owner=organizer, attendee_name='Fan')
+        self.client = APIClient()
+
+    def test_image_is_stored_once_and_served_with_strong_etag(self):
+        response = self.client.get(f'/api/tickets/{self.ticket.id}/image/')
+        self.assertEqual(response.status_code, 302)
+        versioned = response['Location']
+
+        with mock.patch.object(ticket_render, 'render_ticket_bytes', wraps=ticket_render.render_ticket_bytes) as render:
+            first = self.client.get(versioned)
+            second = self.client.get(versioned)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual((first.status_code, first['Content-Type']), (200, 'image/png'))
+        self.assertTrue(versioned.endswith('.png8'))
+        self.assertEqual(first.content, second.content)
+        self.assertIn('immutable', first['Cache-Control'])
+
+        key = ticket_images.image_key(self.ticket)
+        self.assertEqual(first['ETag'], f'"{key}"')
+        self.assertEqual(self.client.get(versioned, HTTP_IF_NONE_MATCH=f'"{key}"').status_code, 304)
+
+    def test_changes_move_the_image_to_a_new_key(self):
+        old_url = self.client.get(f'/api/tickets/{self.ticket.id}/image/')['Location']
+
+        self.ticket.attendee_name = 'Renamed Fan'
+        self.ticket.save()
+
+        response = self.client.get(old_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotEqual(response['Location'], old_url)
+
+    def test_webp_and_svg_outputs(self):
+        response = self.client.get(f'/api/tickets/{self.ticket.id}/image/', {'image_format': 'webp'}, follow=True)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response.content[8:12], b'WEBP')
+
+        svg = self.client.get(f'/api/tickets/{self.ticket.id}/qr.svg')
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<path', svg.content)
+
+    def test_palette_png_keeps_qr_modules_pure(self):
+        from PIL import Image
+        from io import BytesIO
+
+        image = Image.open(BytesIO(ticket_render.render_ticket_bytes(self.ticket, 'png8')))
+        self.assertEqual(image.mode, 'P')
+        colours = {colour for _, colour in image.convert('RGB').getcolors(maxcolors=256)}
+        self.assertTrue({(0, 0, 0), (255, 255, 255)} <= colours)
+
+
+
+def image_upload(name, size, fmt='JPEG'):
+    from io import BytesIO
+    from PIL import Image
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 40, 90)).save(buffer, format=fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PosterDerivativeTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def create_event(self, poster):
+        start = timezone.now() + timedelta(days=7)
+        return self.client.post('/api/organizer/events/create/', {
+            'title': 'Blankets & Wine', 'description': '-', 'category': 'OTHER', 'location_name': 'Nairobi',
+            'start_datetime': start.isoformat(), 'end_datetime': (start + timedelta(hours=5)).isoformat(),
+            'tiers': json.dumps([{'name': 'GA', 'price': '0', 'quantity_allocated': 10}]),
+            'poster_image': poster,
+        }, format='multipart')
+
+    def test_upload_builds_webp_derivatives_used_by_lists_and_tickets(self):
+        from PIL import Image
+        from django.core.files.storage import default_storage
+
+        response = self.create_event(image_upload('poster.jpg', (2400, 3000)))
+        self.assertEqual(response.status_code, 201, response.content)
+
+        event = Event.objects.get()
+        self.assertEqual(set(event.poster_derivatives), {'thumb', 'card', 'ticket', 'hero'})
+        with default_storage.open(event.poster_derivatives['card']) as f:
+            card = Image.open(f)
+            self.assertEqual((card.format, card.width), ('WEBP', 480))
+
+        listing = self.client.get('/api/events/').json()
+        item = listing['results'][0] if 'results' in listing else listing[0]
+        self.assertTrue(item['poster_urls']['thumb'].endswith('thumb.webp'))
+
+        with mock.patch.object(default_storage, 'open', wraps=default_storage.open) as opened:
+            ticket_render.clear_layer_cache()
+            ticket_render.build_background(event)
+        self.assertEqual(opened.call_args[0][0], event.poster_derivatives['ticket'])
+
+    @override_settings(IMAGE_MAX_DIMENSION=1000)
+    def test_oversized_upload_is_rejected_before_decoding(self):
+        response = self.create_event(image_upload('huge.png', (1200, 10), fmt='PNG'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('poster_image', response.json())
+        self.assertFalse(Event.objects.exists())
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkRenderTests(TestCase):
+    def setUp(self):
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyers = [User.objects.create_user(f'fan{n}', f'fan{n}@yadi.app', 'pass') for n in range(2)]
+        event = make_event(organizer)
+        tier = TicketTier.objects.create(event=event, name='GA', price=0, quantity_allocated=10)
+        self.tickets = [
+            Ticket.objects.create(event=event, tier=tier, owner=self.buyers[n % 2], attendee_name=f'Fan ({n + 1}/4)')
+            for n in range(4)
+        ]
+
+    def test_renders_every_ticket_and_bundles_per_buyer(self):
+        import re
+        from django.core.files.storage import default_storage
+
+        progress = mock.Mock()
+        keys = bulk_render.render_tickets([t.id for t in self.tickets], workers=1, progress=progress)
+
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(progress.call_args[0][:2], (4, 4))
+        for ticket in self.tickets:
+            self.assertTrue(default_storage.exists(ticket_images.storage_path(keys[str(ticket.id)])))
+
+        paths = bulk_render.bundle([t.id for t in self.tickets], kind='pdf')
+        self.assertEqual(set(paths), {buyer.id for buyer in self.buyers})
+        with default_storage.open(paths[self.buyers[0].id]) as f:
+            pdf = f.read()
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type\s*/Page\b', pdf)), 2)
+
+    def test_organizer_queues_a_bundle_of_their_event(self):
+        import re
+        from django.core.files.storage import default_storage
+
+        cache.clear()
+        event = self.tickets[0].event
+        url = f'/api/organizer/events/{event.id}/tickets/bundle/'
+        client = APIClient()
+
+        client.force_authenticate(self.buyers[0])
+        self.assertEqual(client.post(url, {'kind': 'pdf'}, format='json').status_code, 404)
+
+        client.force_authenticate(event.organizer)
+        self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(client.post(url, {'kind': 'docx'}, format='json').status_code, 400)
+        # The tasks run eagerly here, so the bundle is ready by the time the POST answers
+        response = client.post(url, {'kind': 'pdf'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.json()['status'], response.json()['tickets']), ('READY', 4))
+
+        status = client.get(url).json()
+        self.assertEqual(status['url'], response.json()['url'])
+        path = bulk_render.event_bundle_state(event.id, 'pdf')['path']
+        self.assertTrue(path.startswith(f'ticket_bundles/events/{event.id}/'))
+        with default_storage.open(path) as f:
+            pdf = f.read()
+        self.assertEqual(len(re.findall(rb'/Type\s*/Page\b', pdf)), 4)
+        # The hand-written PDF parses, with every page in the page tree
+        from PIL import PdfParser
+        self.assertEqual(len(PdfParser.PdfParser(buf=pdf).pages), 4)
+
+    def test_failed_bundle_is_reported(self):
+        cache.clear()
+        event = self.tickets[0].event
+        url = f'/api/organizer/events/{event.id}/tickets/bundle/'
+        client = APIClient()
+        client.force_authenticate(event.organizer)
+
+        with mock.patch('events.services.bulk_render._write_bundle', side_effect=OSError('disk full')):
+            response = client.post(url, {'kind': 'zip'}, format='json')
+
+        self.assertEqual(response.json()['status'], 'FAILED')
+        self.assertEqual(client.get(url, {'kind': 'zip'}).json()['status'], 'FAILED')
+
+
+
+class WalletClientTests(TestCase):
+    def setUp(self):
+        from http.server import ThreadingHTTPServer
+        from events.management.commands.stub_wallet import StubWalletHandler
+
+        self.handler = type('Handler', (StubWalletHandler,), {'error_rate': 0.0})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        os.environ['WALLET_SERVICE_KEY'] = 'test-key'
+        os.environ['WALLET_SERVICE_URL'] = f'http://127.0.0.1:{self.server.server_port}/api/service/'
+        os.environ['WALLET_BREAKER_FAILURES'] = '2'
+        self.addCleanup(os.environ.pop, 'WALLET_SERVICE_URL')
+        self.addCleanup(os.environ.pop, 'WALLET_BREAKER_FAILURES')
+        self.addCleanup(os.environ.pop, 'WALLET_SERVICE_KEY')
+
+        from .services.wallet_client import WalletClient
+        self.client = WalletClient()
+
+    def test_calls_reuse_one_pooled_client(self):
+        from .services.wallet_client import get_wallet_client
+
+        self.assertIs(get_wallet_client(), get_wallet_client())
+        self.assertEqual(self.client.get_balance('abc')['balance'], 125000.00)
+        self.assertIn('mpesa_ref', self.client.collect_payment('org', '254700000000', 100, 'TS-1'))
+        metrics = self.client.metrics()
+        self.assertEqual(metrics['breaker'], 'closed')
+        self.assertEqual(metrics['endpoints']['balance']['requests'], 1)
+
+    def test_gets_retry_posts_do_not_and_breaker_fails_fast(self):
+        from .services import wallet_client
+
+        self.handler.error_rate = 1.0
+        with mock.patch.object(wallet_client, 'RETRY_BACKOFF', 0):
+            with self.assertRaises(wallet_client.WalletServiceError):
+                self.client.get_balance('abc')
+        self.assertEqual(self.client.metrics()['endpoints']['balance']['retries'], wallet_client.GET_RETRIES)
+
+        with self.assertRaises(wallet_client.WalletServiceError):
+            self.client.initiate_withdrawal('abc', 100)
+        self.assertEqual(self.client.metrics()['endpoints']['withdraw']['retries'], 0)
+
+        # Two failures opened the breaker: the next call never reaches the service
+        self.assertEqual(self.client.breaker.state, 'open')
+        with self.assertRaises(wallet_client.WalletCircuitOpen):
+            self.client.initiate_withdrawal('abc', 100)
+        self.assertEqual(self.client.metrics()['endpoints']['withdraw']['short_circuited'], 1)
+
+
+
+class WalletCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.wallet = mock.Mock()
+        self.wallet.get_balance.return_value = {'balance': 5000.0, 'currency': 'KES'}
+        patcher = mock.patch('events.services.wallet_cache.get_wallet_client', return_value=self.wallet)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def test_polls_hit_the_cache_until_invalidated(self):
+        first = self.client.get('/api/organizer/wallet/').json()
+        second = self.client.get('/api/organizer/wallet/').json()
+        self.assertEqual((first['balance'], second['balance']), (5000.0, 5000.0))
+        self.assertFalse(second['is_stale'])
+        self.assertEqual(self.wallet.get_balance.call_count, 1)
+
+        wallet_cache.invalidate(self.organizer.id)
+        self.client.get('/api/organizer/wallet/')
+        self.assertEqual(self.wallet.get_balance.call_count, 2)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        wallet_cache.get(self.organizer.id)
+        self.wallet.get_balance.return_value = {'balance': 7000.0, 'currency': 'KES'}
+
+        later = time.time() + 60
+        with mock.patch('events.services.wallet_cache.time.time', return_value=later):
+            data, age, is_stale = wallet_cache.get(self.organizer.id)
+        self.assertEqual((data['balance'], is_stale), (5000.0, True))
+        self.assertGreaterEqual(age, 59)
+
+        # The refresh task (eager here) already stored the new balance
+        self.assertEqual(wallet_cache.get(self.organizer.id)[0]['balance'], 7000.0)
+
+    def test_outage_without_cache_is_a_503_not_a_zero_balance(self):
+        from .services.wallet_client import WalletServiceError
+
+        self.wallet.get_balance.side_effect = WalletServiceError()
+        response = self.client.get('/api/organizer/wallet/')
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn('balance', response.json())
+
+
+class AsyncWalletViewTests(TestCase):
+    def setUp(self):
+        from http.server import ThreadingHTTPServer
+        from events.management.commands.stub_wallet import StubWalletHandler
+
+        cache.clear()
+        self.handler = type('Handler', (StubWalletHandler,), {'error_rate': 0.0})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        patcher = mock.patch.dict(os.environ, {
+            'WALLET_SERVICE_KEY': 'test-key',
+            'WALLET_SERVICE_URL': f'http://127.0.0.1:{self.server.server_port}/api/service/',
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # A fresh process-wide client pointed at this stub
+        client_patcher = mock.patch('events.services.wallet_client._client', None)
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+
+        self.organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        self.buyer = User.objects.create_user('fan', 'fan@yadi.app', 'pass')
+        self.event = make_event(self.organizer)
+        self.tier = TicketTier.objects.create(event=self.event, name='Regular', price=1500, quantity_allocated=1)
+        self.factory = APIRequestFactory()
+
+    def call(self, view, method, path, user, data=None):
+        request = getattr(self.factory, method)(path, data, format='json')
+        if user:
+            force_authenticate(request, user)
+        response = async_to_sync(view)(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_async_client_shares_breaker_and_metrics(self):
+        from .services.wallet_client import get_async_wallet_client, get_wallet_client
+
+        async def balance():
+            client = get_async_wallet_client()
+            return client, await client.get_balance('abc')
+
+        client, data = async_to_sync(balance)()
+        self.assertEqual(data['balance'], 125000.00)
+        self.assertIs(client.breaker, get_wallet_client().breaker)
+        self.assertEqual(get_wallet_client().metrics()['endpoints']['balance']['requests'], 1)
+
+    def test_wallet_proxy_caches_and_withdrawal_invalidates(self):
+        from . import views_async
+
+        status_code, first = self.call(views_async.organizer_wallet, 'get', '/api/organizer/wallet/', self.organizer)
+        self.assertEqual((status_code, first['balance'], first['is_stale']), (200, 125000.00, False))
+        self.assertIsNotNone(cache.get(wallet_cache._key(self.organizer.id, 'balance', None)))
+
+        status_code, result = self.call(views_async.organizer_wallet, 'post', '/api/organizer/wallet/', self.organizer, {'amount': 100})
+        self.assertEqual((status_code, result['status']), (200, 'QUEUED'))
+        self.assertIsNone(cache.get(wallet_cache._key(self.organizer.id, 'balance', None)))
+
+        self.assertEqual(self.call(views_async.wallet_link, 'get', '/api/organizer/wallet/link/', self.buyer)[0], 403)
+        self.assertEqual(self.call(views_async.wallet_link, 'get', '/api/organizer/wallet/link/', None)[0], 401)
+        self.assertIn('magic_link', self.call(views_async.wallet_link, 'get', '/api/organizer/wallet/link/', self.organizer)[1])
+
+    def test_async_payment_initiation_holds_seat_and_releases_on_failure(self):
+        from . import views_async
+
+        payload = {'tier_id': str(self.tier.id), 'phone_number': '254700000000'}
+        status_code, body = self.call(views_async.initiate_payment, 'post', '/api/pay/initiate/', self.buyer, payload)
+        self.assertEqual(status_code, 202)
+        self.assertTrue(body['mpesa_ref'].startswith('ws_CO_'))
+        payment = Payment.objects.get(reference_code=body['transaction_ref'])
+        self.assertEqual((payment.status, payment.hold_status), (Payment.Status.PENDING, Payment.Hold.HELD))
+
+        # The only seat is held; once the wallet fails, the hold is released again
+        payment.status = Payment.Status.FAILED
+        payment.save(update_fields=['status'])
+        inventory.release_hold(payment)
+        self.handler.error_rate = 1.0
+        status_code, body = self.call(views_async.initiate_payment, 'post', '/api/pay/initiate/', self.buyer, payload)
+        self.assertEqual(status_code, 503)
+        self.assertEqual(Payment.objects.filter(status=Payment.Status.FAILED).count(), 2)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.available_qty(), 1)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class PaymentStatusWaitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        tier = TicketTier.objects.create(event=make_event(organizer), name='GA', price=1000, quantity_allocated=10)
+        self.payment = Payment.objects.create(
+            event=tier.event, tier=tier, amount=1000, phone_number='254700000000',
+            reference_code='TS-WAIT', **inventory.reserve(tier, 1),
+        )
+
+    def complete_later(self, delay):
+        def complete():
+            time.sleep(delay)
+            self.payment.status = Payment.Status.COMPLETED
+            cache.set(payment_status._key('TS-WAIT'), payment_status.snapshot(self.payment))
+
+        thread = threading.Thread(target=complete)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_long_poll_returns_as_soon_as_the_status_changes(self):
+        self.complete_later(0.3)
+        started = time.monotonic()
+        response = APIClient().get('/api/pay/status/TS-WAIT/', {'wait': 10, 'since': 'PENDING'})
+        self.assertEqual(response.json()['status'], 'COMPLETED')
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_event_stream_ends_once_the_payment_is_final(self):
+        self.complete_later(0.3)
+
+        async def read_stream():
+            response = await AsyncClient().get('/api/pay/status/TS-WAIT/', headers={'Accept': 'text/event-stream'})
+            return response['Content-Type'], b''.join([chunk async for chunk in response.streaming_content])
+
+        content_type, body = async_to_sync(read_stream)()
+        self.assertEqual(content_type, 'text/event-stream')
+        events = [
+            json.loads(line[len('data: '):])['status']
+            for line in body.decode().splitlines() if line.startswith('data: ')
+        ]
+        self.assertEqual(events, ['PENDING', 'COMPLETED'])
+
+
+# SQLite serializes writers and rejects concurrent ones outright, so the race only exists on Postgres.
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentCheckInTests(TransactionTestCase):
+    GROUP_SIZE = 3
+    SCANS = 8
+
+    def test_parallel_scans_claim_each_ticket_once(self):
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        scanner = User.objects.create_user('gate1', 'gate1@yadi.app', 'pass', role=User.Role.SCANNER)
+        event = make_event(organizer)
+        tier = TicketTier.objects.create(event=event, name='Regular', price=0, quantity_allocated=100)
+        make_group(event, tier, organizer, self.GROUP_SIZE, 'G-rush')
+
+        outcomes = []
+        barrier = threading.Barrier(self.SCANS)
+
+        def scan():
+            try:
+                barrier.wait()
+                outcomes.append(checkin.check_in('G-rush', scanner).outcome)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=scan) for _ in range(self.SCANS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.SCANS)
+        self.assertEqual(outcomes.count(checkin.VALID), self.GROUP_SIZE)
+        self.assertEqual(outcomes.count(checkin.ALL_USED), self.SCANS - self.GROUP_SIZE)
+        self.assertEqual(
+            Ticket.objects.filter(qr_code_hash='G-rush', status=Ticket.Status.CHECKED_IN).count(),
+            self.GROUP_SIZE,
+        )
@@ -1,22 +1,45 @@
+from django.conf import settings
 from django.urls import include, path
-from .views import ( ActivateGuestAccountView, EventListView, EventDetailView, ExportAttendeesCSVView, GetWalletLinkView, InitiatePaymentView, OrganizerEventUpdateView, OrganizerWalletProxyView, UserTicketsView, TicketDetailView, OrganizerEventCreateView, OrganizerDashboardView, OrganizerEventListView, OrganizerEventAttendeesView, VerifyTicketView,
-                     ScannerListView, ScannerCreateView, ActivateWalletView
+
+from . import views_async
+from .views import ( ActivateGuestAccountView, EventListView, EventDetailView, ExportAttendeesCSVView, GetWalletLinkView, InitiatePaymentView, OrganizerEventUpdateView, OrganizerWalletProxyView, UserTicketsView, TicketDetailView, TicketImageView, TicketQRCodeView, TicketResendView, OrganizerEventCreateView, OrganizerDashboardView, OrganizerEventListView, OrganizerEventAttendeesView, OrganizerTicketBundleView, VerifyTicketView, EventManifestView, OfflineScanUploadView,
+                     ScannerListView, ScannerCreateView, ActivateWalletView, WaitingRoomJoinView, WaitingRoomStatusView
                     
                     )
 
+# Under uvicorn workers (ASYNC_VIEWS=True) the endpoints that wait on the Wallet
+# service are served by their async versions
+if settings.ASYNC_VIEWS:
+    initiate_payment = views_async.initiate_payment
+    organizer_wallet = views_async.organizer_wallet
+    wallet_link = views_async.wallet_link
+else:
+    initiate_payment = InitiatePaymentView.as_view()
+    organizer_wallet = OrganizerWalletProxyView.as_view()
+    wallet_link = GetWalletLinkView.as_view()
+
 
 urlpatterns = [
  
     path('events/', EventListView.as_view(), name='event-list'),
     path('events/<uuid:id>/', EventDetailView.as_view(), name='event-detail'),
 
+    # Waiting Room (high-demand on-sales)
+    path('events/<uuid:id>/queue/', WaitingRoomJoinView.as_view(), name='waiting-room-join'),
+    path('events/<uuid:id>/queue/status/', WaitingRoomStatusView.as_view(), name='waiting-room-status'),
+
     # Payment Route
-    path('pay/initiate/', InitiatePaymentView.as_view(), name='pay-initiate'),
+    path('pay/initiate/', initiate_payment, name='pay-initiate'),
+    path('pay/status/<str:reference>/', views_async.get_payment_status, name='pay-status'),
 
     # --- REMOVED: path('auth/check-code/', ...) ---
 
     path('tickets/', UserTicketsView.as_view(), name='user-tickets'),
     path('tickets/<uuid:id>/', TicketDetailView.as_view(), name='ticket-detail'),
+    path('tickets/<uuid:id>/image/', TicketImageView.as_view(), name='ticket-image'),
+    path('tickets/<uuid:id>/image/<str:key>.<str:fmt>', TicketImageView.as_view(), name='ticket-image-versioned'),
+    path('tickets/<uuid:id>/qr.svg', TicketQRCodeView.as_view(), name='ticket-qr-svg'),
+    path('tickets/<uuid:id>/resend/', TicketResendView.as_view(), name='ticket-resend'),
 
       # Organizer Routes
     path('organizer/dashboard/', OrganizerDashboardView.as_view(), name='organizer-dashboard'), # <--- The missing link
@@ -24,11 +47,14 @@ urlpatterns = [
     path('organizer/events/', OrganizerEventListView.as_view(), name='organizer-event-list'),
     # Change <uuid:pk> to <uuid:id>
     path('organizer/events/<uuid:id>/attendees/', OrganizerEventAttendeesView.as_view(), name='organizer-event-attendees'),
+    path('organizer/events/<uuid:id>/tickets/bundle/', OrganizerTicketBundleView.as_view(), name='organizer-ticket-bundle'),
     # NEW: Edit/Delete Route
     path('organizer/events/<uuid:id>/edit/', OrganizerEventUpdateView.as_view(), name='organizer-event-edit'),
 
 
     path('scanner/verify/', VerifyTicketView.as_view(), name='scanner-verify'),
+    path('scanner/events/<uuid:id>/manifest/', EventManifestView.as_view(), name='scanner-manifest'),
+    path('scanner/events/<uuid:id>/scans/', OfflineScanUploadView.as_view(), name='scanner-offline-scans'),
 
     path('organizer/team/scanners/', ScannerListView.as_view(), name='scanner-list'),
     path('organizer/team/scanners/create/', ScannerCreateView.as_view(), name='scanner-create'),
@@ -40,10 +66,10 @@ urlpatterns = [
     # Activate wallet
     path('organizer/wallet/activate/', ActivateWalletView.as_view(), name='activate-wallet'),
 
-    path('organizer/wallet/', OrganizerWalletProxyView.as_view(), name='organizer-wallet-proxy'),
+    path('organizer/wallet/', organizer_wallet, name='organizer-wallet-proxy'),
 
 
-    path('organizer/wallet/link/', GetWalletLinkView.as_view(), name='wallet-link'),
+    path('organizer/wallet/link/', wallet_link, name='wallet-link'),
 
     path('auth/guest/activate/', ActivateGuestAccountView.as_view(), name='guest-activate'),
 
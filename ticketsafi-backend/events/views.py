@@ -1,6 +1,10 @@
+import datetime
+import hashlib
 import json
 import uuid
+from django.db import transaction
 from django.db.models import Sum, Avg, Count, F
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.utils import timezone
 from rest_framework import generics, views, status, permissions
@@ -10,12 +14,14 @@ from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from dj_rest_auth.registration.views import SocialLoginView
 
 from .models import User, Event, Ticket, TicketTier, Payment, OrganizerInvitationCode
-from .serializers import EventListSerializer, EventDetailSerializer, EventCreateUpdateSerializer, TicketSerializer, UserSerializer
-from .utils import send_ticket_email
+from .pagination import AttendeePagination, EventPagination, OrganizerEventPagination, TicketPagination
+from .serializers import EventListSerializer, EventDetailSerializer, EventCreateUpdateSerializer, TicketSerializer, UserSerializer, OfflineScanSerializer
 from events import models 
 from rest_framework.views import APIView
-from .services.wallet_client import WalletClient
+from .services.wallet_client import WalletServiceError, get_wallet_client
+from .services import bulk_render, catalog_cache, checkin, delivery, idempotency, inventory, manifest, payment_status, qr_tokens, search, ticket_images, ticket_render, waiting_room, wallet_cache
 from django.conf import settings
+from django.core.files.storage import default_storage
 
 # --- AUTH RELATED VIEWS ---
 
@@ -73,9 +79,10 @@ class EventListView(generics.ListAPIView):
     Returns all published events, supporting filtering by search, category, date, and price range.
     """
     serializer_class = EventListSerializer
+    pagination_class = EventPagination
 
     def get_queryset(self):
-        queryset = Event.objects.filter(is_published=True, end_datetime__gt=timezone.now()).order_by('start_datetime')
+        queryset = Event.objects.filter(is_published=True, end_datetime__gt=timezone.now()).order_by('start_datetime', 'id')
         
         # Filtering logic
         q = self.request.query_params.get('q')
@@ -85,7 +92,8 @@ class EventListView(generics.ListAPIView):
         max_price = self.request.query_params.get('max_price')
 
         if q:
-            queryset = queryset.filter(title__icontains=q) | queryset.filter(description__icontains=q)
+            # Full-text + prefix + trigram on Postgres, ranked (services/search.py)
+            queryset = search.search(queryset, q)
         
         if category and category != 'All Events':
             queryset = queryset.filter(category=category.upper())
@@ -93,38 +101,154 @@ class EventListView(generics.ListAPIView):
         if date_str:
             try:
                 date_obj = timezone.datetime.strptime(date_str, '%Y-%m-%d').date()
-                queryset = queryset.filter(start_datetime__date=date_obj)
+                # Half-open range over that day in TIME_ZONE (Africa/Nairobi): start_datetime__date
+                # would cast the column to local time on every row and skip event_published_start_idx
+                tz = timezone.get_default_timezone()
+                day_start = datetime.datetime.combine(date_obj, datetime.time.min, tzinfo=tz)
+                day_end = datetime.datetime.combine(date_obj + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+                queryset = queryset.filter(start_datetime__gte=day_start, start_datetime__lt=day_end)
             except ValueError:
                 pass 
                 
+        queryset = queryset.for_catalog()
+
         if min_price:
-            # Filter events that have ANY ticket tier >= min_price
-            queryset = queryset.filter(tiers__price__gte=min_price).distinct()
+            # Events that have ANY ticket tier >= min_price, i.e. whose dearest tier is
+            queryset = queryset.filter(max_price__gte=min_price)
         
         if max_price:
-            # Filter events that have ANY ticket tier <= max_price
-            queryset = queryset.filter(tiers__price__lte=max_price).distinct()
+            # Events that have ANY ticket tier <= max_price: their cheapest one is
+            queryset = queryset.filter(min_price__lte=max_price)
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Homepage traffic is served from the catalog cache; signals.py invalidates it on any change
+        return catalog_cache.respond(
+            request, 'event-list', [catalog_cache.EVENTS],
+            lambda: super(EventListView, self).list(request, *args, **kwargs),
+        )
+
 
 class EventDetailView(generics.RetrieveAPIView):
     """
     Returns details for a single event (used for the public event page).
     """
-    queryset = Event.objects.filter(is_published=True)
+    queryset = Event.objects.filter(is_published=True).for_catalog().prefetch_related('tiers__stripes')
     serializer_class = EventDetailSerializer
     lookup_field = 'id'
 
+    def retrieve(self, request, *args, **kwargs):
+        # Short-lived, since the tiers' availability changes without a save
+        return catalog_cache.respond(
+            request, 'event-detail', [catalog_cache.event(kwargs['id'])],
+            lambda: super(EventDetailView, self).retrieve(request, *args, **kwargs),
+            timeout=settings.EVENT_PAGE_CACHE_SECONDS,
+        )
+
 
 # --- PURCHASE & PAYMENT VIEWS ---
 
-from .services.wallet_client import WalletClient 
+class WaitingRoomJoinView(views.APIView):
+    """
+    Takes a place in an event's on-sale queue.
+    POST /api/events/{id}/queue/
+    Served from the cache only, so it stays cheap while thousands of buyers arrive.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request, id):
+        enabled, _ = waiting_room.get_config(id)
+        if not enabled:
+            return Response({"admitted": True, "admission_token": None}, status=status.HTTP_200_OK)
+
+        _, queue_token = waiting_room.join(id)
+        data = waiting_room.status(id, queue_token)
+        data['queue_token'] = queue_token
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class WaitingRoomStatusView(views.APIView):
+    """
+    Polls a queue position. Once admitted, returns the admission_token that
+    /api/pay/initiate/ requires (X-Admission-Token header).
+    GET /api/events/{id}/queue/status/?token=<queue_token>
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, id):
+        data = waiting_room.status(id, request.query_params.get('token', ''))
+        if data is None:
+            return Response({"error": "Invalid queue token."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)
+
+
 
 class InitiatePaymentView(views.APIView):
+    """
+    The database work (validation, seat hold, Payment row; the whole free-ticket
+    flow) lives in place_order() and the wallet call's outcome in the two
+    methods after it, so the async version (views_async.initiate_payment) can run
+    the same steps while awaiting the wallet instead of blocking a thread on it.
+    """
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
+        key, replayed = self.claim_key(request)
+        if replayed is not None:
+            return replayed
+
+        try:
+            response = self.initiate(request)
+        except Exception:
+            if key:
+                idempotency.release(key)
+            raise
+        if key:
+            idempotency.store(key, response.status_code, response.data)
+        return response
+
+    def claim_key(self, request):
+        """
+        Idempotency-Key handling (services/idempotency.py). Returns (key, None)
+        when this request may run, (None, response) when it must not: a stored
+        response to replay or a conflict. No header: (None, None).
+        """
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return None, None
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return None, Response({"error": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            stored = idempotency.claim(key, idempotency.fingerprint(request))
+        except idempotency.Conflict as e:
+            return None, Response({"error": str(e)}, status=e.status)
+        if stored is None:
+            return key, None
+        stored_status, body = stored
+        return None, Response(body, status=stored_status, headers={'Idempotent-Replayed': 'true'})
+
+    def initiate(self, request):
+        payment = self.place_order(request)
+        if isinstance(payment, Response):
+            return payment
+
+        # 4. Call Wallet Service
+        try:
+            client = get_wallet_client()
+            wallet_response = client.collect_payment(**self.collect_kwargs(payment))
+        except Exception as e:
+            return self.collection_failed(payment, e)
+        return self.collection_started(payment, wallet_response)
+
+    def place_order(self, request):
+        """
+        Returns either the final Response, or the PENDING Payment (seat held)
+        whose M-Pesa prompt still has to be requested from the wallet.
+        """
         data = request.data
         
         tier_id = data.get('tier_id')
@@ -136,11 +260,22 @@ class InitiatePaymentView(views.APIView):
             quantity = int(data.get('quantity', 1))
         except ValueError:
              return Response({"error": "Invalid quantity."}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity < 1:
+             return Response({"error": "Invalid quantity."}, status=status.HTTP_400_BAD_REQUEST)
         
         if not tier_id:
             return Response({"error": "Missing tier_id."}, status=status.HTTP_400_BAD_REQUEST)
 
-        tier = get_object_or_404(TicketTier, id=tier_id)
+        tier = get_object_or_404(TicketTier.objects.select_related('event'), id=tier_id)
+
+        # High-demand on-sales only accept buyers the waiting room has admitted
+        if tier.event.waiting_room_enabled:
+            admission_token = request.headers.get('X-Admission-Token') or data.get('admission_token')
+            if not waiting_room.use_admission(tier.event_id, admission_token):
+                return Response(
+                    {"error": "Please join the queue for this event.", "waiting_room": True},
+                    status=status.HTTP_403_FORBIDDEN
+                )
 
         if request.user.is_authenticated and request.user == tier.event.organizer:
             return Response(
@@ -180,44 +315,56 @@ class InitiatePaymentView(views.APIView):
         
         # --- NEW: FREE TICKET FLOW (Price == 0) ---
         if tier.price == 0:
-            # Generate a single identifier for the entire group
-            group_qr_hash = f"G-{uuid.uuid4().hex}"
+            # Generate a single signed QR token for the entire group
+            group_qr_hash = qr_tokens.issue_token(tier.event_id, tier.id, uuid.uuid4(), group_size=quantity)
             payment_ref = f"FREE-{uuid.uuid4().hex[:12].upper()}"
-            
-            # Create COMPLETED Payment record (for logging)
-            payment = Payment.objects.create(
-                user=owner,
-                event=tier.event,
-                tier=tier,
-                amount=0,
-                phone_number=owner.phone_number or '254700000000', 
-                reference_code=payment_ref,
-                status=Payment.Status.COMPLETED 
-            )
-            
-            # Create all N tickets in a loop
-            tickets_created = []
-            for i in range(quantity):
-                # The first ticket will be the one used for the QR image/email.
-                # All tickets in the group point to the same group_qr_hash.
-
-                final_name = guest_name
-                if quantity > 1:
-                    final_name = f"{guest_name} ({i+1}/{quantity})"
 
+            with transaction.atomic():
+                # Take the seats first; the conditional update fails instead of overselling
+                if not inventory.sell(tier, quantity):
+                    return Response({"error": "Not enough tickets available."}, status=status.HTTP_400_BAD_REQUEST)
 
-                ticket = Ticket.objects.create(
+                # Create COMPLETED Payment record (for logging)
+                payment = Payment.objects.create(
+                    user=owner,
                     event=tier.event,
                     tier=tier,
-                    owner=owner,
-                    attendee_name=final_name,
-                    attendee_email=guest_email or owner.email,
-                    qr_code_hash=group_qr_hash # Set the shared hash
+                    amount=0,
+                    phone_number=owner.phone_number or '254700000000', 
+                    reference_code=payment_ref,
+                    status=Payment.Status.COMPLETED,
+                    quantity=quantity,
+                    hold_status=Payment.Hold.COMMITTED
                 )
-                tickets_created.append(ticket)
-            
-            # Send Email (only need one ticket for the QR image)
-            send_ticket_email(tickets_created[0])
+                
+                # Create all N tickets in a loop
+                tickets_created = []
+                for i in range(quantity):
+                    # The first ticket will be the one used for the QR image/email.
+                    # All tickets in the group point to the same group_qr_hash.
+
+                    final_name = guest_name
+                    if quantity > 1:
+                        final_name = f"{guest_name} ({i+1}/{quantity})"
+
+
+                    ticket = Ticket.objects.create(
+                        event=tier.event,
+                        tier=tier,
+                        owner=owner,
+                        payment=payment,
+                        attendee_name=final_name,
+                        attendee_email=guest_email or owner.email,
+                        qr_code_hash=group_qr_hash # Set the shared hash
+                    )
+                    tickets_created.append(ticket)
+
+                # Queue the email (only need one ticket for the QR image)
+                delivery.queue(tickets_created[0])
+                payment_status.publish(payment, tickets_created[0])
+                if quantity > 1:
+                    # Pre-render the rest of the group so each ticket page loads instantly
+                    transaction.on_commit(lambda: bulk_render.queue_render([t.id for t in tickets_created[1:]]))
             
             # Return success (return ID of the first ticket for the frontend redirect)
             return Response({
@@ -235,40 +382,51 @@ class InitiatePaymentView(views.APIView):
             # --- PAID TICKET FLOW (Single Ticket Logic) ---
             ticket_ref = f"TS-{uuid.uuid4().hex[:12].upper()}"
 
-            # 3. CREATE PAYMENT RECORD FIRST (Pending)
-            payment = Payment.objects.create(
-                user=owner,
-                event=tier.event,
-                tier=tier,
-                amount=tier.price,
-                phone_number=phone_number,
-                reference_code=ticket_ref,
-                status=Payment.Status.PENDING
-            )
+            # 3. RESERVE THE SEAT AND CREATE PAYMENT RECORD FIRST (Pending)
+            # The hold expires if the M-Pesa prompt is never completed
+            with transaction.atomic():
+                hold = inventory.reserve(tier, quantity)
+                if hold is None:
+                    return Response({"error": "Not enough tickets available."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # 4. Call Wallet Service
-            try:
-                client = WalletClient()
-                organizer_id = tier.event.organizer.id
-                
-                wallet_response = client.collect_payment(
-                    organizer_id=organizer_id,
-                    phone=phone_number,
+                payment = Payment.objects.create(
+                    user=owner,
+                    event=tier.event,
+                    tier=tier,
                     amount=tier.price,
-                    ticket_ref=ticket_ref
+                    phone_number=phone_number,
+                    reference_code=ticket_ref,
+                    status=Payment.Status.PENDING,
+                    **hold
                 )
+                # Seeds the key the status endpoint waits on
+                payment_status.publish(payment)
+
+            return payment
 
-                return Response({
-                    "status": "Payment Initiated",
-                    "transaction_ref": ticket_ref,
-                    "mpesa_ref": wallet_response.get('mpesa_ref')
-                }, status=status.HTTP_202_ACCEPTED)
+    @staticmethod
+    def collect_kwargs(payment):
+        return {
+            'organizer_id': payment.event.organizer_id,
+            'phone': payment.phone_number,
+            'amount': payment.amount,
+            'ticket_ref': payment.reference_code,
+        }
 
-            except Exception as e:
-                payment.status = Payment.Status.FAILED
-                payment.save()
-                print(f"Wallet Payment Error: {e}")
-                return Response({"error": "Payment service unavailable."}, status=503)
+    def collection_started(self, payment, wallet_response):
+        return Response({
+            "status": "Payment Initiated",
+            "transaction_ref": payment.reference_code,
+            "mpesa_ref": wallet_response.get('mpesa_ref')
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def collection_failed(self, payment, error):
+        payment.status = Payment.Status.FAILED
+        payment.save(update_fields=['status'])
+        inventory.release_hold(payment)
+        payment_status.publish(payment)
+        print(f"Wallet Payment Error: {error}")
+        return Response({"error": "Payment service unavailable."}, status=503)
 
 
 class UserTicketsView(generics.ListAPIView):
@@ -277,21 +435,93 @@ class UserTicketsView(generics.ListAPIView):
     """
     serializer_class = TicketSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TicketPagination
 
     def get_queryset(self):
         # Only return tickets owned by the current user
-        return Ticket.objects.filter(owner=self.request.user).order_by('-purchase_date')
+        return Ticket.objects.filter(owner=self.request.user).select_related('event__organizer', 'tier').order_by('-purchase_date', '-id')
 
 
 class TicketDetailView(generics.RetrieveAPIView):
     """
     Returns single ticket detail (for the QR page).
     """
-    queryset = Ticket.objects.all()
+    queryset = Ticket.objects.select_related('event__organizer', 'tier')
     serializer_class = TicketSerializer
     lookup_field = 'id'
 
 
+class TicketImageView(views.APIView):
+    """
+    Serves the rendered ticket image.
+    /tickets/{id}/image/ redirects to /tickets/{id}/image/{key}.{format}, where the key
+    is a hash of everything drawn on the ticket. The versioned URL never changes
+    content, so browsers and the CDN may cache it forever.
+    Query Params: image_format = png | png8 | webp (defaults to TICKET_IMAGE_FORMAT).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, id, key=None, fmt=None):
+        fmt = fmt or request.query_params.get('image_format') or settings.TICKET_IMAGE_FORMAT
+        if fmt not in ticket_render.ENCODERS:
+            return Response({"error": "Unknown image format."}, status=status.HTTP_400_BAD_REQUEST)
+
+        ticket = get_object_or_404(Ticket.objects.select_related('event', 'tier'), id=id)
+        current = ticket_images.image_key(ticket, fmt)
+
+        if key != current:
+            response = redirect('ticket-image-versioned', id=ticket.id, key=current, fmt=fmt)
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        etag = f'"{current}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=304)
+        else:
+            _, data = ticket_images.get_or_render(ticket, fmt)
+            response = HttpResponse(data, content_type=ticket_images.content_type(fmt))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class TicketQRCodeView(views.APIView):
+    """
+    Vector QR code for the web ticket page. A few KB of SVG instead of a raster,
+    and it stays sharp at any screen brightness/zoom the gate scanner needs.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, id):
+        qr_hash = get_object_or_404(Ticket.objects.values_list('qr_code_hash', flat=True), id=id)
+        etag = f'"{hashlib.sha256(qr_hash.encode()).hexdigest()[:32]}"'
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(ticket_render.qr_svg(qr_hash), content_type='image/svg+xml')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+
+class TicketResendView(views.APIView):
+    """
+    Re-queues the ticket email. Allowed for the ticket owner and the event organizer.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, id):
+        ticket = get_object_or_404(Ticket.objects.select_related('event'), id=id)
+        if request.user != ticket.owner and request.user != ticket.event.organizer:
+            return Response({"error": "You cannot resend this ticket."}, status=status.HTTP_403_FORBIDDEN)
+
+        with transaction.atomic():
+            delivery.queue(ticket)
+
+        return Response({"status": "Queued", "delivery_status": ticket.delivery_status}, status=status.HTTP_202_ACCEPTED)
+
+
 # --- ORGANIZER VIEWS (PROTECTED) ---
 
 class OrganizerDashboardView(views.APIView):
@@ -380,9 +610,10 @@ class OrganizerEventListView(generics.ListAPIView):
     """
     serializer_class = EventListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrganizerEventPagination
 
     def get_queryset(self):
-        return Event.objects.filter(organizer=self.request.user).order_by('-start_datetime')
+        return Event.objects.filter(organizer=self.request.user).for_catalog().order_by('-start_datetime', '-id')
 
 
 class OrganizerEventAttendeesView(generics.ListAPIView):
@@ -392,16 +623,53 @@ class OrganizerEventAttendeesView(generics.ListAPIView):
     """
     serializer_class = TicketSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AttendeePagination
 
     def get_queryset(self):
         event_id = self.kwargs['id']
         # 1. Verify user is the organizer of this event
         event = get_object_or_404(Event, id=event_id, organizer=self.request.user)
         # 2. Return all tickets for that event
-        return Ticket.objects.filter(event=event).order_by('purchase_date')
+        return Ticket.objects.filter(event=event).select_related('event__organizer', 'tier').order_by('purchase_date', 'id')
     
 
 
+class OrganizerTicketBundleView(views.APIView):
+    """
+    One PDF (or ZIP) of every ticket of an organizer's event, for printing.
+    POST /api/organizer/events/{id}/tickets/bundle/  {"kind": "pdf"|"zip"} queues it on the 'tickets' queue
+    GET  the same URL (?kind=) reports PENDING, READY with the file's url, or FAILED
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def state(self, request, event, kind, status_code=status.HTTP_200_OK):
+        state = bulk_render.event_bundle_state(event.id, kind)
+        if state is None:
+            return Response({"error": "No bundle requested."}, status=status.HTTP_404_NOT_FOUND)
+        data = {"status": state['status'], "kind": kind}
+        if state['status'] == 'READY':
+            data.update(tickets=state['tickets'], url=request.build_absolute_uri(default_storage.url(state['path'])))
+        return Response(data, status=status_code)
+
+    def get(self, request, id):
+        event = get_object_or_404(Event, id=id, organizer=request.user)
+        kind = request.query_params.get('kind', 'pdf')
+        if kind not in bulk_render.BUNDLE_KINDS:
+            return Response({"error": "kind must be pdf or zip."}, status=status.HTTP_400_BAD_REQUEST)
+        return self.state(request, event, kind)
+
+    def post(self, request, id):
+        event = get_object_or_404(Event, id=id, organizer=request.user)
+        kind = request.data.get('kind', 'pdf')
+        if kind not in bulk_render.BUNDLE_KINDS:
+            return Response({"error": "kind must be pdf or zip."}, status=status.HTTP_400_BAD_REQUEST)
+        if not bulk_render.event_tickets(event.id).exists():
+            return Response({"error": "This event has no tickets yet."}, status=status.HTTP_400_BAD_REQUEST)
+
+        bulk_render.queue_event_bundle(event.id, kind)
+        return self.state(request, event, kind, status_code=status.HTTP_202_ACCEPTED)
+
+
 class VerifyTicketView(APIView):
     """
     Endpoint for Gate Scanners to verify tickets, now supporting sequential group scanning.
@@ -419,60 +687,134 @@ class VerifyTicketView(APIView):
         if not qr_hash:
             return Response({"error": "No QR code provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            # 2. Lookup ALL Tickets for this Hash/Group
-            # Order by purchase_date ensures sequential check-in based on creation order
-            group_tickets = Ticket.objects.filter(qr_code_hash=qr_hash).order_by('purchase_date')
-            
-            if not group_tickets.exists():
-                return Response({"error": "Ticket Not Found"}, status=status.HTTP_404_NOT_FOUND)
-
-            # 3. Find the NEXT AVAILABLE ticket (status=ACTIVE) in the group
-            ticket_to_check_in = group_tickets.filter(status=Ticket.Status.ACTIVE).first()
-            
-            if not ticket_to_check_in:
-                # All tickets in the group are already checked in
-                first_ticket = group_tickets.first()
-                return Response({
-                    "error": "ALL TICKETS USED",
-                    "attendee_name": first_ticket.attendee_name,
-                    "tier_name": first_ticket.tier.name,
-                    "total_in_group": group_tickets.count(),
-                    "checked_in_count": group_tickets.filter(status=Ticket.Status.CHECKED_IN).count()
-                }, status=status.HTTP_409_CONFLICT)
-
-
-            # 4. Check Event Ownership
-            if request.user.role == User.Role.ORGANIZER and ticket_to_check_in.event.organizer != request.user:
-                 return Response({"error": "This ticket does not belong to your event."}, status=status.HTTP_403_FORBIDDEN)
-            
-            # 5. SUCCESS: Check In the found ACTIVE ticket
-            ticket_to_check_in.status = Ticket.Status.CHECKED_IN
-            ticket_to_check_in.checked_in_at = timezone.now()
-            ticket_to_check_in.checked_in_by = request.user
-            ticket_to_check_in.save()
-            
-            # 6. Return updated group status
-            total_in_group = group_tickets.count()
-            checked_in_count = group_tickets.filter(status=Ticket.Status.CHECKED_IN).count()
-            
-            # Update the ticket page to reflect sequential scanning
-            return Response({
-                "status": "VALID",
-                "attendee_name": ticket_to_check_in.attendee_name,
-                "tier_name": ticket_to_check_in.tier.name,
-                "event": ticket_to_check_in.event.title,
-                "group_status": f"Checked in {checked_in_count} of {total_in_group}"
-            }, status=status.HTTP_200_OK)
-
-        except Ticket.DoesNotExist:
+        # Forged or corrupted signed tokens are rejected without touching the database
+        if qr_tokens.is_signed_token(qr_hash) and not qr_tokens.decode_token(qr_hash):
             return Response({"error": "Ticket Not Found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            # 2. Atomically claim the next ACTIVE ticket in the group and read the group counts
+            result = checkin.check_in(qr_hash, request.user)
         except Exception as e:
              print(f"VerifyTicketView Error: {e}")
              return Response({"error": "Invalid QR Hash or System Error"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result.outcome == checkin.NOT_FOUND:
+            return Response({"error": "Ticket Not Found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if result.outcome == checkin.FORBIDDEN:
+            return Response({"error": "This ticket does not belong to your event."}, status=status.HTTP_403_FORBIDDEN)
+
+        if result.outcome == checkin.ALL_USED:
+            # All tickets in the group are already checked in
+            return Response({
+                "error": "ALL TICKETS USED",
+                "attendee_name": result.ticket.attendee_name,
+                "tier_name": result.ticket.tier_name,
+                "total_in_group": result.total_in_group,
+                "checked_in_count": result.checked_in_count
+            }, status=status.HTTP_409_CONFLICT)
+
+        # 3. SUCCESS: Return updated group status
+        return Response({
+            "status": "VALID",
+            "attendee_name": result.ticket.attendee_name,
+            "tier_name": result.ticket.tier_name,
+            "event": result.ticket.event_title,
+            "group_status": f"Checked in {result.checked_in_count} of {result.total_in_group}"
+        }, status=status.HTTP_200_OK)
     
 
 
+def gate_access_error(user, event):
+    """
+    Organizers may scan their own events and scanners their employer's; None if
+    `user` may, else the 403 response. The manifest carries the event's QR key,
+    so this is what keeps one organizer's scanners from minting another's tickets.
+    """
+    if user.role == User.Role.ORGANIZER and event.organizer_id != user.id:
+        return Response({"error": "This event does not belong to you."}, status=status.HTTP_403_FORBIDDEN)
+    if user.role == User.Role.SCANNER and event.organizer_id != user.employer_id:
+        return Response({"error": "This scanner does not work for this event's organizer."}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+
+class EventManifestView(APIView):
+    """
+    Offline gate manifest for scanner devices.
+    GET /api/scanner/events/{id}/manifest/?since=<version>
+    Returns a compact binary snapshot (see services/manifest.py), or only the
+    QR hashes that changed since `since` when the device already has a copy.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, id):
+        if request.user.role not in [User.Role.ORGANIZER, User.Role.SCANNER]:
+            return Response({"error": "Unauthorized. Only scanners can download manifests."}, status=status.HTTP_403_FORBIDDEN)
+
+        event = get_object_or_404(Event, id=id)
+
+        denied = gate_access_error(request.user, event)
+        if denied:
+            return denied
+
+        if not event.is_offline_ready:
+            return Response({"error": "Offline scanning is not enabled for this event."}, status=status.HTTP_409_CONFLICT)
+
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({"error": "Invalid since version."}, status=status.HTTP_400_BAD_REQUEST)
+
+        version, payload = manifest.build_manifest(event, since=since)
+
+        response = HttpResponse(payload, content_type='application/octet-stream')
+        response['X-Manifest-Version'] = str(version)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class OfflineScanUploadView(APIView):
+    """
+    Flushes a scanner device's queued offline check-ins in one request.
+    POST /api/scanner/events/{id}/scans/
+    Payload: { "scans": [{ "qr_hash": "...", "scanned_at": "...", "device_id": "..." }] }
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_BATCH = 5000
+
+    def post(self, request, id):
+        if request.user.role not in [User.Role.ORGANIZER, User.Role.SCANNER]:
+            return Response({"error": "Unauthorized. Only scanners can verify tickets."}, status=status.HTTP_403_FORBIDDEN)
+
+        event = get_object_or_404(Event, id=id)
+
+        denied = gate_access_error(request.user, event)
+        if denied:
+            return denied
+
+        scans = request.data.get('scans')
+        if not isinstance(scans, list) or not scans:
+            return Response({"error": "No scans provided."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(scans) > self.MAX_BATCH:
+            return Response({"error": f"At most {self.MAX_BATCH} scans per upload."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = OfflineScanSerializer(data=scans, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        results = checkin.apply_offline_scans(event, serializer.validated_data, request.user)
+
+        summary = {}
+        for result in results:
+            summary[result.result] = summary.get(result.result, 0) + 1
+
+        return Response({
+            "summary": summary,
+            "results": [result._asdict() for result in results]
+        }, status=status.HTTP_200_OK)
+
+
 # --- TEAM MANAGEMENT VIEWS ---
 
 class ScannerListView(generics.ListAPIView):
@@ -480,11 +822,8 @@ class ScannerListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        # Logic to get scanners created by this organizer
-        # For MVP, just returning all scanners might be a security risk in prod if not filtered.
-        # Ideally: User model should have `created_by` field.
-        # For now, let's just filter by role=SCANNER. In a real app, filter by `created_by=self.request.user`
-        return User.objects.filter(role=User.Role.SCANNER) 
+        # Scanners created by this organizer
+        return User.objects.filter(role=User.Role.SCANNER, employer=self.request.user)
 
 class ScannerCreateView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -508,6 +847,7 @@ class ScannerCreateView(views.APIView):
         # Create User
         user = User.objects.create_user(username=username, email=email, password=password)
         user.role = User.Role.SCANNER
+        user.employer = request.user
         user.save()
 
         return Response({
@@ -538,7 +878,7 @@ class ActivateWalletView(APIView):
             return Response({"message": "Wallet already active", "wallet_id": user.wallet_id}, status=200)
 
         # 1. Call the Microservice
-        client = WalletClient()
+        client = get_wallet_client()
         try:
             data = client.onboard_user(user)
             
@@ -562,50 +902,64 @@ class OrganizerWalletProxyView(APIView):
     """
     Proxies wallet requests (Balance & Withdraw) from the Frontend 
     to the Wallet Microservice.
+    Balance and history are served from a short-lived cache (services/wallet_cache.py);
+    responses carry data_age_seconds / is_stale and an Age header.
     """
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request):
-        # 1. Get Balance
-        if request.user.role != User.Role.ORGANIZER:
-            return Response({"error": "Unauthorized"}, status=403)
-            
-        client = WalletClient()
-        data = client.get_balance(request.user.id)
-        return Response(data)
-
     def post(self, request):
         # 2. Withdraw Funds
         amount = request.data.get('amount')
         if not amount:
             return Response({"error": "Amount required"}, status=400)
 
-        client = WalletClient()
+        client = get_wallet_client()
         try:
             result = client.initiate_withdrawal(request.user.id, amount)
-            return Response(result)
         except Exception as e:
             return Response({"error": str(e)}, status=400)
+
+        # The balance just changed; the next poll must not show the cached one
+        wallet_cache.invalidate(request.user.id)
+        return Response(result)
         
 
     def get(self, request):
         if request.user.role != User.Role.ORGANIZER:
             return Response({"error": "Unauthorized"}, status=403)
-            
-        client = WalletClient()
+
+        kind, params = self.cache_query(request)
+        try:
+            data, age, is_stale = wallet_cache.get(request.user.id, kind, params)
+        except WalletServiceError:
+            return self.unavailable()
+        return self.cached_response(data, age, is_stale)
+
+    @staticmethod
+    def cache_query(request):
         action = request.query_params.get('action')
+        kind, params = 'balance', None
         
         if action == 'history':
             # Pass all query params (page, page_size) to the client
             # We exclude 'action' itself from the forwarded params
-            params = request.query_params.copy()
-            if 'action' in params: del params['action']
-            
-            data = client.get_history(request.user.id, params)
-        else:
-            data = client.get_balance(request.user.id)
-            
-        return Response(data)
+            params = request.query_params.dict()
+            params.pop('action', None)
+            kind = 'history'
+        return kind, params
+
+    @staticmethod
+    def unavailable():
+        # No cached copy to fall back on: say so instead of showing a zero balance
+        return Response({"error": "Wallet service unavailable. Try again shortly."}, status=503)
+
+    @staticmethod
+    def cached_response(data, age, is_stale):
+        if not isinstance(data, dict):
+            data = {"results": data}
+        response = Response({**data, "data_age_seconds": age, "is_stale": is_stale})
+        response['Age'] = str(age)
+        return response
         
 
 
@@ -617,7 +971,7 @@ class GetWalletLinkView(APIView):
         if request.user.role != User.Role.ORGANIZER:
             return Response({"error": "Unauthorized"}, status=403)
             
-        client = WalletClient()
+        client = get_wallet_client()
         try:
             data = client.get_kyc_link(request.user.id)
             return Response(data) # Returns { "magic_link": "..." }
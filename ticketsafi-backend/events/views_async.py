@@ -0,0 +1,170 @@
+"""
+Async versions of the endpoints that mostly wait on the Wallet service, used
+when the app runs under uvicorn workers (ASYNC_VIEWS=True, see docs/Api.md).
+
+Each one reuses its DRF view for body parsing, JWT cookie authentication,
+permission checks and response rendering, plus any database work, all run in
+a worker thread via sync_to_async. Only the wallet call itself is awaited on
+the event loop (AsyncWalletClient), so a slow wallet holds a coroutine, not
+one of a fixed number of gunicorn threads.
+
+get_payment_status is always async (it is routed the same way in both modes);
+it only holds the connection open when ASYNC_VIEWS is on.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from .models import User
+from .services import idempotency, payment_status, wallet_cache
+from .services.wallet_client import WalletServiceError, get_async_wallet_client
+from .views import GetWalletLinkView, InitiatePaymentView, OrganizerWalletProxyView
+
+
+def _enter(view, request, args, kwargs, methods):
+    """ APIView.dispatch() up to the handler. Returns (drf_request, error response or None). """
+    view.args, view.kwargs = args, kwargs
+    drf_request = view.initialize_request(request, *args, **kwargs)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(drf_request, *args, **kwargs)
+        if request.method not in methods:
+            view.http_method_not_allowed(drf_request)
+        drf_request.data  # Parse the body here rather than on the event loop
+    except Exception as exc:
+        return drf_request, view.handle_exception(exc)
+    return drf_request, None
+
+
+def _finish(view, drf_request, response):
+    return view.finalize_response(drf_request, response).render()
+
+
+def drf_async(view_class, *methods):
+    """
+    Turns `async def handler(view, request)` into an async Django view with the
+    authentication, permissions and renderers of `view_class`.
+    """
+    def decorator(handler):
+        @csrf_exempt
+        @functools.wraps(handler)
+        async def wrapped(request, *args, **kwargs):
+            view = view_class()
+            drf_request, response = await sync_to_async(_enter)(view, request, args, kwargs, methods)
+            if response is None:
+                try:
+                    response = await handler(view, drf_request)
+                except Exception as exc:
+                    response = await sync_to_async(view.handle_exception)(exc)
+            return await sync_to_async(_finish)(view, drf_request, response)
+        return wrapped
+    return decorator
+
+
+@drf_async(InitiatePaymentView, 'POST')
+async def initiate_payment(view, request):
+    key, replayed = await sync_to_async(view.claim_key)(request)
+    if replayed is not None:
+        return replayed
+
+    try:
+        response = await _initiate(view, request)
+    except Exception:
+        if key:
+            await sync_to_async(idempotency.release)(key)
+        raise
+    if key:
+        await sync_to_async(idempotency.store)(key, response.status_code, response.data)
+    return response
+
+
+async def _initiate(view, request):
+    payment = await sync_to_async(view.place_order)(request)
+    if isinstance(payment, Response):
+        return payment
+
+    try:
+        client = get_async_wallet_client()
+        wallet_response = await client.collect_payment(**view.collect_kwargs(payment))
+    except Exception as e:
+        return await sync_to_async(view.collection_failed)(payment, e)
+    return view.collection_started(payment, wallet_response)
+
+
+@drf_async(OrganizerWalletProxyView, 'GET', 'POST')
+async def organizer_wallet(view, request):
+    if request.method == 'POST':
+        amount = request.data.get('amount')
+        if not amount:
+            return Response({"error": "Amount required"}, status=400)
+
+        try:
+            result = await get_async_wallet_client().initiate_withdrawal(request.user.id, amount)
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+        await wallet_cache.ainvalidate(request.user.id)
+        return Response(result)
+
+    if request.user.role != User.Role.ORGANIZER:
+        return Response({"error": "Unauthorized"}, status=403)
+
+    kind, params = view.cache_query(request)
+    try:
+        data, age, is_stale = await wallet_cache.aget(request.user.id, kind, params)
+    except WalletServiceError:
+        return view.unavailable()
+    return view.cached_response(data, age, is_stale)
+
+
+@drf_async(GetWalletLinkView, 'GET')
+async def wallet_link(view, request):
+    if request.user.role != User.Role.ORGANIZER:
+        return Response({"error": "Unauthorized"}, status=403)
+
+    try:
+        data = await get_async_wallet_client().get_kyc_link(request.user.id)
+        return Response(data)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
+
+
+async def get_payment_status(request, reference):
+    """
+    Status of the payment behind a transaction_ref (public, like the reference
+    itself). Plain GET answers at once; ?wait=N&since=STATUS long-polls until
+    the status differs from `since`; Accept: text/event-stream streams changes.
+    Under WSGI both degrade to an immediate answer, so threads are never parked.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    state = await payment_status.aget(reference)
+    if state is None:
+        return JsonResponse({"error": "Payment not found."}, status=404)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        if settings.ASYNC_VIEWS:
+            events = payment_status.stream(reference, state, settings.PAYMENT_STATUS_STREAM_SECONDS)
+        else:
+            events = payment_status.opening(state)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Nginx must pass events through unbuffered
+        return response
+
+    try:
+        wait = min(max(float(request.GET.get('wait', 0)), 0), settings.PAYMENT_STATUS_MAX_WAIT_SECONDS)
+    except ValueError:
+        return JsonResponse({"error": "Invalid wait."}, status=400)
+    if wait and settings.ASYNC_VIEWS:
+        state = await payment_status.wait(reference, since=request.GET.get('since'), timeout=wait)
+
+    response = JsonResponse(state)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -4,8 +4,9 @@ from decouple import config
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Payment, Ticket
-from .utils import send_ticket_email
+from django.db import IntegrityError, transaction
+from .models import WebhookInbox
+from .tasks import process_webhook
 
 class PaymentWebhookView(APIView):
     permission_classes = [permissions.AllowAny] 
@@ -27,37 +28,29 @@ class PaymentWebhookView(APIView):
         # If we get here, the request is authentic
         data = request.data
         ticket_ref = data.get('reference')
-        status_msg = data.get('status')
         
-        # ... (Rest of your existing logic: Find Payment, Create Ticket, etc.) ...
         if not ticket_ref:
              return Response({"error": "Reference required"}, status=400)
-             
-        try:
-            payment = Payment.objects.get(reference_code=ticket_ref)
-        except Payment.DoesNotExist:
-            return Response({"error": "Payment not found"}, status=404)
-
-        if payment.status == Payment.Status.COMPLETED:
-            return Response({"message": "Already processed"}, status=200)
 
-        if status_msg == 'COMPLETED':
-            payment.status = Payment.Status.COMPLETED
-            payment.save()
-            
-            ticket = Ticket.objects.create(
-                event=payment.event,
-                tier=payment.tier,
-                owner=payment.user,
-                attendee_name=payment.user.first_name or payment.user.username,
-                attendee_email=payment.user.email
+        # Persist the raw payload and acknowledge straight away; a worker
+        # creates the ticket and sends the email (events.tasks.process_webhook).
+        # A delivery is identified by its reference and reported status, so the
+        # insert itself is the dedupe, and a COMPLETED after a FAILED is kept.
+        reported_status = str(data.get('status') or '')[:20]
+        try:
+            with transaction.atomic():
+                inbox = WebhookInbox.objects.create(
+                    reference=ticket_ref, reported_status=reported_status, payload=dict(data)
+                )
+        except IntegrityError:
+            inbox = WebhookInbox.objects.get(reference=ticket_ref, reported_status=reported_status)
+            if inbox.status == WebhookInbox.Status.PROCESSED:
+                return Response({"message": "Already received"}, status=200)
+            # Not applied yet (still queued, or failed for good): the provider's
+            # redelivery gives it a fresh set of retries
+            WebhookInbox.objects.filter(pk=inbox.pk).exclude(status=WebhookInbox.Status.PROCESSED).update(
+                status=WebhookInbox.Status.RECEIVED, attempts=0
             )
-            send_ticket_email(ticket)
-            return Response({"status": "Ticket Created"}, status=200)
-            
-        elif status_msg == 'FAILED':
-            payment.status = Payment.Status.FAILED
-            payment.save()
-            return Response({"status": "Marked Failed"}, status=200)
 
-        return Response({"error": "Unknown status"}, status=400)
\ No newline at end of file
+        transaction.on_commit(lambda: process_webhook.delay(inbox.id))
+        return Response({"status": "Received"}, status=200)
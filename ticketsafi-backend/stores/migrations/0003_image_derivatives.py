@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0002_alter_store_name_alter_store_organizer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='banner_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='logo_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
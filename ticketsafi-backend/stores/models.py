@@ -14,6 +14,8 @@ class Store(models.Model):
     
     logo_image = models.ImageField(upload_to='store_logos/', blank=True, null=True)
     banner_image = models.ImageField(upload_to='store_banners/', blank=True, null=True)
+    logo_derivatives = models.JSONField(default=dict, blank=True)
+    banner_derivatives = models.JSONField(default=dict, blank=True)
     
     instagram_link = models.URLField(blank=True, null=True)
     website_link = models.URLField(blank=True, null=True)
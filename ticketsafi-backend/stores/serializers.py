@@ -2,6 +2,7 @@ import json
 from rest_framework import serializers
 from .models import Store
 from events.models import User # Need User model for foreign key linking
+from events.services import images
 
 class StoreSerializer(serializers.ModelSerializer):
     """
@@ -9,16 +10,55 @@ class StoreSerializer(serializers.ModelSerializer):
     Handles file upload and nested fields required for organization branding.
     """
     organizer_name = serializers.ReadOnlyField(source='organizer.username')
+    logo_urls = serializers.SerializerMethodField()
+    banner_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = Store
         fields = [
             'id', 'name', 'slug', 'description', 
-            'logo_image', 'banner_image', 
+            'logo_image', 'banner_image', 'logo_urls', 'banner_urls',
             'instagram_link', 'website_link', 'organizer_name'
         ]
         read_only_fields = ['organizer_name'] 
 
+    def get_logo_urls(self, obj):
+        return images.urls(obj.logo_image, obj.logo_derivatives, images.LOGO)
+
+    def get_banner_urls(self, obj):
+        return images.urls(obj.banner_image, obj.banner_derivatives, images.BANNER)
+
+    def _check_dimensions(self, value):
+        if value:
+            try:
+                images.check_dimensions(value)
+            except images.ImageTooLarge as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
+    def validate_logo_image(self, value):
+        return self._check_dimensions(value)
+
+    def validate_banner_image(self, value):
+        return self._check_dimensions(value)
+
+    def _refresh_derivatives(self, store, validated_data):
+        # Resize new uploads once here so list pages never serve the originals
+        if 'logo_image' in validated_data:
+            images.refresh(store, 'logo_image', 'logo_derivatives', images.LOGO)
+        if 'banner_image' in validated_data:
+            images.refresh(store, 'banner_image', 'banner_derivatives', images.BANNER)
+
+    def create(self, validated_data):
+        store = super().create(validated_data)
+        self._refresh_derivatives(store, validated_data)
+        return store
+
+    def update(self, instance, validated_data):
+        store = super().update(instance, validated_data)
+        self._refresh_derivatives(store, validated_data)
+        return store
+
     # We need to manually handle file/data mixing (multipart form data) validation
     def to_internal_value(self, data):
         # DRF needs to convert QueryDict to a standard dict for list handling
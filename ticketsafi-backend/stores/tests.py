@@ -1,3 +1,86 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from events.models import TicketTier, User
+from events.tests import make_event
+from .models import Store
+
+
+def image_upload(name, size):
+    buffer = BytesIO()
+    Image.new('RGB', size, (20, 120, 200)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StoreImageDerivativeTests(TestCase):
+    def test_logo_and_banner_derivatives_are_built_on_upload(self):
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        client = APIClient()
+        client.force_authenticate(organizer)
+
+        response = client.post('/api/stores/create/', {
+            'name': 'Yadi Merch', 'slug': 'yadi-merch',
+            'logo_image': image_upload('logo.png', (1024, 1024)),
+            'banner_image': image_upload('banner.png', (3200, 1200)),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        store = Store.objects.get()
+        self.assertEqual(set(store.logo_derivatives), {'thumb', 'card'})
+        self.assertEqual(set(store.banner_derivatives), {'card', 'hero'})
+        self.assertTrue(response.json()['logo_urls']['thumb'].endswith('thumb.webp'))
+
+
+class StoreCatalogQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_store_page_queries_do_not_grow_with_events(self):
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        store = Store.objects.create(organizer=organizer, name='Yadi Merch', slug='yadi-merch')
+        client = APIClient()
+
+        def add_events(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                for n in range(count):
+                    event = make_event(organizer, title=f"Event {n}", store=store)
+                    TicketTier.objects.create(event=event, name='Regular', price=1000, quantity_allocated=100)
+
+        add_events(2)
+        with self.assertNumQueries(2):  # Store, then its events
+            client.get('/api/stores/yadi-merch/')
+        add_events(10)
+        with self.assertNumQueries(2):
+            response = client.get('/api/stores/yadi-merch/')
+        self.assertEqual(len(response.json()['events']), 12)
+        self.assertEqual(response.json()['events'][0]['store']['slug'], 'yadi-merch')
+        self.assertEqual(client.get('/api/stores/').status_code, 200)
+
+    def test_store_changes_invalidate_store_pages(self):
+        organizer = User.objects.create_user('organizer', 'org@yadi.app', 'pass', role=User.Role.ORGANIZER)
+        with self.captureOnCommitCallbacks(execute=True):
+            store = Store.objects.create(organizer=organizer, name='Yadi Merch', slug='yadi-merch')
+            event = make_event(organizer, title='Sauti Sol Live')
+        client = APIClient()
+        self.assertEqual(client.get('/api/stores/yadi-merch/').json()['events'], [])
+        self.assertEqual(client.get('/api/stores/yadi-merch/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event.store = store
+            event.save()
+        self.assertEqual(len(client.get('/api/stores/yadi-merch/').json()['events']), 1)
+        self.assertEqual(client.get(f'/api/events/{event.id}/').json()['store']['slug'], 'yadi-merch')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            store.slug = 'yadi-shop'
+            store.save()
+        self.assertEqual(client.get('/api/stores/yadi-merch/').status_code, 404)
+        self.assertEqual(client.get(f'/api/events/{event.id}/').json()['store']['slug'], 'yadi-shop')
+        self.assertEqual(client.get('/api/stores/').json()['results'][0]['slug'], 'yadi-shop')
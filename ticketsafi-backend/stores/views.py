@@ -4,6 +4,7 @@ from .models import Store
 from .serializers import StoreSerializer
 from events.models import Event
 from events.serializers import EventListSerializer
+from events.services import catalog_cache
 from django.utils import timezone
 
 # --- ORGANIZER MANAGEMENT VIEWS ---
@@ -40,16 +41,28 @@ class StoreUpdateView(generics.RetrieveUpdateDestroyAPIView):
 
 class StoreListView(generics.ListAPIView):
     """ Public list of all stores """
-    queryset = Store.objects.all().order_by('name')
+    queryset = Store.objects.select_related('organizer').order_by('name')
     serializer_class = StoreSerializer
 
+    def list(self, request, *args, **kwargs):
+        return catalog_cache.respond(
+            request, 'store-list', [catalog_cache.STORES],
+            lambda: super(StoreListView, self).list(request, *args, **kwargs),
+        )
+
 class StoreDetailView(generics.RetrieveAPIView):
     """ Public store page with events """
-    queryset = Store.objects.all()
+    queryset = Store.objects.select_related('organizer')
     serializer_class = StoreSerializer
     lookup_field = 'slug'
 
     def retrieve(self, request, *args, **kwargs):
+        return catalog_cache.respond(
+            request, 'store-detail', [catalog_cache.store(kwargs['slug'])],
+            lambda: self.build(request),
+        )
+
+    def build(self, request):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         
@@ -58,7 +71,7 @@ class StoreDetailView(generics.RetrieveAPIView):
             store=instance, # CHANGED: Filter by store, not just organizer
             is_published=True,
             end_datetime__gt=timezone.now()
-        ).order_by('start_datetime')
+        ).for_catalog().order_by('start_datetime')
         
         event_serializer = EventListSerializer(events, many=True, context={'request': request})
         